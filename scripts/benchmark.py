@@ -0,0 +1,309 @@
+"""
+NX 报价助手 - 性能基准
+
+不需要 NX，全部使用合成数据或 fake 后端。
+
+用法:
+    python scripts/benchmark.py            # 运行全部基准
+    python scripts/benchmark.py pricing    # 只运行指定基准
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.backends import FakeBackend  # noqa: E402
+from src.bodies import STRATEGIES  # noqa: E402
+from src.cutlist import SCIPY_AVAILABLE, cut_group  # noqa: E402
+from src.diff import diff_columns, diff_rows  # noqa: E402
+from src.nesting import nest_group  # noqa: E402
+from src.pricing import QuoteEngine, RateCard  # noqa: E402
+from src.progress import ProgressTracker, StatusFile, TerminalProgress  # noqa: E402
+from src.report import write_batch_report  # noqa: E402
+from src.scheduler import STRATEGIES as SCHEDULES, simulate  # noqa: E402
+from src.sheetmetal import STANDARD_SHEETS, apply_nesting, body_sheet_metal, nesting_summary  # noqa: E402
+from src.sinks import JSON_ENGINES, choose_json_engine, write_csv, write_jsonl  # noqa: E402
+
+
+def timed(label, func, repeat=5):
+    """运行 func 若干次并打印最短耗时"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<40} {best * 1000:10.2f} ms")
+    return result
+
+
+def synthetic_records(count, seed=0):
+    """生成 count 个合成零件记录"""
+    rng = np.random.default_rng(seed)
+    dims = rng.uniform(0.01, 0.5, size=(count, 3))
+    fill = rng.uniform(0.2, 0.9, size=count)
+    volume = dims.prod(axis=1) * fill
+    area = 2.0 * (dims[:, 0] * dims[:, 1] + dims[:, 0] * dims[:, 2] + dims[:, 1] * dims[:, 2])
+    materials = np.array(['Q235', '6061', 'SUS304', 'H62'])[rng.integers(0, 4, size=count)]
+    return [
+        {
+            'volume_m3': float(volume[i]),
+            'area_m2': float(area[i]),
+            'length_m': float(dims[i, 0]),
+            'width_m': float(dims[i, 1]),
+            'height_m': float(dims[i, 2]),
+            'material': str(materials[i]),
+        }
+        for i in range(count)
+    ]
+
+
+def bench_pricing(count=100000):
+    """报价引擎：10 万个零件在新费率表下重新计价"""
+    print(f"pricing: {count} 个零件")
+    records = synthetic_records(count)
+    engine = QuoteEngine(RateCard())
+    columns = timed("prepare (记录 -> 列)", lambda: engine.prepare(records), repeat=1)
+    card = RateCard(machine_rate_per_h=150, margin=0.25)
+    timed("price_columns (新费率表重新计价)", lambda: engine.price_columns(columns, card))
+    timed("price (计价并写回记录)", lambda: engine.price(records, card), repeat=1)
+
+
+def bench_bodies(body_count=5000):
+    """实体枚举：数千个实体（含片体和隐藏实体）的零件，比较各枚举方式"""
+    print(f"bodies: 每个零件 {body_count} 个实体，另含 20% 片体和 10% 隐藏实体")
+    for strategy in STRATEGIES:
+        backend = FakeBackend(body_count=body_count, strategy=strategy,
+                              sheet_ratio=0.2, hidden_ratio=0.1)
+        part = backend.open_part('bench_bodies.prt')
+
+        def cold():
+            backend.enumerator.forget(part)
+            return backend.list_bodies(part)
+
+        before = backend.uf_session.Obj.calls + part.Bodies.calls
+        found = timed(f"{strategy} 首次枚举", cold)
+        round_trips = (backend.uf_session.Obj.calls + part.Bodies.calls - before) // 5
+        timed(f"{strategy} 缓存命中", lambda: backend.list_bodies(part))
+        print(f"  {strategy}: 保留 {len(found)} 个实体，每次枚举 {round_trips} 次 NX 调用")
+        backend.close_part(part)
+
+
+def bench_report(count=20000):
+    """批量报价工作簿：2 万个零件流式写出"""
+    print(f"report: {count} 个零件")
+    records = synthetic_records(count)
+    QuoteEngine(RateCard()).price(records)
+    for i, record in enumerate(records):
+        record['file'] = f"part_{i:06d}.prt"
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'report.xlsx')
+        timed("write_batch_report", lambda: write_batch_report(iter(records), path), repeat=1)
+        print(f"  文件大小 {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+def bench_csv(count=200000):
+    """流式 CSV：20 万个零件，不压缩与 gzip"""
+    print(f"csv: {count} 个零件")
+    records = synthetic_records(count)
+    QuoteEngine(RateCard()).price(records)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('parts.csv', 'parts.csv.gz'):
+            path = os.path.join(tmp, name)
+            timed(f"write_csv -> {name}", lambda: write_csv(iter(records), path), repeat=1)
+            print(f"  {name}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+def bench_json(count=200000):
+    """JSON Lines：20 万个零件，比较已安装的各 JSON 编码库"""
+    print(f"json: {count} 个零件")
+    records = synthetic_records(count)
+    QuoteEngine(RateCard()).price(records)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'parts.jsonl')
+        for engine in JSON_ENGINES:
+            try:
+                choose_json_engine(engine)
+            except ImportError:
+                print(f"  {engine}: 未安装，跳过")
+                continue
+            timed(f"write_jsonl ({engine})",
+                  lambda: write_jsonl(iter(records), path, engine=engine), repeat=1)
+
+
+def bench_diff(count=100000, changed=0.02):
+    """版本对比：10 万个零件，2% 体积变化，1% 新增和删除"""
+    print(f"diff: {count} 个零件")
+    old = synthetic_records(count)
+    for i, record in enumerate(old):
+        record['file'] = f"P{i:06d}.prt"
+        record['error'] = None
+    rng = np.random.default_rng(2)
+    new = [dict(r) for r in old[count // 100:]]
+    for i in rng.choice(len(new), int(len(new) * changed), replace=False):
+        new[i]['volume_m3'] *= 1.05
+    new.extend(dict(r, file=f"N{i:06d}.prt") for i, r in enumerate(old[:count // 100]))
+    columns = timed("diff_columns (file)", lambda: diff_columns(old, new, key='file'), repeat=3)
+    timed("diff_rows (变化的行)",
+          lambda: diff_rows(columns, ('added', 'removed', 'changed')), repeat=3)
+
+
+def bench_sheet(count=100000, bodies=2000):
+    """钣金：fake 折弯板的展开指标，以及 10 万件坯料的排样估算"""
+    print(f"sheet: {bodies} 个钣金实体，{count} 个零件排样")
+    backend = FakeBackend(sheet_metal_ratio=1.0, body_count=1)
+    parts = [backend.open_part(f"S{i:05d}.prt") for i in range(bodies // 2)]
+    solids = [b for part in parts for b in part.bodies]
+    inputs = []
+    for body in solids:
+        measured = backend.measure_body(None, body, 0.99)
+        inputs.append((backend.body_topology(None, body), measured['volume_m3'],
+                       measured['area_m2'], measured['min_point'], measured['max_point']))
+    timed("body_sheet_metal", lambda: [body_sheet_metal(*args) for args in inputs], repeat=3)
+
+    rng = np.random.default_rng(3)
+    length = rng.uniform(0.05, 1.2, count)
+    width = rng.uniform(0.03, 0.6, count)
+    thickness = rng.choice([0.001, 0.0015, 0.002, 0.003], count)
+    materials = np.array(['Q235', 'SUS304', '5052'])[rng.integers(0, 3, size=count)]
+    records = [
+        {
+            'error': None,
+            'material': str(materials[i]),
+            'quantity': int(q),
+            'sheet_body_count': 1,
+            'bodies': [{'sheet_metal': {'flat_length_m': float(length[i]),
+                                        'flat_width_m': float(width[i]),
+                                        'flat_area_m2': float(length[i] * width[i] * 0.85),
+                                        'thickness_m': float(thickness[i])}}],
+        }
+        for i, q in enumerate(rng.integers(1, 50, count))
+    ]
+    timed("apply_nesting", lambda: apply_nesting(records), repeat=3)
+    timed("nesting_summary", lambda: nesting_summary(records), repeat=3)
+
+
+def bench_nest(counts=(1000, 3000, 6000)):
+    """MaxRects 排样：同一材料板厚的几千件坯料排到标准板材上"""
+    rng = np.random.default_rng(4)
+    for count in counts:
+        length = rng.uniform(0.05, 0.8, count)
+        width = rng.uniform(0.03, 0.4, count)
+        result = {}
+
+        def run():
+            result.update(nest_group(length, width, length * width, STANDARD_SHEETS[:1]))
+
+        timed(f"nest_group {count} 件", run, repeat=1)
+        print(f"  {result['sheets']} 张 {result['sheet_size']}，利用率 {result['utilization']:.1%}")
+
+
+def bench_cut(count=5000):
+    """棒料下料：一组 (材料, 直径) 的几千件下料件，长度种类多和少两种情况"""
+    print(f"cut: {count} 件，列生成{'可用' if SCIPY_AVAILABLE else '不可用（未安装 SciPy）'}")
+    rng = np.random.default_rng(5)
+    cases = {
+        '长度各异': np.round(rng.uniform(0.05, 1.5, count), 3),
+        '40 种长度': rng.choice(np.round(rng.uniform(0.3, 2.2, 40), 3), count),
+    }
+    for label, lengths in cases.items():
+        result = {}
+
+        def run():
+            result.update(cut_group(lengths))
+
+        timed(f"cut_group {label}", run, repeat=1)
+        print(f"  {result['bars']} 根，废料率 {result['waste']:.2%}（{result['method']}）")
+
+
+def job_distributions(count, seed=0):
+    """合成的零件耗时分布（秒）"""
+    rng = np.random.default_rng(seed)
+    bimodal = np.where(rng.random(count) < 0.05, rng.uniform(60, 300, count), rng.uniform(1, 5, count))
+    return {
+        'uniform': rng.uniform(1, 20, count),
+        'lognormal': rng.lognormal(1.0, 1.2, count),
+        'bimodal': bimodal,
+        # 大零件集中在列表末尾（例如按文件名排序后的装配组件）
+        'sorted': np.sort(rng.lognormal(1.0, 1.2, count)),
+    }
+
+
+def bench_schedule(count=2000, noise=0.3):
+    """调度：合成耗时分布下各调度方式的完工时间（预计耗时带 30% 对数正态误差）"""
+    print(f"schedule: {count} 个零件，预计耗时误差 sigma={noise}")
+    rng = np.random.default_rng(1)
+    for workers in (4, 16):
+        for name, actual in job_distributions(count).items():
+            predicted = actual * rng.lognormal(0.0, noise, count)
+            bound = max(actual.sum() / workers, actual.max())
+            spans = {s: simulate(predicted, workers, s, actual) for s in SCHEDULES}
+            cells = '  '.join(f"{s} {spans[s] / bound:5.3f}" for s in SCHEDULES)
+            print(f"  {workers:>2} 线程 {name:<10} 完工时间/下界: {cells}")
+
+
+def bench_progress(count=200000, workers=8):
+    """进度：工作者每个零件的事件开销，以及一次汇总和输出的耗时"""
+    print(f"progress: {count} 个零件事件，{workers} 个工作者")
+    paths = [f"part_{i}.prt" for i in range(count)]
+    record = {'path': paths[0], 'body_count': 3, 'error': None, 'measure_time_s': 0.8,
+              'feature_time_s': 0.1}
+    tracker = ProgressTracker(interval=3600)
+    tracker.begin(count, workers=workers)
+    tracker.expect(paths, np.ones(count))
+    slots = [tracker.slot(k) for k in range(workers)]
+
+    def events():
+        for i in range(count):
+            tracker.part_done(slots[i % workers], record)
+
+    start = time.perf_counter()
+    events()
+    elapsed = time.perf_counter() - start
+    print(f"  {'part_done（每个事件）':<40} {elapsed / count * 1e6:10.3f} µs")
+    with tempfile.TemporaryDirectory() as tmp:
+        reporters = [TerminalProgress(stream=open(os.devnull, 'w')),
+                     StatusFile(os.path.join(tmp, 'status.json'))]
+        status = tracker.status()
+        timed("status()", tracker.status)
+        timed("终端进度条 + 状态文件", lambda: [r.update(status) for r in reporters])
+        reporters[0].stream.close()
+    tracker.finish(report=False)
+
+
+BENCHMARKS = {
+    'pricing': bench_pricing,
+    'bodies': bench_bodies,
+    'report': bench_report,
+    'csv': bench_csv,
+    'json': bench_json,
+    'diff': bench_diff,
+    'sheet': bench_sheet,
+    'nest': bench_nest,
+    'cut': bench_cut,
+    'schedule': bench_schedule,
+    'progress': bench_progress,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NX 报价助手性能基准")
+    parser.add_argument('names', nargs='*', help=f"要运行的基准（{', '.join(BENCHMARKS)}），默认全部")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(sorted(unknown))}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+NX 报价助手 - 命令行入口
+
+用法:
+    python scripts/nxquote.py extract D:/parts -w 4 -o parts.jsonl -o report.xlsx
+    python scripts/nxquote.py extract "D:/parts/**/*.prt" --backend fake
+    python scripts/nxquote.py report parts.jsonl -o report.xlsx --rates config/rates.yaml
+    python scripts/nxquote.py cache stats
+
+详见 src/cli.py。
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import main  # noqa: E402
+
+if __name__ == '__main__':
+    main()
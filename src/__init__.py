@@ -9,5 +9,81 @@ __author__ = 'NX 报价助手团队'
 
 from .extractor import ModelExtractor
 from .exporter import DataExporter
+from .container import PrtContainer, ContainerError, fingerprint_part
+from .backends import NXBackend, FakeBackend, get_backend
+from .batch import BatchRunner
+from .dedupe import flag_duplicates, group_by_fingerprint
+from .materials import MaterialLibrary, apply_materials
+from .pricing import QuoteEngine, RateCard
+from .metrics import StockAllowance, apply_derived
+from .cache import ResultCache
+from .bodies import BodyEnumerator
+from .watchdog import Watchdog, MeasureTimeout
+from .tiers import TieredRunner
+from .report import write_batch_report
+from .sinks import write_csv, write_jsonl
+from .preview import PreviewExtractor, read_preview
+from .attrs import AttributeIndex, read_attributes
+from .assembly import AssemblyIndex
+from .scheduler import CostModel, WorkStealingScheduler
+from .resources import MemoryMonitor, RecyclePolicy
+from .workers import ProcessWorker
+from .diff import diff_columns, diff_rows
+from .history import HistoryStore
+from .sheetmetal import apply_nesting, nesting_summary
+from .nesting import MaxRectsSheet, nest_records
+from .cutlist import cut_records, purchase_list
+from .runtime import RuntimeModel
+from .progress import ProgressTracker, StatusFile, StatusServer, TerminalProgress
 
-__all__ = ['ModelExtractor', 'DataExporter']
+__all__ = [
+    'ModelExtractor',
+    'DataExporter',
+    'PrtContainer',
+    'ContainerError',
+    'fingerprint_part',
+    'NXBackend',
+    'FakeBackend',
+    'get_backend',
+    'BatchRunner',
+    'flag_duplicates',
+    'group_by_fingerprint',
+    'MaterialLibrary',
+    'apply_materials',
+    'QuoteEngine',
+    'RateCard',
+    'StockAllowance',
+    'apply_derived',
+    'ResultCache',
+    'BodyEnumerator',
+    'Watchdog',
+    'MeasureTimeout',
+    'TieredRunner',
+    'write_batch_report',
+    'write_csv',
+    'write_jsonl',
+    'PreviewExtractor',
+    'read_preview',
+    'AttributeIndex',
+    'read_attributes',
+    'AssemblyIndex',
+    'CostModel',
+    'WorkStealingScheduler',
+    'MemoryMonitor',
+    'RecyclePolicy',
+    'ProcessWorker',
+    'diff_columns',
+    'diff_rows',
+    'HistoryStore',
+    'apply_nesting',
+    'nesting_summary',
+    'MaxRectsSheet',
+    'nest_records',
+    'cut_records',
+    'purchase_list',
+    'RuntimeModel',
+    'ProgressTracker',
+    'StatusFile',
+    'StatusServer',
+    'TerminalProgress',
+]
@@ -0,0 +1,309 @@
+"""
+装配结构索引
+
+不打开 NX，从 .prt 容器中找出零件引用的组件文件，建立整个文件夹的
+依赖图，用于：
+
+    按“先叶子后装配”的顺序安排提取
+    在启动 NX 之前发现缺失的组件文件
+    估算整批提取的耗时
+
+组件引用来自 /Root/FastLoad/Structure 和 /Root/UG_PART/ExternalReferences
+两个流。它们是 NX 内部的对象序列化格式，没有公开的结构定义；这里扫描
+其中带长度前缀的 .prt 文件名（ASCII 或 UTF-16LE），结果是启发式的：
+能可靠地给出“引用了哪些文件”，引用次数按文件名在 Structure 流中出现
+的次数计，仅作参考。
+"""
+
+import os
+import re
+import struct
+from collections import OrderedDict
+
+from .attrs import find_parts
+from .container import GEOMETRY_STREAMS, ContainerError, PrtContainer
+
+STRUCTURE_STREAM = '/Root/FastLoad/Structure'
+EXTREF_STREAM = '/Root/UG_PART/ExternalReferences'
+
+# 粗略的耗时模型：每个零件固定开销 + 每 MB 几何流的测量时间（秒）
+ESTIMATE_BASE_S = 3.0
+ESTIMATE_PER_MB_S = 2.0
+
+_ASCII_NAME = re.compile(rb'[\x20-\x7e]{1,250}?\.prt(?![A-Za-z0-9_])', re.IGNORECASE)
+_UTF16_NAME = re.compile(rb'(?:[\x20-\x7e]\x00){1,250}?\.\x00[pP]\x00[rR]\x00[tT]\x00')
+
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+
+
+def _prefixed(data, start, length, width):
+    """start 之前是否有值为 length 的 u16/u32 长度前缀"""
+    if width == 2:
+        return start >= 2 and _U16.unpack_from(data, start - 2)[0] == length
+    return start >= 4 and _U32.unpack_from(data, start - 4)[0] == length
+
+
+def _anchored(data, start, end, unit):
+    """
+    在 [start, end) 的可打印串中找带长度前缀的起点。
+
+    返回:
+        int: 起点；找不到时返回 None
+    """
+    for pos in range(start, end, unit):
+        chars = (end - pos) // unit
+        if _prefixed(data, pos, chars, 2) or _prefixed(data, pos, chars, 4):
+            return pos
+    return None
+
+
+def scan_part_names(data):
+    """
+    扫描二进制流中带长度前缀的 .prt 文件名。
+
+    参数:
+        data: 流内容
+
+    返回:
+        list: 文件名（只保留文件名部分，小写），按出现顺序，含重复
+    """
+    data = bytes(data)
+    found = []
+    for pattern, unit, encoding in ((_ASCII_NAME, 1, 'ascii'), (_UTF16_NAME, 2, 'utf-16-le')):
+        for match in pattern.finditer(data):
+            start = _anchored(data, match.start(), match.end(), unit)
+            if start is None:
+                continue
+            name = data[start:match.end()].decode(encoding, 'replace')
+            name = re.split(r'[\\/]', name)[-1].strip().lower()
+            if len(name) > 4:
+                found.append((start, name))
+    return [name for _, name in sorted(found)]
+
+
+def read_references(path):
+    """
+    读取零件引用的组件文件。
+
+    参数:
+        path: .prt 文件路径
+
+    返回:
+        dict: file、path、error、geometry_bytes（几何流字节数）和
+            references（组件文件名到引用次数的有序字典，不含自身）
+    """
+    entry = {
+        'file': os.path.basename(path),
+        'path': path,
+        'error': None,
+        'geometry_bytes': 0,
+        'references': OrderedDict(),
+    }
+    own = entry['file'].lower()
+    try:
+        with PrtContainer(path) as container:
+            sizes = container.stream_sizes()
+            entry['geometry_bytes'] = sum(sizes.get(name, 0) for name in GEOMETRY_STREAMS)
+            structure = container.read(STRUCTURE_STREAM) if STRUCTURE_STREAM in container else b''
+            extref = container.read(EXTREF_STREAM) if EXTREF_STREAM in container else b''
+    except (OSError, ContainerError) as e:
+        entry['error'] = str(e)
+        return entry
+
+    references = entry['references']
+    for name in scan_part_names(structure):
+        if name != own:
+            references[name] = references.get(name, 0) + 1
+    for name in scan_part_names(extref):
+        if name != own:
+            references.setdefault(name, 1)
+    return entry
+
+
+class AssemblyIndex:
+    """
+    文件夹级的装配依赖图。
+
+    节点以小写文件名标识（NX 按文件名查找组件）。
+
+    用法:
+        index = AssemblyIndex.from_folder('D:/project')
+        index.missing()                 # 缺失的组件
+        paths = index.leaves_first()    # 提取顺序
+        index.estimate_runtime()        # 预计耗时（秒）
+    """
+
+    def __init__(self, entries):
+        """
+        参数:
+            entries: read_references() 的结果列表
+        """
+        self.entries = OrderedDict()
+        self.conflicts = {}
+        # leaves_first() 发现的循环引用
+        self.cycles = []
+        for entry in entries:
+            key = entry['file'].lower()
+            if key in self.entries:
+                # 同名文件只取第一个，NX 也只会加载其中一个
+                self.conflicts.setdefault(key, [self.entries[key]['path']]).append(entry['path'])
+                continue
+            self.entries[key] = entry
+
+    @classmethod
+    def from_paths(cls, paths):
+        """读取一组零件文件"""
+        return cls([read_references(path) for path in paths])
+
+    @classmethod
+    def from_folder(cls, folder, pattern='*.prt', recursive=True):
+        """读取文件夹中的零件文件"""
+        return cls.from_paths(find_parts(folder, pattern, recursive))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name.lower() in self.entries
+
+    def children(self, name):
+        """
+        组件直接引用的文件。
+
+        返回:
+            OrderedDict: 文件名到引用次数
+        """
+        entry = self.entries.get(name.lower())
+        return entry['references'] if entry else OrderedDict()
+
+    def where_used(self, name):
+        """
+        直接引用了该文件的装配。
+
+        返回:
+            list: 装配文件名
+        """
+        key = name.lower()
+        return [parent for parent, entry in self.entries.items() if key in entry['references']]
+
+    def roots(self):
+        """
+        不被任何文件引用的顶层文件。
+
+        返回:
+            list: 文件名
+        """
+        used = set()
+        for entry in self.entries.values():
+            used.update(entry['references'])
+        return [name for name in self.entries if name not in used]
+
+    def missing(self):
+        """
+        引用了但文件夹中找不到的组件。
+
+        返回:
+            dict: 装配文件名到缺失组件列表
+        """
+        result = {}
+        for parent, entry in self.entries.items():
+            absent = [name for name in entry['references'] if name not in self.entries]
+            if absent:
+                result[parent] = absent
+        return result
+
+    def leaves_first(self):
+        """
+        先组件后装配的提取顺序。
+
+        遇到循环引用时断开回边继续排序，涉及的文件记录在 self.cycles 中。
+
+        返回:
+            list: 文件路径
+        """
+        order = []
+        state = {}
+        cyclic = []
+
+        for root in self.entries:
+            if root in state:
+                continue
+            # 迭代式后序遍历，避免深层装配超过递归深度
+            stack = [(root, iter(self.children(root)))]
+            state[root] = 'visiting'
+            while stack:
+                name, pending = stack[-1]
+                child = next(pending, None)
+                if child is None:
+                    stack.pop()
+                    state[name] = 'done'
+                    order.append(name)
+                    continue
+                if child not in self.entries:
+                    continue
+                if state.get(child) == 'visiting':
+                    cyclic.append(child)
+                    continue
+                if child not in state:
+                    state[child] = 'visiting'
+                    stack.append((child, iter(self.children(child))))
+
+        self.cycles = sorted(set(cyclic))
+        return [self.entries[name]['path'] for name in order]
+
+    def instance_counts(self, root):
+        """
+        展开装配，统计每个组件在 root 下的总数量。
+
+        先按后序遍历得到拓扑顺序（断开循环引用的回边），再自顶向下把数量
+        逐层相乘累加；每个组件只展开一次，重复使用的子装配不会按路径数
+        重复遍历。
+
+        参数:
+            root: 顶层文件名
+        返回:
+            dict: 组件文件名到数量（引用次数逐层相乘）
+        """
+        root = root.lower()
+        order = []
+        edges = {}
+        state = {root: 'visiting'}
+        stack = [(root, iter(self.children(root).items()))]
+        while stack:
+            name, pending = stack[-1]
+            item = next(pending, None)
+            if item is None:
+                stack.pop()
+                state[name] = 'done'
+                order.append(name)
+                continue
+            child, count = item
+            if state.get(child) == 'visiting':
+                continue
+            edges.setdefault(name, []).append((child, count))
+            if child not in state:
+                state[child] = 'visiting'
+                stack.append((child, iter(self.children(child).items())))
+
+        quantities = {root: 1}
+        for name in reversed(order):
+            quantity = quantities.get(name, 0)
+            for child, count in edges.get(name, ()):
+                quantities[child] = quantities.get(child, 0) + quantity * count
+        quantities.pop(root)
+        return quantities
+
+    def estimate_runtime(self, base_s=ESTIMATE_BASE_S, per_mb_s=ESTIMATE_PER_MB_S):
+        """
+        按几何流大小估算提取耗时。
+
+        参数:
+            base_s: 每个零件的固定开销（秒）
+            per_mb_s: 每 MB 几何流的耗时（秒）
+
+        返回:
+            float: 预计总耗时（秒）
+        """
+        total_mb = sum(e['geometry_bytes'] for e in self.entries.values()) / 1e6
+        return len(self.entries) * base_s + total_mb * per_mb_s
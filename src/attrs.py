@@ -0,0 +1,288 @@
+"""
+离线属性读取
+
+NX 把零件的用户属性以 XML 存在容器的 /Root/part/attrs 流中:
+
+    <UgAttributes version="4">
+      <Attribute owner="part" title="..." value="..." utf8title="..."
+                 utf8value="..." xsi:type="StringAttributeType"/>
+    </UgAttributes>
+
+这里直接解析这段 XML，不需要 NX 会话。批量模式把整个文件夹的
+属性建成一张可查询的表，用于报价前筛选零件。
+"""
+
+import fnmatch
+import os
+import xml.etree.ElementTree as ET
+
+from .container import ContainerError, PrtContainer
+from .materials import DEFAULT_ATTRIBUTES
+
+ATTRS_STREAM = '/Root/part/attrs'
+
+_XSI_TYPE = '{http://www.w3.org/2001/XMLSchema-instance}type'
+
+# 报价常用字段及其可能的属性名（不区分大小写，按顺序取第一个有值的）
+QUOTE_FIELDS = {
+    'part_number': ('DB_PART_NO', 'PART_NUMBER', 'PART_NO', 'PARTNO', '零件号', '图号'),
+    'revision': ('DB_PART_REV', 'REVISION', 'REV', '版本'),
+    'description': ('DB_PART_DESC', 'DESCRIPTION', 'DESC', '名称', '零件名称'),
+    'material': DEFAULT_ATTRIBUTES,
+    'customer': ('CUSTOMER', '客户'),
+    'quantity': ('QUANTITY', 'QTY', '数量'),
+    'finish': ('FINISH', 'SURFACE_FINISH', '表面处理'),
+}
+
+
+def _convert(value, kind):
+    """按属性类型转换取值，无法转换时保留字符串"""
+    if value is None:
+        return None
+    try:
+        if kind == 'IntegerAttributeType':
+            return int(value)
+        if kind in ('RealAttributeType', 'NumberAttributeType'):
+            return float(value)
+    except ValueError:
+        return value
+    if kind == 'BooleanAttributeType':
+        return value.strip().lower() in ('true', '1', 'yes')
+    return value
+
+
+def parse_attributes(data, owner='part'):
+    """
+    解析 attrs 流的 XML。
+
+    参数:
+        data: 流内容（bytes）
+        owner: 只保留该所有者的属性；None 表示全部保留
+
+    返回:
+        dict: 属性名到值的字典；整数、实数和布尔属性转换为对应类型
+    """
+    root = ET.fromstring(bytes(data))
+    attributes = {}
+    for node in root.iter('Attribute'):
+        if owner is not None and node.get('owner', owner) != owner:
+            continue
+        title = node.get('utf8title') or node.get('title')
+        if not title:
+            continue
+        value = node.get('utf8value')
+        if value is None:
+            value = node.get('value')
+        attributes[title] = _convert(value, node.get(_XSI_TYPE))
+    return attributes
+
+
+def read_attributes(path, owner='part'):
+    """
+    读取零件的用户属性。
+
+    参数:
+        path: .prt 文件路径
+        owner: 见 parse_attributes()
+
+    返回:
+        dict: 属性字典；没有 attrs 流时为空字典，
+            文件不可读或不是有效容器时返回 None
+    """
+    try:
+        with PrtContainer(path) as container:
+            if ATTRS_STREAM not in container:
+                return {}
+            data = container.read(ATTRS_STREAM)
+    except (OSError, ContainerError):
+        return None
+    try:
+        return parse_attributes(data, owner)
+    except ET.ParseError:
+        return None
+
+
+def quote_fields(attributes, fields=QUOTE_FIELDS):
+    """
+    从属性中取出报价常用字段。
+
+    参数:
+        attributes: 属性字典
+        fields: 字段名到候选属性名的字典
+
+    返回:
+        dict: 字段名到值的字典；找不到的字段为 None
+    """
+    lowered = {str(k).strip().lower(): v for k, v in attributes.items()}
+    result = {}
+    for field, names in fields.items():
+        result[field] = None
+        for name in names:
+            value = lowered.get(name.lower())
+            if value not in (None, ''):
+                result[field] = value
+                break
+    return result
+
+
+def _norm(value):
+    return str(value).strip().lower()
+
+
+class AttributeIndex:
+    """
+    文件夹级的属性表。
+
+    每行包含 file、path、error、QUOTE_FIELDS 中的字段和完整的 attributes。
+
+    用法:
+        index = AttributeIndex.from_folder('D:/parts')
+        rows = index.find(material='6061', customer='ACME')
+        rows = index.search('yttre')
+    """
+
+    def __init__(self, rows=None, fields=QUOTE_FIELDS):
+        """
+        初始化属性表。
+
+        参数:
+            rows: 已有的行列表
+            fields: 报价字段定义
+        """
+        self.fields = fields
+        self.rows = []
+        self._index = {}
+        for row in rows or ():
+            self.add(row)
+
+    @classmethod
+    def from_paths(cls, paths, fields=QUOTE_FIELDS):
+        """
+        读取一组零件的属性。
+
+        参数:
+            paths: .prt 文件路径列表
+            fields: 报价字段定义
+
+        返回:
+            AttributeIndex: 属性表
+        """
+        index = cls(fields=fields)
+        for path in paths:
+            attributes = read_attributes(path)
+            row = {
+                'file': os.path.basename(path),
+                'path': path,
+                'error': None if attributes is not None else "无法读取属性",
+            }
+            row.update(quote_fields(attributes or {}, fields))
+            row['attributes'] = attributes or {}
+            index.add(row)
+        return index
+
+    @classmethod
+    def from_folder(cls, folder, pattern='*.prt', recursive=True, fields=QUOTE_FIELDS):
+        """
+        为文件夹中的零件建立属性表。
+
+        参数:
+            folder: 文件夹路径
+            pattern: 文件名通配符（不区分大小写）
+            recursive: 是否包含子文件夹
+            fields: 报价字段定义
+
+        返回:
+            AttributeIndex: 属性表
+        """
+        return cls.from_paths(find_parts(folder, pattern, recursive), fields)
+
+    def add(self, row):
+        """添加一行并更新字段索引"""
+        position = len(self.rows)
+        self.rows.append(row)
+        for field in self.fields:
+            value = row.get(field)
+            if value is not None:
+                self._index.setdefault(field, {}).setdefault(_norm(value), []).append(position)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def find(self, **criteria):
+        """
+        按字段精确查找（不区分大小写）。
+
+        报价字段走索引；其他名称按原始属性名匹配。
+
+        参数:
+            **criteria: 字段名=值
+
+        返回:
+            list: 匹配的行
+        """
+        candidates = None
+        others = {}
+        for field, value in criteria.items():
+            if field in self.fields:
+                hits = set(self._index.get(field, {}).get(_norm(value), ()))
+                candidates = hits if candidates is None else candidates & hits
+            else:
+                others[field] = _norm(value)
+
+        positions = range(len(self.rows)) if candidates is None else sorted(candidates)
+        rows = [self.rows[i] for i in positions]
+        for name, value in others.items():
+            rows = [r for r in rows
+                    if name in r['attributes'] and _norm(r['attributes'][name]) == value]
+        return rows
+
+    def search(self, text):
+        """
+        在文件名和所有属性值中查找子串（不区分大小写）。
+
+        参数:
+            text: 要查找的文本
+
+        返回:
+            list: 匹配的行
+        """
+        needle = _norm(text)
+        return [row for row in self.rows
+                if needle in row['file'].lower()
+                or any(needle in _norm(v) for v in row['attributes'].values())]
+
+    def values(self, field):
+        """
+        统计字段的取值。
+
+        返回:
+            dict: 取值（规范化后）到零件数的字典
+        """
+        return {value: len(rows) for value, rows in self._index.get(field, {}).items()}
+
+
+def find_parts(folder, pattern='*.prt', recursive=True):
+    """
+    列出文件夹中的零件文件。
+
+    参数:
+        folder: 文件夹路径
+        pattern: 文件名通配符（不区分大小写）
+        recursive: 是否包含子文件夹
+
+    返回:
+        list: 排序后的文件路径列表
+    """
+    pattern = pattern.lower()
+    found = []
+    if recursive:
+        for root, _dirs, files in os.walk(folder):
+            found.extend(os.path.join(root, name) for name in files
+                         if fnmatch.fnmatch(name.lower(), pattern))
+    else:
+        found = [entry.path for entry in os.scandir(folder)
+                 if entry.is_file() and fnmatch.fnmatch(entry.name.lower(), pattern)]
+    return sorted(found)
@@ -0,0 +1,855 @@
+"""
+测量后端
+
+批处理通过后端打开零件、列出实体并逐个测量实体。
+NXBackend 调用 NXOpen；FakeBackend 根据文件内容生成确定性的
+合成几何，用于在没有 NX 的环境中运行和分析整个流程。
+
+所有后端返回的测量值都已换算为国际单位（m、m²、m³）。
+"""
+
+import math
+import os
+import random
+import time
+import zlib
+
+import numpy as np
+
+from .attrs import read_attributes
+from .bodies import BodyEnumerator
+from .container import fingerprint_part
+from .features import (CYLINDRICAL, FREEFORM, PLANAR, UF_BLEND, UF_CYLINDER, UF_FACE_CLASSES,
+                       UF_PLANE, UF_TORUS)
+
+# 显示单位 -> (长度, 面积, 体积) 到国际单位的换算系数
+UNIT_FACTORS = {
+    '毫米': (0.001, 1e-6, 1e-9),
+    '米': (1.0, 1.0, 1.0),
+    '英寸': (0.0254, 6.4516e-4, 1.6387e-5),
+}
+
+DEFAULT_UNIT = '毫米'
+
+# 边界框估算时的体积填充系数；取 1.0 即以边界框体积作为上限估算
+BBOX_FILL_FACTOR = 1.0
+
+# FakeBackend(leak_bytes=...) 模拟的会话泄漏，属于整个进程
+_LEAKED = []
+
+
+def bbox_estimate(min_point, max_point):
+    """
+    由边界框估算实体的体积和表面积。
+
+    参数:
+        min_point: 边界框最小角点 (m)
+        max_point: 边界框最大角点 (m)
+
+    返回:
+        dict: volume_m3、area_m2、min_point、max_point
+    """
+    lx, ly, lz = (max_point[i] - min_point[i] for i in range(3))
+    return {
+        'volume_m3': lx * ly * lz * BBOX_FILL_FACTOR,
+        'area_m2': 2.0 * (lx * ly + lx * lz + ly * lz),
+        'min_point': tuple(min_point),
+        'max_point': tuple(max_point),
+    }
+
+
+class NXPart:
+    """NXBackend 打开的零件句柄"""
+
+    def __init__(self, path, part, unit, units):
+        self.path = path
+        self.part = part
+        self.unit = unit
+        self.units = units
+        self.factors = UNIT_FACTORS.get(unit, UNIT_FACTORS[DEFAULT_UNIT])
+
+
+class NXBackend:
+    """
+    基于 NXOpen 的测量后端。
+
+    逻辑与 scripts/extract_mass_properties.py 中的 main() 一致：
+    用 Convert 方法检测显示单位，再逐个实体调用 NewMassProperties。
+    """
+
+    name = 'nx'
+
+    # NX 会话属于整个进程且不是线程安全的：即使各线程各建一个后端对象，
+    # 也是在同一个会话里打开和关闭零件，只能由一个线程调用
+    thread_safe = False
+
+    def __init__(self, session=None, strategy=None):
+        """
+        初始化后端。
+
+        参数:
+            session: NXOpen 会话对象。如果为 None，将在 connect() 时获取。
+            strategy: 实体枚举方式（见 bodies.py）；None 表示自动选择
+        """
+        self.session = session
+        self.strategy = strategy
+        self.uf_session = None
+        self.enumerator = None
+        self._nx = None
+
+    def connect(self):
+        """连接到 NX 会话"""
+        try:
+            import NXOpen
+            import NXOpen.UF
+            self._nx = NXOpen
+            if self.session is None:
+                self.session = NXOpen.Session.GetSession()
+            self.uf_session = NXOpen.UF.UFSession.GetUFSession()
+            self.enumerator = BodyEnumerator(self.uf_session, NXOpen.UF.UFConstants,
+                                             NXOpen.TaggedObjectManager.GetTaggedObject,
+                                             strategy=self.strategy)
+            return True
+        except Exception as e:
+            print(f"连接 NX 时出错: {e}")
+            return False
+
+    def _detect_unit(self, part):
+        """
+        检测零件的显示单位。
+
+        参数:
+            part: NXOpen.Part 对象
+
+        返回:
+            str: UNIT_FACTORS 中的单位名称
+        """
+        uc = part.UnitCollection
+        try:
+            mm_unit = uc.FindObject("MilliMeter")
+            m_unit = uc.FindObject("Meter")
+            inch_unit = uc.FindObject("Inch")
+            result = uc.Convert(mm_unit, m_unit, 1.0)
+            if abs(result - 0.001) < 0.0001:
+                return '毫米'
+            if abs(result - 1000.0) < 1.0:
+                return '米'
+            if 25.0 < uc.Convert(inch_unit, mm_unit, 1.0) < 26.0:
+                return '英寸'
+        except Exception:
+            pass
+
+        # Convert 方法无法判断时退回 GetBase 的单位标识
+        journal_id = uc.GetBase("长度").JournalIdentifier
+        if "MilliMeter" in journal_id:
+            return '毫米'
+        if "Meter" in journal_id:
+            return '米'
+        if "Inch" in journal_id:
+            return '英寸'
+        return DEFAULT_UNIT
+
+    def open_part(self, path):
+        """
+        打开零件。
+
+        参数:
+            path: .prt 文件路径
+
+        返回:
+            NXPart: 零件句柄
+        """
+        if self.enumerator is None and not self.connect():
+            raise RuntimeError("无法连接 NX 会话")
+
+        part = self.session.Parts.OpenBaseDisplay(path)[0]
+        uc = part.UnitCollection
+        units = [
+            uc.GetBase("面积"),
+            uc.GetBase("体积"),
+            uc.GetBase("质量"),
+            uc.GetBase("长度")
+        ]
+        return NXPart(path, part, self._detect_unit(part), units)
+
+    def part_attributes(self, handle):
+        """
+        读取零件的用户属性。
+
+        参数:
+            handle: open_part() 返回的句柄
+
+        返回:
+            dict: 属性名称和值的字典
+        """
+        attributes = {}
+        try:
+            for attr in handle.part.GetUserAttributes():
+                attributes[attr.Title] = attr.StringValue
+        except Exception:
+            pass
+        return attributes
+
+    def file_attributes(self, path):
+        """
+        不打开零件，从文件的 attrs 流读取用户属性。
+
+        几何相同的文件（重复文件、缓存命中）各有自己的属性，用它代替
+        另一个文件测量时读到的属性。
+
+        参数:
+            path: .prt 文件路径
+
+        返回:
+            dict: 属性名称和值的字典；文件不可读时为空字典
+        """
+        return read_attributes(path) or {}
+
+    def list_bodies(self, handle):
+        """
+        列出零件中需要测量的实体。
+
+        参数:
+            handle: open_part() 返回的句柄
+
+        返回:
+            list: 实体对象列表（不含片体、隐藏和已抑制的实体）
+        """
+        return self.enumerator.bodies(handle.part)
+
+    def measure_body(self, handle, body, accuracy):
+        """
+        测量单个实体。
+
+        参数:
+            handle: 零件句柄
+            body: 实体对象
+            accuracy: NewMassProperties 的精度参数
+
+        返回:
+            dict: volume_m3、area_m2、min_point、max_point、material
+        """
+        length_factor, area_factor, volume_factor = handle.factors
+        mass_props = handle.part.MeasureManager.NewMassProperties(
+            handle.units, accuracy, [body])
+
+        result = {
+            'volume_m3': mass_props.Volume * volume_factor,
+            'area_m2': mass_props.Area * area_factor,
+            'min_point': None,
+            'max_point': None,
+            'material': None,
+        }
+
+        try:
+            result['material'] = body.GetStringAttribute("MATERIAL")
+        except Exception:
+            pass
+
+        try:
+            box = self.uf_session.Modl.AskBoundingBox(body.Tag)
+            result['min_point'] = tuple(v * length_factor for v in box[0:3])
+            result['max_point'] = tuple(v * length_factor for v in box[3:6])
+        except Exception:
+            pass
+
+        return result
+
+    def estimate_body(self, handle, body):
+        """
+        精确测量失败时的降级估算：只查询边界框。
+
+        参数:
+            handle: 零件句柄
+            body: 实体对象
+
+        返回:
+            dict: 与 measure_body() 相同的字段
+        """
+        length_factor = handle.factors[0]
+        box = self.uf_session.Modl.AskBoundingBox(body.Tag)
+        return bbox_estimate([v * length_factor for v in box[0:3]],
+                             [v * length_factor for v in box[3:6]])
+
+    def body_topology(self, handle, body):
+        """
+        遍历实体的面和边，返回特征统计所需的数组（见 features.py）。
+
+        面数据来自 UF_MODL_ask_face_data：圆柱面取半径，圆环面和倒圆面
+        取截面半径；norm_dir 为 -1 时法向指向轴线，即凹面。平面的方向
+        是法向，乘以 norm_dir 得到外法向。
+
+        参数:
+            handle: 零件句柄
+            body: 实体对象
+
+        返回:
+            dict: face_class、face_radius、face_concave、face_axis、face_plane、face_box、
+                edge_length
+        """
+        length_factor = handle.factors[0]
+        modl = self.uf_session.Modl
+        faces = body.GetFaces()
+        n = len(faces)
+        face_class = np.full(n, FREEFORM, dtype=np.int8)
+        radius = np.full(n, np.nan)
+        concave = np.zeros(n, dtype=bool)
+        axis = np.full((n, 6), np.nan)
+        plane = np.full((n, 6), np.nan)
+        box = np.zeros((n, 6))
+        for i, face in enumerate(faces):
+            kind, point, direction, face_box, major, minor, norm_dir = modl.AskFaceData(face.Tag)
+            face_class[i] = UF_FACE_CLASSES.get(kind, FREEFORM)
+            box[i] = face_box
+            if kind == UF_CYLINDER:
+                radius[i] = major
+            elif kind in (UF_TORUS, UF_BLEND):
+                radius[i] = minor
+            if kind in (UF_CYLINDER, UF_TORUS, UF_BLEND):
+                concave[i] = norm_dir < 0
+                axis[i, :3] = point
+                axis[i, 3:] = direction
+            elif kind == UF_PLANE:
+                plane[i, :3] = point
+                plane[i, 3:] = [v * norm_dir for v in direction]
+
+        edges = np.array([edge.GetLength() for edge in body.GetEdges()], dtype=float)
+        radius *= length_factor
+        axis[:, :3] *= length_factor
+        plane[:, :3] *= length_factor
+        box *= length_factor
+        return {
+            'face_class': face_class,
+            'face_radius': radius,
+            'face_concave': concave,
+            'face_axis': axis,
+            'face_plane': plane,
+            'face_box': box,
+            'edge_length': edges * length_factor,
+        }
+
+    def close_part(self, handle):
+        """关闭所有零件，依次尝试不同版本的参数形式"""
+        # 只清除本零件的枚举缓存，其他零件的条目保留
+        self.enumerator.forget(handle.part)
+        NXOpen = self._nx
+        parts = self.session.Parts
+        try:
+            parts.CloseAll(NXOpen.BasePart.CloseModified.DoNotCloseModified,
+                           NXOpen.BasePart.CloseResponses.ProceedWithClose)
+        except Exception:
+            try:
+                parts.CloseAll(1, 1)
+            except Exception:
+                parts.CloseAll(2, 2)
+
+    def open_part_count(self):
+        """会话中当前加载的零件数；无法查询时返回 None"""
+        if self.session is None:
+            return None
+        try:
+            return len(list(self.session.Parts))
+        except Exception:
+            return None
+
+    def close(self):
+        """
+        释放后端持有的会话对象和枚举缓存。
+
+        NX 会话属于宿主进程，这里只丢弃引用，下次 open_part() 时重新连接。
+        """
+        if self.enumerator is not None:
+            self.enumerator.forget()
+        self.enumerator = None
+        self.uf_session = None
+        self._nx = None
+
+
+def _topology(classes, radius, concave, axis, plane, box, edges):
+    """面和边的列表转换为 body_topology() 的数组字典"""
+    return {
+        'face_class': np.array(classes, dtype=np.int8),
+        'face_radius': np.array(radius, dtype=float),
+        'face_concave': np.array(concave, dtype=bool),
+        'face_axis': np.array(axis, dtype=float).reshape(-1, 6),
+        'face_plane': np.array(plane, dtype=float).reshape(-1, 6),
+        'face_box': np.array(box, dtype=float).reshape(-1, 6),
+        'edge_length': np.array(edges, dtype=float),
+    }
+
+
+# FakeBackend 随机分配的零件材料，None 表示未设置材料属性
+FAKE_MATERIALS = ('Q235', 'Q235', '45#', '6061', 'SUS304', None)
+
+
+class FakeUFConstants:
+    """与 NXOpen.UF.UFConstants 同名的常量"""
+
+    UF_solid_type = 70
+    UF_solid_body_subtype = 0
+
+
+class FakeFeature:
+    def __init__(self, suppressed=False):
+        self.Suppressed = suppressed
+
+
+class FakeBody:
+    """
+    FakeBackend 生成的实体：一个带填充率的长方体，属性名与 NXOpen.Body 一致。
+
+    sheet_metal 不为空时是一个钣金件：厚 thickness、展开 length × width 的板，
+    在长度方向的一端或两端向上折出高 flange 的边，底板上有若干通孔；
+    origin 和 size 为折弯后的边界框。
+    """
+
+    def __init__(self, tag, origin, size, fill, sheet=False, blanked=False, suppressed=False,
+                 fault=None, sheet_metal=None):
+        self.Tag = tag
+        self.fault = fault
+        self.origin = origin
+        self.size = size
+        self.fill = fill
+        self.sheet_metal = sheet_metal
+        self.IsSheetBody = sheet
+        self.IsSolidBody = not sheet
+        self.IsBlanked = blanked
+        self._features = [FakeFeature(suppressed)]
+
+    def GetFeatures(self):
+        return self._features
+
+
+class FakeBodyCollection:
+    """模拟 part.Bodies，记录调用次数"""
+
+    def __init__(self, bodies):
+        self._bodies = bodies
+        self.calls = 0
+
+    def ToArray(self):
+        self.calls += 1
+        return list(self._bodies)
+
+    def __iter__(self):
+        return iter(self._bodies)
+
+
+class FakeUFObj:
+    """模拟 UF Obj 接口，记录往返次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self._next = {}
+        self._first = {}
+        self._objects = {}
+
+    def register(self, part_tag, bodies):
+        tags = [b.Tag for b in bodies]
+        self._first[part_tag] = tags[0] if tags else 0
+        for tag, following in zip(tags, tags[1:] + [0]):
+            self._next[tag] = following
+        for body in bodies:
+            self._objects[body.Tag] = body
+
+    def unregister(self, bodies):
+        for body in bodies:
+            self._next.pop(body.Tag, None)
+            self._objects.pop(body.Tag, None)
+
+    def CycleObjsInPart(self, part_tag, obj_type, tag):
+        self.calls += 1
+        if tag == 0:
+            return self._first.get(part_tag, 0)
+        return self._next.get(tag, 0)
+
+    def AskTypeAndSubtype(self, tag):
+        self.calls += 1
+        return FakeUFConstants.UF_solid_type, FakeUFConstants.UF_solid_body_subtype
+
+    def GetTaggedObject(self, tag):
+        self.calls += 1
+        return self._objects[tag]
+
+
+class FakeUFSession:
+    def __init__(self):
+        self.Obj = FakeUFObj()
+
+
+class FakePart:
+    """FakeBackend 打开的零件句柄，同时充当 NXOpen.Part"""
+
+    def __init__(self, path, tag, bodies, unit=DEFAULT_UNIT, attributes=None):
+        self.path = path
+        self.Tag = tag
+        self.Bodies = FakeBodyCollection(bodies)
+        self.bodies = bodies
+        self.unit = unit
+        self.attributes = attributes or {}
+
+    @property
+    def part(self):
+        return self
+
+
+class FakeBackend:
+    """
+    不依赖 NX 的合成测量后端。
+
+    几何由文件指纹（文件不存在时由路径）作为随机种子生成，
+    因此内容相同的文件得到相同的测量结果。零件和实体对象模拟
+    NXOpen 的接口，实体枚举走与 NXBackend 相同的 BodyEnumerator。
+    """
+
+    name = 'fake'
+
+    # 每个实例的状态互相独立，不同线程各用一个实例即可
+    thread_safe = True
+
+    def __init__(self, body_count=None, delay=0.0, seed=0, strategy=None,
+                 sheet_ratio=0.0, hidden_ratio=0.0, error_ratio=0.0, hang_ratio=0.0,
+                 hang_time=30.0, leak_bytes=0, sheet_metal_ratio=0.0):
+        """
+        初始化后端。
+
+        参数:
+            body_count: 每个零件的实体数；None 表示随机 1-8 个
+            delay: 每个实体测量的模拟耗时（秒）
+            seed: 附加随机种子
+            strategy: 实体枚举方式；None 表示自动选择
+            sheet_ratio: 额外生成的片体占实体数的比例
+            hidden_ratio: 额外生成的隐藏实体占实体数的比例
+            error_ratio: 测量时抛出异常的实体比例（模拟坏几何）
+            hang_ratio: 测量时卡住的实体比例
+            hang_time: 卡住的实体测量耗时（秒）
+            leak_bytes: 每打开一个零件不释放的内存（字节），模拟 NX 会话的泄漏；
+                只有进程退出时才释放（子进程工作者的回收会结束进程）
+            sheet_metal_ratio: 钣金零件的比例；钣金零件由 1-2 个折弯板组成
+        """
+        self.body_count = body_count
+        self.delay = delay
+        self.seed = seed
+        self.sheet_ratio = sheet_ratio
+        self.hidden_ratio = hidden_ratio
+        self.error_ratio = error_ratio
+        self.hang_ratio = hang_ratio
+        self.hang_time = hang_time
+        self.sheet_metal_ratio = sheet_metal_ratio
+        self.leak_bytes = leak_bytes
+        self._open = 0
+        self.uf_session = FakeUFSession()
+        self.enumerator = BodyEnumerator(self.uf_session, FakeUFConstants,
+                                         self.uf_session.Obj.GetTaggedObject,
+                                         strategy=strategy)
+        self._next_tag = 1
+
+    def connect(self):
+        return True
+
+    def _part_seed(self, path):
+        if os.path.isfile(path):
+            key = fingerprint_part(path)
+        else:
+            key = os.path.basename(path)
+        return zlib.crc32(key.encode('utf-8')) ^ self.seed
+
+    def _tag(self):
+        tag = self._next_tag
+        self._next_tag += 1
+        return tag
+
+    def open_part(self, path):
+        """根据路径生成确定性的合成零件"""
+        rng = random.Random(self._part_seed(path))
+        count = self.body_count if self.body_count is not None else rng.randint(1, 8)
+
+        bodies = []
+        for i in range(count):
+            size = (rng.uniform(0.005, 0.3), rng.uniform(0.005, 0.3), rng.uniform(0.002, 0.2))
+            origin = (rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05))
+            bodies.append(FakeBody(self._tag(), origin, size, rng.uniform(0.3, 0.95)))
+
+        # 钣金零件使用独立的随机序列，不影响其他零件的几何
+        sheet_rng = random.Random(self._part_seed(path) + 2)
+        if sheet_rng.random() < self.sheet_metal_ratio:
+            bodies = [self._sheet_metal_body(sheet_rng) for _ in range(sheet_rng.randint(1, 2))]
+
+        # 故障使用独立的随机序列，不影响几何
+        fault_rng = random.Random(self._part_seed(path) + 1)
+        for body in bodies:
+            roll = fault_rng.random()
+            if roll < self.error_ratio:
+                body.fault = 'error'
+            elif roll < self.error_ratio + self.hang_ratio:
+                body.fault = 'hang'
+
+        # 不参与测量的片体和隐藏实体，交错插入
+        for _ in range(int(count * self.sheet_ratio)):
+            bodies.insert(rng.randrange(len(bodies) + 1),
+                          FakeBody(self._tag(), (0, 0, 0), (0.1, 0.1, 0.0), 0.0, sheet=True))
+        for _ in range(int(count * self.hidden_ratio)):
+            bodies.insert(rng.randrange(len(bodies) + 1),
+                          FakeBody(self._tag(), (0, 0, 0), (0.1, 0.1, 0.1), 1.0, blanked=True))
+
+        part = FakePart(path, self._tag(), bodies, attributes=self.file_attributes(path))
+        self.uf_session.Obj.register(part.Tag, bodies)
+        if self.leak_bytes:
+            # 与 NX 会话一样挂在进程上，关闭零件、丢弃后端对象都不会释放
+            _LEAKED.append(bytearray(self.leak_bytes))
+        self._open += 1
+        return part
+
+    def _sheet_metal_body(self, rng):
+        """生成一个折弯板实体"""
+        t = rng.choice((0.001, 0.0015, 0.002, 0.003, 0.005))
+        length = rng.uniform(0.05, 0.8)
+        width = rng.uniform(0.03, 0.5)
+        bends = rng.choice((0, 0, 1, 2))
+        flange = rng.uniform(0.01, min(0.05, length / 4, width / 2)) if bends else 0.0
+        base = length - bends * flange
+        holes = []
+        for _ in range(rng.randint(0, 6)):
+            d = rng.choice((0.0045, 0.0055, 0.0066, 0.009, 0.011))
+            if d < min(base, width) / 3:
+                holes.append((rng.uniform(d, base - d), rng.uniform(d, width - d), d))
+        spec = {'thickness': t, 'length': length, 'width': width, 'bends': bends,
+                'flange': flange, 'radius': t, 'holes': holes}
+        origin = (rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05))
+        size = (base, width, flange if bends else t)
+        return FakeBody(self._tag(), origin, size, 1.0, sheet_metal=spec)
+
+    def part_attributes(self, handle):
+        return dict(handle.attributes)
+
+    def file_attributes(self, path):
+        """
+        文件 attrs 流中的属性；没有 MATERIAL 属性时按种子补一个合成材料，
+        因此内容相同但材料属性不同的文件得到不同的材料。
+        """
+        attributes = (read_attributes(path) if os.path.isfile(path) else None) or {}
+        if 'MATERIAL' not in attributes:
+            material = random.Random(self._part_seed(path) + 3).choice(FAKE_MATERIALS)
+            if material:
+                attributes['MATERIAL'] = material
+        return attributes
+
+    def list_bodies(self, handle):
+        return self.enumerator.bodies(handle)
+
+    def measure_body(self, handle, body, accuracy):
+        """
+        返回合成实体的测量值。
+
+        精度低于 0.99 时耗时按比例缩短（最低 1/10），体积和面积带有
+        不超过 (0.99 - 精度) 的确定性相对偏差，用于模拟低精度快速测量。
+        """
+        if self.delay:
+            time.sleep(self.delay * max(0.1, 1.0 - (0.99 - accuracy) * 10.0))
+        if body.fault == 'error':
+            raise RuntimeError(f"NewMassProperties 失败 (实体 {body.Tag})")
+        if body.fault == 'hang':
+            time.sleep(self.hang_time)
+
+        lx, ly, lz = body.size
+        volume = lx * ly * lz * body.fill
+        # 挖空越多，内表面越大
+        area = 2.0 * (lx * ly + lx * lz + ly * lz) * (2.0 - body.fill)
+        if body.sheet_metal:
+            volume, area = self._sheet_metal_measure(body.sheet_metal)
+        ox, oy, oz = body.origin
+        # 由几何决定的 [-1, 1) 偏差方向，同一实体每次测量一致
+        bias = max(0.0, 0.99 - accuracy) * ((body.fill * 1000.0) % 2.0 - 1.0)
+        return {
+            'volume_m3': volume * (1.0 + bias),
+            'area_m2': area * (1.0 + bias),
+            'min_point': (ox, oy, oz),
+            'max_point': (ox + lx, oy + ly, oz + lz),
+            'material': None,
+        }
+
+    @staticmethod
+    def _sheet_metal_measure(spec):
+        """折弯板的体积和面积：展开面积 × 板厚，两面加上轮廓侧面"""
+        t = spec['thickness']
+        holes = [d for _x, _y, d in spec['holes']]
+        flat = spec['length'] * spec['width'] - sum(math.pi * d * d / 4 for d in holes)
+        perimeter = 2.0 * (spec['length'] + spec['width']) + sum(math.pi * d for d in holes)
+        return flat * t, 2.0 * flat + perimeter * t
+
+    def body_topology(self, handle, body):
+        """
+        合成实体的面和边：长方体的 6 个平面和 12 条边，加上由几何决定的
+        若干通孔（每个拆成两个半圆柱面）和竖直内圆角（四分之一圆柱面）。
+        钣金实体见 _sheet_metal_topology()。
+        """
+        if self.delay:
+            time.sleep(self.delay)
+        if body.sheet_metal:
+            return self._sheet_metal_topology(body)
+        rng = random.Random(zlib.crc32(repr(body.size).encode('ascii')))
+        ox, oy, oz = body.origin
+        lx, ly, lz = body.size
+
+        classes = [PLANAR] * 6
+        radius = [math.nan] * 6
+        concave = [False] * 6
+        axis = [[math.nan] * 6 for _ in range(6)]
+        plane = []
+        box = []
+        corner = (ox, oy, oz)
+        far = (ox + lx, oy + ly, oz + lz)
+        for k in range(3):
+            for sign, at in ((-1.0, corner[k]), (1.0, far[k])):
+                normal = [0.0, 0.0, 0.0]
+                normal[k] = sign
+                plane.append(list(corner) + normal)
+                plane[-1][k] = at
+                low, high = list(corner), list(far)
+                low[k] = high[k] = at
+                box.append(low + high)
+        edges = [lx] * 4 + [ly] * 4 + [lz] * 4
+
+        for _ in range(rng.randint(0, 4)):
+            d = rng.choice((0.005, 0.0068, 0.0085, 0.0105, 0.013))
+            if d < min(lx, ly) / 2:
+                cx = ox + rng.uniform(d, lx - d)
+                cy = oy + rng.uniform(d, ly - d)
+                # 上下两个半圆柱面各覆盖半个圆周
+                for half in ((-1, 1), (-1, -1)):
+                    classes.append(CYLINDRICAL)
+                    radius.append(d / 2)
+                    concave.append(True)
+                    axis.append([cx, cy, oz, 0.0, 0.0, float(half[1])])
+                    plane.append([math.nan] * 6)
+                    box.append([cx - d / 2, cy + min(half[1], 0) * d / 2, oz,
+                                cx + d / 2, cy + max(half[1], 0) * d / 2, oz + lz])
+                    edges.extend([math.pi * d / 2, math.pi * d / 2, lz])
+
+        for _ in range(rng.randint(0, 4)):
+            r = rng.choice((0.001, 0.002, 0.003, 0.005))
+            cx, cy = ox + r, oy + r
+            classes.append(CYLINDRICAL)
+            radius.append(r)
+            concave.append(True)
+            axis.append([cx, cy, oz, 0.0, 0.0, 1.0])
+            plane.append([math.nan] * 6)
+            box.append([ox, oy, oz, cx, cy, oz + lz])
+            edges.extend([math.pi * r / 2, math.pi * r / 2, lz])
+
+        for _ in range(rng.randint(0, 2)):
+            classes.append(FREEFORM)
+            radius.append(math.nan)
+            concave.append(False)
+            axis.append([math.nan] * 6)
+            plane.append([math.nan] * 6)
+            box.append([ox, oy, oz, ox + lx, oy + ly, oz + lz])
+            edges.append(rng.uniform(0.2, 1.0) * (lx + ly))
+
+        return _topology(classes, radius, concave, axis, plane, box, edges)
+
+    @staticmethod
+    def _sheet_metal_topology(body):
+        """
+        折弯板的面：底板上下两面、两侧的窄面，每个折边的内外两面和端面，
+        每个折弯的内侧凹圆柱面（半径 r）和外侧凸圆柱面（半径 r + t），
+        以及底板上每个通孔的两个半圆柱面。
+        """
+        spec = body.sheet_metal
+        t, r, h = spec['thickness'], spec['radius'], spec['flange']
+        ox, oy, oz = body.origin
+        lx, ly, lz = body.size
+        nan = [math.nan] * 6
+        classes, radius, concave, axis, plane, box = [], [], [], [], [], []
+
+        def flat(point, normal, low, high):
+            classes.append(PLANAR)
+            radius.append(math.nan)
+            concave.append(False)
+            axis.append(nan)
+            plane.append(list(point) + list(normal))
+            box.append(list(low) + list(high))
+
+        def round_face(r_face, inside, centre, direction, low, high):
+            classes.append(CYLINDRICAL)
+            radius.append(r_face)
+            concave.append(inside)
+            axis.append(list(centre) + list(direction))
+            plane.append(nan)
+            box.append(list(low) + list(high))
+
+        flat((ox, oy, oz), (0, 0, -1), (ox, oy, oz), (ox + lx, oy + ly, oz))
+        flat((ox, oy, oz + t), (0, 0, 1), (ox, oy, oz + t), (ox + lx, oy + ly, oz + t))
+        flat((ox, oy, oz), (0, -1, 0), (ox, oy, oz), (ox + lx, oy, oz + lz))
+        flat((ox, oy + ly, oz), (0, 1, 0), (ox, oy + ly, oz), (ox + lx, oy + ly, oz + lz))
+
+        # 折边依次在 x 最小端和 x 最大端；没有折边的一端是端面
+        for end in range(2):
+            x_out = ox if end == 0 else ox + lx
+            out = -1.0 if end == 0 else 1.0
+            if end < spec['bends']:
+                x_in = x_out - out * t
+                flat((x_out, oy, oz), (out, 0, 0), (x_out, oy, oz), (x_out, oy + ly, oz + h))
+                flat((x_in, oy, oz), (-out, 0, 0), (x_in, oy, oz + t + r),
+                     (x_in, oy + ly, oz + h))
+                flat((x_out, oy, oz + h), (0, 0, 1), (min(x_in, x_out), oy, oz + h),
+                     (max(x_in, x_out), oy + ly, oz + h))
+                centre = (x_in - out * r, oy, oz + t + r)
+                low = (min(x_out, centre[0]), oy, oz)
+                high = (max(x_out, centre[0]), oy + ly, centre[2])
+                round_face(r, True, centre, (0, 1, 0), low, high)
+                round_face(r + t, False, centre, (0, 1, 0), low, high)
+            else:
+                flat((x_out, oy, oz), (out, 0, 0), (x_out, oy, oz), (x_out, oy + ly, oz + t))
+
+        edges = [2.0 * (spec['length'] + spec['width'])] * 2 + [t] * 8
+        for x, y, d in spec['holes']:
+            cx, cy = ox + x, oy + y
+            for side in (1.0, -1.0):
+                round_face(d / 2, True, (cx, cy, oz), (0, 0, side),
+                           (cx - d / 2, cy + min(side, 0) * d / 2, oz),
+                           (cx + d / 2, cy + max(side, 0) * d / 2, oz + t))
+                edges.extend([math.pi * d / 2, math.pi * d / 2, t])
+        return _topology(classes, radius, concave, axis, plane, box, edges)
+
+    def estimate_body(self, handle, body):
+        """边界框估算"""
+        ox, oy, oz = body.origin
+        lx, ly, lz = body.size
+        return bbox_estimate((ox, oy, oz), (ox + lx, oy + ly, oz + lz))
+
+    def close_part(self, handle):
+        self.enumerator.forget(handle)
+        self.uf_session.Obj.unregister(handle.bodies)
+        self._open -= 1
+
+    def open_part_count(self):
+        return self._open
+
+    def close(self):
+        """清空实体枚举缓存"""
+        self.enumerator.forget()
+
+
+BACKENDS = {
+    'nx': NXBackend,
+    'fake': FakeBackend,
+}
+
+
+def get_backend(name, **kwargs):
+    """
+    按名称创建后端。
+
+    参数:
+        name: 'nx' 或 'fake'
+        **kwargs: 传给后端构造函数的参数
+
+    返回:
+        后端实例
+    """
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的后端: {name}（可选: {', '.join(BACKENDS)}）")
+    return cls(**kwargs)
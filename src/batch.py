@@ -0,0 +1,795 @@
+"""
+批量提取
+
+按零件逐个打开、测量并汇总实体，输出与 main() 相同口径的零件记录。
+内容相同的文件只测量一次，测量后再标记几何重复与近似重复的零件。
+启用缓存时，已测量过的指纹直接复用缓存结果，只重算派生列。
+
+单个实体测量失败或超时不会影响其他实体：失败的实体记录结构化错误，
+并尽量用边界框估算代替；零件按实体结果标记 accuracy_level:
+    exact: 所有实体精确测量
+    estimated: 部分实体为估算值
+    partial: 有实体既无测量也无估算，合计值偏小
+    failed: 所有实体都失败，零件记录同时写入 error，不参与计价
+
+打开零件、读取属性和列出实体同样在看门狗中执行。某个调用超时后，
+本零件其余实体只做边界框估算；处理完该零件后重建工作者的后端和
+看门狗，卡住的会话不会拖住下一个零件。
+
+workers 大于 1 时，需要测量的零件按预计耗时由工作窃取调度器分给
+多个工作线程，每个线程使用自己的后端实例（见 scheduler.py）。只有
+thread_safe 的后端可以在线程中并行：NX 会话属于整个进程，各线程的
+后端对象仍在同一个会话中打开和关闭零件。NX 后端多个工作者时需要
+processes=True，调度仍在主进程的工作线程中进行，每个线程把分到的
+零件交给自己的子进程。
+给出 runtime（由历史库拟合的 RuntimeModel，见 runtime.py）时，预计
+耗时由该模型给出；estimate() 在开始前估计整批的完工时间。
+运行结束后 summary 中记录零件数、缓存命中和调度统计。
+
+processes=True 时每个工作者在自己的子进程中测量（各自的 NX 会话，
+见 workers.py）。设置 recycle_after 或 max_rss_mb 时，子进程每处理
+N 个零件或自身内存超过阈值后结束并由新的子进程接替，泄漏的内存随
+进程释放；进程内重建后端释放不了 NX 会话的内存，因此回收只用于
+子进程。summary['memory'] 记录主进程的峰值和平均内存，以及各工作者
+处理的零件数、子进程内存和按原因统计的回收次数（见 resources.py）。
+
+features=True 时测量完实体后再遍历其面和边，统计面类型、孔、最小
+内圆角和边长（见 features.py），耗时记入 feature_time_s。
+sheet_metal=True 时由同一次遍历识别钣金件并计算板厚、展开面积、
+展开尺寸、切割长度和折弯数（见 sheetmetal.py），耗时同样记入
+feature_time_s。
+
+给出 progress（ProgressTracker，见 progress.py）时，每个工作者测量完
+一个零件就更新自己的进度计数，由后台线程定时输出进度条、状态文件
+或 HTTP 状态端点。
+"""
+
+import copy
+import os
+import pickle
+import time
+
+from .backends import get_backend
+from .cache import ResultCache
+from .container import fingerprint_part
+from .dedupe import group_by_fingerprint, flag_duplicates, NEAR_TOLERANCE
+from .features import body_features, part_features
+from .materials import MaterialLibrary, apply_materials
+from .metrics import StockAllowance, apply_derived
+from .resources import MemoryMonitor, RecyclePolicy, to_mb, worker_usage
+from .scheduler import CostModel, WorkStealingScheduler, simulate
+from .sheetmetal import body_sheet_metal, part_sheet_metal
+from .watchdog import Deadline, MeasureTimeout, Watchdog
+from .workers import PROCESS_GRACE_S, ProcessWorker
+
+# NewMassProperties 的默认精度
+DEFAULT_ACCURACY = 0.99
+
+
+def summarize_bodies(bodies):
+    """
+    汇总实体测量值为零件级数值。
+
+    参数:
+        bodies: 实体记录列表
+
+    返回:
+        dict: volume_m3、area_m2、边界框尺寸和角点
+    """
+    volume = sum(b['volume_m3'] for b in bodies if b.get('volume_m3') is not None)
+    area = sum(b['area_m2'] for b in bodies if b.get('area_m2') is not None)
+
+    mins = [b['min_point'] for b in bodies if b.get('min_point') is not None]
+    maxs = [b['max_point'] for b in bodies if b.get('max_point') is not None]
+    if mins and maxs:
+        min_point = tuple(min(p[i] for p in mins) for i in range(3))
+        max_point = tuple(max(p[i] for p in maxs) for i in range(3))
+        length, width, height = (max_point[i] - min_point[i] for i in range(3))
+    else:
+        min_point = max_point = None
+        length = width = height = None
+
+    return {
+        'volume_m3': volume,
+        'area_m2': area,
+        'length_m': length,
+        'width_m': width,
+        'height_m': height,
+        'min_point': min_point,
+        'max_point': max_point,
+    }
+
+
+def body_error(index, stage, kind, message, elapsed):
+    """
+    构造实体错误记录。
+
+    参数:
+        index: 实体序号（从 1 开始）
+        stage: 出错阶段，'measure'、'estimate' 或 'features'
+        kind: 错误类别：'timeout'、'part_timeout'、'skipped' 或异常类名
+        message: 错误信息
+        elapsed: 耗时（秒）
+
+    返回:
+        dict: 错误记录
+    """
+    return {
+        'index': index,
+        'stage': stage,
+        'kind': kind,
+        'message': message,
+        'elapsed_s': round(elapsed, 3),
+    }
+
+
+def failed_body(index):
+    """没有任何测量值的实体记录"""
+    return {
+        'index': index,
+        'measure_status': 'failed',
+        'volume_m3': None,
+        'area_m2': None,
+        'min_point': None,
+        'max_point': None,
+        'material': None,
+    }
+
+
+def accuracy_level(bodies):
+    """
+    根据实体状态判断零件结果的可信程度。
+
+    参数:
+        bodies: 实体记录列表
+
+    返回:
+        str: 'exact'、'estimated'、'partial' 或 'failed'
+    """
+    statuses = {b['measure_status'] for b in bodies}
+    if not statuses or statuses == {'ok'}:
+        return 'exact'
+    if statuses == {'failed'}:
+        return 'failed'
+    if 'failed' in statuses:
+        return 'partial'
+    return 'estimated'
+
+
+class BatchRunner:
+    """
+    批量提取零件参数。
+
+    用法:
+        runner = BatchRunner(backend='fake')
+        records = runner.run(['tests/m.prt', 'tests/mm.prt'])
+    """
+
+    def __init__(self, backend='nx', accuracy=DEFAULT_ACCURACY, materials=None,
+                 near_tolerance=NEAR_TOLERANCE, cache=None, allowance=None,
+                 body_timeout=None, part_timeout=None, workers=1, processes=False,
+                 recycle_after=None, max_rss_mb=None, memory_interval=0.5, features=False,
+                 sheet_metal=False, runtime=None, progress=None):
+        """
+        初始化批处理。
+
+        参数:
+            backend: 后端名称或后端实例
+            accuracy: 测量精度
+            materials: MaterialLibrary、材料库 YAML 路径或 None（内置材料表）
+            near_tolerance: 近似重复的相对容差
+            cache: ResultCache、缓存目录或 None（不缓存）
+            allowance: 毛坯余量 StockAllowance；None 使用默认余量
+            body_timeout: 单个实体测量的时限（秒）；None 表示不限
+            part_timeout: 单个零件的时间预算（秒）；超出后其余实体改用估算
+            workers: 工作者数；大于 1 时 backend 必须是名称或无参工厂函数，
+                且后端是线程安全的或使用子进程（NX 后端多个工作者需要 processes）
+            processes: 是否在子进程中测量；backend 必须是名称或可 pickle 的工厂
+            recycle_after: 每个子进程处理多少个零件后重启；None 表示不限
+            max_rss_mb: 子进程内存超过该值（MB）时重启；None 表示不限
+            memory_interval: 内存采样间隔（秒）
+            features: 是否提取面、孔、内圆角和边长等几何特征
+            sheet_metal: 是否识别钣金件并计算展开指标
+            runtime: 可选，拟合好的 RuntimeModel，用于调度和 estimate() 的耗时预测
+            progress: 可选，ProgressTracker，运行期间输出进度和吞吐量
+        """
+        spec = backend
+        if isinstance(backend, str):
+            self._backend_factory = lambda name=backend: get_backend(name)
+            backend = self._backend_factory()
+        elif isinstance(backend, type) or not hasattr(backend, 'open_part'):
+            self._backend_factory = backend
+            backend = backend()
+        else:
+            if workers > 1:
+                raise ValueError("多个工作线程需要后端名称或工厂函数，不能共用一个后端实例")
+            self._backend_factory = None
+        if workers > 1 and not processes and not getattr(backend, 'thread_safe', False):
+            raise ValueError(f"后端 {backend.name} 不是线程安全的，多个工作者需要 processes=True")
+        if (recycle_after or max_rss_mb) and not processes:
+            raise ValueError("按零件数或内存回收需要子进程工作者（processes=True）："
+                             "进程内重建后端释放不了会话的内存")
+        if processes:
+            if self._backend_factory is None:
+                raise ValueError("子进程工作者需要后端名称或工厂函数，不能使用后端实例")
+            try:
+                pickle.dumps(spec)
+            except Exception:
+                raise ValueError("子进程工作者的后端工厂必须可以 pickle"
+                                 "（类、模块级函数或 functools.partial）")
+        if materials is None:
+            materials = MaterialLibrary()
+        elif isinstance(materials, str):
+            materials = MaterialLibrary.from_yaml(materials)
+        if isinstance(cache, str):
+            cache = ResultCache(cache)
+        if (features or sheet_metal) and not hasattr(backend, 'body_topology'):
+            raise ValueError(f"后端 {backend.name} 不支持特征提取")
+        self.backend = backend
+        self.accuracy = accuracy
+        self.materials = materials
+        self.near_tolerance = near_tolerance
+        self.cache = cache
+        self.allowance = allowance or StockAllowance()
+        self.body_timeout = body_timeout
+        self.part_timeout = part_timeout
+        self.watchdog = Watchdog()
+        self.workers = workers
+        self.processes = processes
+        self.recycle = RecyclePolicy(recycle_after, max_rss_mb)
+        self._backend_spec = spec
+        self.cost_model = CostModel(cache, runtime=runtime)
+        self.memory_interval = memory_interval
+        self.features = features
+        self.sheet_metal = sheet_metal
+        self.progress = progress
+        self.summary = {}
+        self._monitor = None
+        self._usage = None
+        self._usages = []
+        self._progress = None
+        self._process = None
+        self._hung = False
+
+    def with_accuracy(self, accuracy):
+        """
+        复制一个只有测量精度不同的批处理。
+
+        有后端工厂时副本使用新建的后端实例，否则与本对象共用后端；
+        看门狗总是独立的。
+
+        参数:
+            accuracy: 副本的测量精度
+
+        返回:
+            BatchRunner: 副本
+        """
+        runner = copy.copy(self)
+        runner.accuracy = accuracy
+        runner.watchdog = Watchdog()
+        runner.summary = {}
+        if self._backend_factory is not None:
+            runner.backend = self._backend_factory()
+        return runner
+
+    def _new_record(self, path, fingerprint):
+        """尚未测量的零件记录"""
+        return {
+            'file': os.path.basename(path),
+            'path': path,
+            'fingerprint': fingerprint,
+            'backend': self.backend.name,
+            'accuracy': self.accuracy,
+            'cache_hit': False,
+            'error': None,
+        }
+
+    def measure_part(self, path, fingerprint=None):
+        """
+        打开并测量一个零件。
+
+        参数:
+            path: .prt 文件路径
+            fingerprint: 已计算的几何指纹
+
+        返回:
+            dict: 零件记录（不含质量，质量由 run() 按材料库批量计算）；
+                失败时包含 error 字段
+        """
+        record = self._new_record(path, fingerprint)
+        deadline = Deadline(self.part_timeout)
+        self._hung = False
+        try:
+            handle = self.watchdog.call(self.backend.open_part, self._call_limit(deadline), path)
+        except MeasureTimeout as e:
+            self._hung = True
+            record['error'] = f"打开文件超时: {e}"
+            return record
+        except Exception as e:
+            record['error'] = f"无法打开文件: {e}"
+            return record
+
+        bodies = []
+        errors = []
+        state = {'hung': False, 'stalled': False}
+        try:
+            record['unit'] = handle.unit
+            record['attributes'] = self.watchdog.call(self.backend.part_attributes,
+                                                      self._call_limit(deadline), handle)
+            objects = self.watchdog.call(self.backend.list_bodies, self._call_limit(deadline),
+                                         handle)
+            for i, body in enumerate(objects):
+                bodies.append(self._measure_body(handle, body, i + 1, deadline, state, errors))
+            if (self.features or self.sheet_metal) and not state['hung']:
+                start = time.perf_counter()
+                state['hung'] = self._extract_features(handle, objects, bodies, deadline, errors)
+                record['feature_time_s'] = round(time.perf_counter() - start, 3)
+        except MeasureTimeout as e:
+            state['hung'] = True
+            record['error'] = f"读取零件超时: {e}"
+        finally:
+            try:
+                self.watchdog.call(self.backend.close_part,
+                                   self.body_timeout if state['hung'] else None, handle)
+            except MeasureTimeout as e:
+                state['hung'] = True
+                record['close_error'] = str(e)
+            except Exception as e:
+                record['close_error'] = str(e)
+        # 有调用超时时由 _measure_job() 重建后端，卡住的会话不再拖住下一个零件
+        self._hung = state['hung']
+        if record['error'] is not None:
+            return record
+
+        record['body_count'] = len(bodies)
+        record['failed_body_count'] = sum(1 for b in bodies if b['measure_status'] == 'failed')
+        record['body_errors'] = errors
+        record['accuracy_level'] = accuracy_level(bodies)
+        if record['accuracy_level'] == 'failed':
+            # 没有任何测量值或估算值：按失败处理，不参与计价和缓存
+            record['error'] = f"{len(bodies)} 个实体均未得到测量值或估算值"
+        record['measure_time_s'] = round(deadline.elapsed(), 3)
+        record.update(summarize_bodies(bodies))
+        if self.features:
+            record.update(part_features(bodies))
+        if self.sheet_metal:
+            record.update(part_sheet_metal(bodies))
+        record['bodies'] = bodies
+        return record
+
+    def _extract_features(self, handle, objects, bodies, deadline, errors):
+        """
+        提取已测量实体的几何特征，写入各实体记录的 features 字段；
+        启用钣金时，精确测量的实体另写入 sheet_metal 字段。
+
+        参数:
+            handle: 零件句柄
+            objects: 实体对象列表
+            bodies: 与 objects 对应的实体记录
+            deadline: 零件时间预算
+            errors: 错误记录列表（追加）
+
+        返回:
+            bool: 是否有调用超时
+        """
+        for body, entry in zip(objects, bodies):
+            if entry['measure_status'] == 'failed':
+                continue
+            index = entry['index']
+            if deadline.expired():
+                errors.append(body_error(index, 'features', 'part_timeout',
+                                         f"超过零件时间预算 {self.part_timeout:g} 秒，跳过特征",
+                                         deadline.elapsed()))
+                continue
+            start = time.perf_counter()
+            try:
+                topology = self.watchdog.call(self.backend.body_topology,
+                                              deadline.limit(self.body_timeout), handle, body)
+            except MeasureTimeout as e:
+                errors.append(body_error(index, 'features', 'timeout', str(e),
+                                         time.perf_counter() - start))
+                return True
+            except Exception as e:
+                errors.append(body_error(index, 'features', type(e).__name__, str(e),
+                                         time.perf_counter() - start))
+                continue
+            if self.features:
+                entry['features'] = body_features(topology)
+            if self.sheet_metal and entry['measure_status'] == 'ok':
+                entry['sheet_metal'] = body_sheet_metal(topology, entry['volume_m3'],
+                                                        entry['area_m2'], entry['min_point'],
+                                                        entry['max_point'])
+        return False
+
+    def _call_limit(self, deadline):
+        """打开零件、读取属性和列出实体的时限：有零件预算时用剩余预算，否则用单实体时限"""
+        return deadline.limit(None if self.part_timeout else self.body_timeout)
+
+    def _measure_body(self, handle, body, index, deadline, state, errors):
+        """
+        测量一个实体，失败时降级为边界框估算。
+
+        测量超时后（state['hung']）本零件其余实体不再精确测量，只做边界框
+        估算；估算也超时说明会话已无响应（state['stalled']），此后不再调用后端。
+
+        参数:
+            handle: 零件句柄
+            body: 实体对象
+            index: 实体序号
+            deadline: 零件时间预算
+            state: {'hung', 'stalled'}，本零件内的超时状态（就地更新）
+            errors: 错误记录列表（追加）
+
+        返回:
+            dict: 实体记录
+        """
+        if state['stalled']:
+            errors.append(body_error(index, 'estimate', 'skipped', "会话无响应，跳过估算", 0.0))
+            return failed_body(index)
+
+        if state['hung']:
+            # 会话可能仍卡在上一个测量里，只做代价小的估算
+            errors.append(body_error(index, 'measure', 'skipped', "零件内已有调用超时，改用估算",
+                                     0.0))
+        elif deadline.expired():
+            errors.append(body_error(index, 'measure', 'part_timeout',
+                                     f"超过零件时间预算 {self.part_timeout:g} 秒，改用估算",
+                                     deadline.elapsed()))
+        else:
+            start = time.perf_counter()
+            try:
+                measured = self.watchdog.call(self.backend.measure_body,
+                                              deadline.limit(self.body_timeout),
+                                              handle, body, self.accuracy)
+                measured['index'] = index
+                measured['measure_status'] = 'ok'
+                return measured
+            except MeasureTimeout as e:
+                errors.append(body_error(index, 'measure', 'timeout', str(e),
+                                         time.perf_counter() - start))
+                state['hung'] = True
+            except Exception as e:
+                errors.append(body_error(index, 'measure', type(e).__name__, str(e),
+                                         time.perf_counter() - start))
+
+        start = time.perf_counter()
+        try:
+            estimated = self.watchdog.call(self.backend.estimate_body, self.body_timeout,
+                                           handle, body)
+        except MeasureTimeout as e:
+            errors.append(body_error(index, 'estimate', 'timeout', str(e),
+                                     time.perf_counter() - start))
+            state['hung'] = state['stalled'] = True
+            return failed_body(index)
+        except Exception as e:
+            errors.append(body_error(index, 'estimate', type(e).__name__, str(e),
+                                     time.perf_counter() - start))
+            return failed_body(index)
+
+        estimated['index'] = index
+        estimated['measure_status'] = 'estimated'
+        estimated.setdefault('material', None)
+        return estimated
+
+    def _lookup(self, path, fingerprint):
+        """
+        从缓存读取零件记录。
+
+        返回:
+            dict: 命中时返回带当前文件名的记录，否则返回 None
+        """
+        if self.cache is None or fingerprint is None:
+            return None
+        cached = self.cache.get(fingerprint, backend=self.backend.name, accuracy=self.accuracy)
+        if cached is None:
+            return None
+        if self.features and 'face_count' not in cached:
+            # 缓存中没有特征，重新打开零件
+            return None
+        if self.sheet_metal and 'sheet_body_count' not in cached:
+            return None
+        # 缓存不含属性和材料：按本文件读取属性，由 run() 重新计算材料
+        return dict(cached, file=os.path.basename(path), path=path, cache_hit=True,
+                    attributes=self.backend.file_attributes(path))
+
+    @staticmethod
+    def fingerprints(paths):
+        """
+        计算一组文件的几何指纹。
+
+        返回:
+            dict: 路径到指纹的字典；文件不可读时为 None（交给后端报告错误）
+        """
+        fingerprints = {}
+        for path in paths:
+            try:
+                fingerprints[path] = fingerprint_part(path)
+            except OSError:
+                fingerprints[path] = None
+        return fingerprints
+
+    def _would_hit(self, fingerprint):
+        """缓存中是否有可直接复用的记录（不计入命中统计）"""
+        if self.cache is None or fingerprint is None:
+            return False
+        cached = self.cache.peek(fingerprint)
+        if not cached or cached.get('backend') != self.backend.name:
+            return False
+        if (cached.get('accuracy') or 0) < self.accuracy:
+            return False
+        if self.features and 'face_count' not in cached:
+            return False
+        return not (self.sheet_metal and 'sheet_body_count' not in cached)
+
+    def estimate(self, paths, fingerprints=None):
+        """
+        开始前估计整批的耗时。
+
+        与 run() 相同地去重和查缓存，需要测量的零件由 CostModel 预测
+        耗时，再按工作线程数模拟工作窃取调度得到完工时间。
+
+        参数:
+            paths: .prt 文件路径列表
+            fingerprints: 可选，fingerprints() 的结果；传给 run() 可避免重复计算
+
+        返回:
+            dict: parts、to_measure、cached、duplicates、work_s（预计测量耗时合计）、
+                eta_s（预计完工时间）、basis（各依据的零件数）
+        """
+        if fingerprints is None:
+            fingerprints = self.fingerprints(paths)
+        jobs = []
+        cached = duplicates = 0
+        for fp, members in group_by_fingerprint(paths, fingerprints).items():
+            if fp is None:
+                jobs.extend((path, None) for path in members)
+                continue
+            duplicates += len(members) - 1
+            if self._would_hit(fp):
+                cached += 1
+            else:
+                jobs.append((members[0], fp))
+        costs, basis = self.cost_model.predict_with_basis([path for path, _ in jobs], dict(jobs))
+        counts = {}
+        for name in basis:
+            counts[name] = counts.get(name, 0) + 1
+        workers = max(1, min(self.workers, len(jobs)))
+        return {
+            'parts': len(paths),
+            'to_measure': len(jobs),
+            'cached': cached,
+            'duplicates': duplicates,
+            'work_s': round(float(costs.sum()), 3),
+            'eta_s': round(simulate(costs, workers, 'stealing'), 3),
+            'basis': counts,
+        }
+
+    def run(self, paths, fingerprints=None):
+        """
+        批量处理零件。
+
+        参数:
+            paths: .prt 文件路径列表
+            fingerprints: 可选，fingerprints() 的结果；None 时在此计算
+
+        返回:
+            list: 与 paths 顺序一致的零件记录列表
+        """
+        started = time.perf_counter()
+        monitor = self._monitor = MemoryMonitor(self.memory_interval).start()
+        self._usages = []
+        try:
+            if fingerprints is None:
+                fingerprints = self.fingerprints(paths)
+
+            by_path = {}
+            jobs = []
+            groups = group_by_fingerprint(paths, fingerprints)
+            for fp, members in groups.items():
+                if fp is None:
+                    jobs.extend((path, None) for path in members)
+                    continue
+                cached = self._lookup(members[0], fp)
+                if cached is not None:
+                    by_path[members[0]] = cached
+                else:
+                    jobs.append((members[0], fp))
+
+            if self.progress is not None:
+                self.progress.begin(len(paths), skipped=len(paths) - len(jobs),
+                                    workers=self.workers)
+            results, schedule = self._measure_all(jobs)
+            if self.progress is not None:
+                self.progress.finish()
+            for (path, _fp), record in zip(jobs, results):
+                by_path[path] = record
+
+            duplicates = 0
+            for fp, members in groups.items():
+                if fp is None:
+                    continue
+                first = by_path[members[0]]
+                for path in members[1:]:
+                    duplicate = dict(first, file=os.path.basename(path), path=path,
+                                     duplicate_of=first['file'])
+                    if first['error'] is None:
+                        # 几何相同的文件材料属性可能不同：属性按本文件读取，实体列表
+                        # 单独复制，apply_materials 就地写入时互不影响
+                        duplicate['attributes'] = self.backend.file_attributes(path)
+                        duplicate['bodies'] = copy.deepcopy(first['bodies'])
+                    by_path[path] = duplicate
+                    duplicates += 1
+
+            records = [by_path[path] for path in paths]
+            measured = [r for r in records if r['error'] is None]
+            apply_materials(measured, self.materials.compile())
+            recomputed = apply_derived(measured, self.allowance)
+
+            if self.cache is not None:
+                # 新测量的和派生列有变化的记录写回缓存，每个指纹只写一次
+                written = set()
+                for record in recomputed:
+                    fp = record.get('fingerprint')
+                    if fp in written or record.get('duplicate_of'):
+                        continue
+                    # 降级结果不缓存，下次运行重新测量
+                    if record.get('accuracy_level') != 'exact':
+                        continue
+                    if self.cache.put(record):
+                        written.add(fp)
+
+            flag_duplicates(measured, near_tolerance=self.near_tolerance)
+        finally:
+            # 出错时也要停止采样和进度刷新线程，否则它们会一直运行到进程退出
+            monitor.stop()
+            self._monitor = None
+            if self.progress is not None:
+                self.progress.finish()
+
+        memory = monitor.stats()
+        memory['processes'] = self.processes
+        memory['recycles'] = sum(u['recycles'] for u in self._usages)
+        reasons = {}
+        for usage in self._usages:
+            for reason, count in usage['recycle_reasons'].items():
+                reasons[reason] = reasons.get(reason, 0) + count
+        memory['recycle_reasons'] = reasons
+        memory['workers'] = sorted(self._usages, key=lambda u: u['worker'])
+
+        self.summary = {
+            'parts': len(records),
+            'measured': len(jobs),
+            'cache_hits': sum(1 for r in records
+                              if r.get('cache_hit') and not r.get('duplicate_of')),
+            'duplicates': duplicates,
+            'errors': len(records) - len(measured),
+            'elapsed_s': round(time.perf_counter() - started, 3),
+            'schedule': schedule,
+            'memory': memory,
+        }
+        if self.features or self.sheet_metal:
+            fresh = [r for r in records if not r.get('cache_hit') and not r.get('duplicate_of')]
+            feature_time = sum(r.get('feature_time_s') or 0.0 for r in fresh)
+            measure_time = sum(r.get('measure_time_s') or 0.0 for r in fresh)
+            self.summary['feature_time_s'] = round(feature_time, 3)
+            # 特征提取占测量总耗时的比例，用于判断是否值得对整批开启
+            self.summary['feature_share'] = (round(feature_time / measure_time, 3)
+                                             if measure_time > 0 else None)
+        return records
+
+    def _worker(self, index):
+        """为工作线程准备独立的后端和看门狗，或独立的测量子进程"""
+        if self.processes:
+            worker = copy.copy(self)
+            worker._process = ProcessWorker(self._process_options(), self._process_timeout(),
+                                            name=f'batch-process-{index}')
+        elif self.workers <= 1:
+            worker = self
+        else:
+            worker = copy.copy(self)
+            worker.backend = self._backend_factory()
+            worker.watchdog = Watchdog()
+        worker._usage = worker_usage(index)
+        self._usages.append(worker._usage)
+        if self.progress is not None:
+            worker._progress = self.progress.slot(index)
+        return worker
+
+    def _process_options(self):
+        """子进程中 BatchRunner 的参数：只需要测量相关的设置"""
+        return {
+            'backend': self._backend_spec,
+            'accuracy': self.accuracy,
+            'body_timeout': self.body_timeout,
+            'part_timeout': self.part_timeout,
+            'features': self.features,
+            'sheet_metal': self.sheet_metal,
+        }
+
+    def _process_timeout(self):
+        """等待子进程测量一个零件的时限；没有零件预算时不限"""
+        return self.part_timeout + PROCESS_GRACE_S if self.part_timeout else None
+
+    def _release(self, worker):
+        if worker._process is not None:
+            worker._process.close()
+        elif worker is not self:
+            worker.watchdog.close()
+            close = getattr(worker.backend, 'close', None)
+            if close is not None:
+                close()
+
+    def _measure_job(self, path, fingerprint):
+        """测量一个零件，之后记录资源占用并按需重建后端或重启子进程"""
+        usage = self._usage
+        usage['parts'] += 1
+        usage['since_recycle'] += 1
+        if self._process is not None:
+            record, rss, opened, reason = self._process.measure(path, fingerprint)
+            if record is None:
+                record = self._new_record(path, fingerprint)
+                record['error'] = "测量子进程无响应或意外退出，已重启"
+            if self._monitor is not None:
+                self._monitor.sample()
+            if reason is None:
+                reason = self.recycle.check(usage['since_recycle'], rss)
+        else:
+            record = self.measure_part(path, fingerprint)
+            rss = self._monitor.sample() if self._monitor is not None else None
+            count = getattr(self.backend, 'open_part_count', None)
+            opened = count() if count is not None else None
+            reason = 'hang' if self._hung and self._backend_factory is not None else None
+
+        if rss is not None:
+            usage['rss_mb'] = to_mb(rss)
+            usage['rss_peak_mb'] = max(usage['rss_peak_mb'] or 0.0, usage['rss_mb'])
+        if opened is not None:
+            usage['open_parts_peak'] = max(usage['open_parts_peak'], opened)
+        if reason is not None:
+            self._recycle(reason)
+        if self._progress is not None:
+            self.progress.part_done(self._progress, record)
+        return record
+
+    def _recycle(self, reason):
+        """
+        回收本工作者：结束子进程（下一个零件由新进程测量），或在进程内
+        关闭并重建后端。
+
+        参数:
+            reason: 'hang'、'crash'，或 RecyclePolicy.check() 给出的 'parts' / 'memory'
+        """
+        if self._process is not None:
+            # 崩溃的子进程已经结束；卡住的会话不等它自行退出
+            self._process.stop(kill=reason == 'hang')
+        else:
+            close = getattr(self.backend, 'close', None)
+            if close is not None:
+                close()
+            self.backend = self._backend_factory()
+            # 卡住的看门狗线程可能还引用旧后端，一并换掉
+            self.watchdog.close()
+            self.watchdog = Watchdog()
+        usage = self._usage
+        usage['recycles'] += 1
+        usage['recycle_reasons'][reason] = usage['recycle_reasons'].get(reason, 0) + 1
+        usage['since_recycle'] = 0
+
+    def _measure_all(self, jobs):
+        """
+        调度并测量需要打开的零件。
+
+        参数:
+            jobs: (路径, 指纹) 列表
+
+        返回:
+            tuple: (与 jobs 对应的记录列表, 调度统计)
+        """
+        if not jobs:
+            return [], None
+        costs = self.cost_model.predict([path for path, _ in jobs], dict(jobs))
+        if self.progress is not None:
+            self.progress.expect([path for path, _ in jobs], costs)
+        scheduler = WorkStealingScheduler(self.workers)
+        return scheduler.run(jobs, costs, lambda worker, job: worker._measure_job(*job),
+                             init=self._worker, close=self._release)
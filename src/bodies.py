@@ -0,0 +1,143 @@
+"""
+实体枚举
+
+统一的实体枚举服务，NXBackend 和 FakeBackend 共用。
+
+两种枚举方式:
+    collection: 一次 part.Bodies.ToArray() 取回全部实体（新版本 NX）
+    uf_cycle: UF CycleObjsInPart 逐个遍历，每个标签再调用 AskTypeAndSubtype
+              和 GetTaggedObject（旧版本 NX 的兼容方式，每个实体三次往返）
+
+首次枚举时按零件对象的能力选定方式，之后整个会话沿用。
+枚举结果按零件标签缓存，关闭零件时清除。
+"""
+
+STRATEGY_COLLECTION = 'collection'
+STRATEGY_UF_CYCLE = 'uf_cycle'
+
+STRATEGIES = (STRATEGY_COLLECTION, STRATEGY_UF_CYCLE)
+
+
+class BodyEnumerator:
+    """
+    实体枚举服务。
+
+    用法:
+        enumerator = BodyEnumerator(uf_session, NXOpen.UF.UFConstants,
+                                    NXOpen.TaggedObjectManager.GetTaggedObject)
+        bodies = enumerator.bodies(work_part)
+    """
+
+    def __init__(self, uf_session=None, constants=None, get_tagged_object=None, strategy=None,
+                 include_sheets=False, include_hidden=False, include_suppressed=False):
+        """
+        初始化枚举服务。
+
+        参数:
+            uf_session: UF 会话；uf_cycle 方式需要
+            constants: 提供 UF_solid_type / UF_solid_body_subtype 的对象
+            get_tagged_object: 标签到对象的查找函数
+            strategy: 强制使用的枚举方式；None 表示自动选择
+            include_sheets: 是否保留片体
+            include_hidden: 是否保留隐藏（Blank）的实体
+            include_suppressed: 是否保留所属特征已抑制的实体
+        """
+        if strategy is not None and strategy not in STRATEGIES:
+            raise ValueError(f"未知的枚举方式: {strategy}（可选: {', '.join(STRATEGIES)}）")
+        self.uf_session = uf_session
+        self.constants = constants
+        self.get_tagged_object = get_tagged_object
+        self.strategy = strategy
+        self.include_sheets = include_sheets
+        self.include_hidden = include_hidden
+        self.include_suppressed = include_suppressed
+        self._cache = {}
+
+    def choose_strategy(self, part):
+        """
+        选择枚举方式，选定后不再改变。
+
+        参数:
+            part: 零件对象
+
+        返回:
+            str: 枚举方式
+        """
+        if self.strategy is None:
+            collection = getattr(part, 'Bodies', None)
+            if collection is not None and hasattr(collection, 'ToArray'):
+                self.strategy = STRATEGY_COLLECTION
+            else:
+                self.strategy = STRATEGY_UF_CYCLE
+        return self.strategy
+
+    def bodies(self, part):
+        """
+        列出零件中需要测量的实体。
+
+        参数:
+            part: 零件对象
+
+        返回:
+            list: 过滤后的实体列表（副本）
+        """
+        key = part.Tag
+        cached = self._cache.get(key)
+        if cached is None:
+            if self.choose_strategy(part) == STRATEGY_COLLECTION:
+                found = self._collection(part)
+            else:
+                found = self._uf_cycle(part)
+            cached = [body for body in found if self._keep(body)]
+            self._cache[key] = cached
+        return list(cached)
+
+    def forget(self, part=None):
+        """
+        清除枚举缓存。
+
+        参数:
+            part: 要清除的零件；None 表示全部清除
+        """
+        if part is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(part.Tag, None)
+
+    def _collection(self, part):
+        return list(part.Bodies.ToArray())
+
+    def _uf_cycle(self, part):
+        uf_obj = self.uf_session.Obj
+        solid_type = self.constants.UF_solid_type
+        solid_body = self.constants.UF_solid_body_subtype
+
+        bodies = []
+        tag = 0
+        while True:
+            tag = uf_obj.CycleObjsInPart(part.Tag, solid_type, tag)
+            if tag == 0:
+                break
+            obj_type, obj_subtype = uf_obj.AskTypeAndSubtype(tag)
+            if obj_subtype == solid_body:
+                bodies.append(self.get_tagged_object(tag))
+        return bodies
+
+    def _keep(self, body):
+        """判断实体是否需要测量"""
+        if not self.include_sheets and getattr(body, 'IsSheetBody', False):
+            return False
+        if not self.include_hidden and getattr(body, 'IsBlanked', False):
+            return False
+        if not self.include_suppressed and _is_suppressed(body):
+            return False
+        return True
+
+
+def _is_suppressed(body):
+    """实体所属的特征是否全部被抑制"""
+    try:
+        features = body.GetFeatures()
+    except Exception:
+        return False
+    return bool(features) and all(getattr(f, 'Suppressed', False) for f in features)
@@ -0,0 +1,176 @@
+"""
+结果缓存
+
+按几何指纹缓存零件的测量结果和派生列。每个指纹一个 JSON 文件，
+按指纹前两位分目录存放；写入先写临时文件再替换，多个进程同时
+写入同一个缓存目录也不会读到半个文件。
+
+指纹只覆盖几何流，不含 /Root/part/attrs。零件属性以及由属性决定的
+材料、质量和材料成本因此不进入缓存：命中时按当前文件重新读取属性，
+再由 apply_materials 计算。
+"""
+
+import json
+import os
+import tempfile
+
+# 缓存格式版本，结构变化时递增
+CACHE_VERSION = 3
+
+# 与具体文件相关、不进入缓存的字段
+_PER_FILE_FIELDS = ('file', 'path', 'duplicate_of', 'near_duplicate_of', 'near_duplicate_delta',
+                    'cache_hit', 'attributes', 'material', 'material_warning', 'mass_kg',
+                    'material_cost')
+
+# 实体记录中由材料决定、不进入缓存的字段
+_PER_FILE_BODY_FIELDS = ('material', 'mass_kg', 'material_cost')
+
+
+class ResultCache:
+    """
+    基于文件目录的测量结果缓存。
+
+    用法:
+        cache = ResultCache('.nxquote-cache')
+        entry = cache.get(fingerprint, backend='nx', accuracy=0.99)
+        cache.put(record)
+    """
+
+    def __init__(self, cache_dir):
+        """
+        初始化缓存。
+
+        参数:
+            cache_dir: 缓存目录，不存在时自动创建
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, fingerprint):
+        return os.path.join(self.cache_dir, fingerprint[:2], f"{fingerprint}.json")
+
+    def get(self, fingerprint, backend=None, accuracy=None):
+        """
+        读取缓存条目。
+
+        参数:
+            fingerprint: 几何指纹
+            backend: 要求的后端名称；None 表示不限
+            accuracy: 要求的最低测量精度；None 表示不限
+
+        返回:
+            dict: 缓存的零件记录；未命中返回 None
+        """
+        if not fingerprint:
+            self.misses += 1
+            return None
+
+        try:
+            with open(self._path(fingerprint), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        record = entry.get('record') or {}
+        if (entry.get('version') != CACHE_VERSION
+                or (backend is not None and record.get('backend') != backend)
+                or (accuracy is not None and (record.get('accuracy') or 0) < accuracy)):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return record
+
+    def peek(self, fingerprint):
+        """
+        读取缓存记录，不检查后端和精度，也不计入命中统计。
+
+        用于估计耗时等只需要参考值的场合。
+
+        参数:
+            fingerprint: 几何指纹
+
+        返回:
+            dict: 缓存的零件记录；不存在时返回 None
+        """
+        if not fingerprint:
+            return None
+        try:
+            with open(self._path(fingerprint), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION:
+            return None
+        return entry.get('record')
+
+    def put(self, record):
+        """
+        写入零件记录。
+
+        参数:
+            record: 包含 fingerprint 的零件记录；失败的记录不写入
+
+        返回:
+            bool: 是否写入
+        """
+        fingerprint = record.get('fingerprint')
+        if not fingerprint or record.get('error'):
+            return False
+
+        stored = {k: v for k, v in record.items() if k not in _PER_FILE_FIELDS}
+        if 'bodies' in stored:
+            stored['bodies'] = [{k: v for k, v in body.items() if k not in _PER_FILE_BODY_FIELDS}
+                                for body in stored['bodies']]
+        path = self._path(fingerprint)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'record': stored}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def fingerprints(self):
+        """
+        列出所有缓存的指纹。
+
+        返回:
+            list: 指纹列表
+        """
+        found = []
+        for shard in sorted(os.listdir(self.cache_dir)):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            found.extend(name[:-5] for name in sorted(os.listdir(shard_dir))
+                         if name.endswith('.json'))
+        return found
+
+    def __len__(self):
+        return len(self.fingerprints())
+
+    def clear(self):
+        """
+        删除所有缓存条目。
+
+        返回:
+            int: 删除的条目数
+        """
+        removed = 0
+        for fingerprint in self.fingerprints():
+            try:
+                os.remove(self._path(fingerprint))
+                removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,685 @@
+"""
+命令行接口
+
+    nxquote extract PATHS... [-o parts.jsonl -o report.xlsx]   批量提取并计价
+    nxquote report RESULTS -o report.xlsx                      由已保存的结果生成报表
+    nxquote diff OLD NEW -o diff.csv                           对比两个版本的结果
+    nxquote cache stats|clear                                  查看或清空结果缓存
+    nxquote history runs|part                                  查询报价历史库
+
+PATHS 可以是文件、文件夹（递归查找 *.prt）或通配符（支持 **）；
+--manifest 指定的清单文件每行一个路径或通配符，# 开头为注释。
+输出格式按扩展名选择：.csv / .jsonl / .json / .xlsx，.gz / .zst 结尾时压缩。
+
+不在 NX 环境中时可用 --backend fake 跑通整条流程。
+
+运行方式:
+    python scripts/nxquote.py extract tests --backend fake -o out.xlsx
+    python -m src.cli extract tests --backend fake -o out.jsonl
+"""
+
+import glob
+import json
+import os
+import sys
+
+import click
+
+from .attrs import find_parts
+from .backends import BACKENDS
+from .batch import DEFAULT_ACCURACY, BatchRunner
+from .cache import ResultCache
+from .diff import DEFAULT_TOLERANCE, DIFF_FIELDS, KEYS, diff_columns, diff_output_columns, \
+    diff_rows, diff_summary
+from .features import FEATURE_COLUMNS, FEATURE_REPORT_COLUMNS
+from .history import HistoryStore
+from .materials import MaterialLibrary
+from .preview import PIL_AVAILABLE
+from .pricing import QuoteEngine, RateCard
+from .progress import PROGRESS_INTERVAL, ProgressTracker, StatusFile, StatusServer, \
+    TerminalProgress
+from .cutlist import (BAR_COLUMNS, BAR_REPORT_COLUMNS, SAW_KERF, STANDARD_BARS, bar_label,
+                      cut_records, cutlist_totals, purchase_list)
+from .nesting import nest_records, nesting_totals
+from .runtime import RuntimeModel
+from .sheetmetal import (SHEET_COLUMNS, SHEET_REPORT_COLUMNS, STANDARD_SHEETS, apply_nesting,
+                         sheet_label)
+from .sinks import RECORD_COLUMNS, json_encoder, write_csv, write_json, write_jsonl
+from .tiers import FAST_ACCURACY, TieredRunner
+
+DEFAULT_CACHE_DIR = '.nxquote-cache'
+
+OUTPUT_FORMATS = ('.csv', '.jsonl', '.json', '.xlsx')
+
+
+def _strip_compression(path):
+    lower = path.lower()
+    for suffix in ('.gz', '.zst'):
+        if lower.endswith(suffix):
+            return lower[:-len(suffix)]
+    return lower
+
+
+def output_format(path):
+    """
+    按扩展名判断输出格式。
+
+    返回:
+        str: OUTPUT_FORMATS 之一；无法识别时返回 None
+    """
+    base = _strip_compression(path)
+    for suffix in OUTPUT_FORMATS:
+        if base.endswith(suffix):
+            return suffix
+    return None
+
+
+def expand_inputs(inputs, manifest=None, pattern='*.prt'):
+    """
+    把文件、文件夹、通配符和清单展开为零件路径列表。
+
+    参数:
+        inputs: 命令行给出的路径列表
+        manifest: 可选，清单文件路径；相对路径以清单所在目录为基准
+        pattern: 文件夹中查找的文件名通配符
+
+    返回:
+        list: 去重后的路径列表，保持给出的顺序
+    """
+    items = list(inputs)
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    items.append(line if os.path.isabs(line) else os.path.join(base, line))
+
+    paths = []
+    seen = set()
+    for item in items:
+        if os.path.isdir(item):
+            found = find_parts(item, pattern)
+        elif glob.has_magic(item):
+            found = sorted(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        else:
+            found = [item]
+        for path in found:
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+    return paths
+
+
+def write_outputs(records, outputs, previews_dir=None, metadata=None, features=False,
+                  sheet_metal=False, nesting=None, bars=False, cutlist=None):
+    """
+    把记录写到各个输出。
+
+    参数:
+        records: 零件记录列表
+        outputs: 输出路径列表
+        previews_dir: 可选，预览缩略图缓存目录；给出时 .xlsx 嵌入预览图
+        metadata: 可选，写入 .xlsx 元数据工作表的键值
+        features: 是否在 .csv / .xlsx 中加入几何特征列
+        sheet_metal: 是否在 .csv / .xlsx 中加入钣金展开和排样列
+        nesting: 可选，nest_records() 的结果；给出时 .xlsx 写出排样工作表
+        bars: 是否在 .csv / .xlsx 中加入棒料下料列
+        cutlist: 可选，purchase_list() 的采购清单；给出时 .xlsx 写出下料工作表
+    """
+    csv_columns = list(RECORD_COLUMNS)
+    report_columns = []
+    if features:
+        csv_columns += FEATURE_COLUMNS
+        report_columns += FEATURE_REPORT_COLUMNS
+    if sheet_metal:
+        csv_columns += SHEET_COLUMNS
+        report_columns += SHEET_REPORT_COLUMNS
+    if bars:
+        csv_columns += BAR_COLUMNS
+        report_columns += BAR_REPORT_COLUMNS
+    for path in outputs:
+        kind = output_format(path)
+        if kind == '.csv':
+            write_csv(iter(records), path,
+                      columns=csv_columns if features or sheet_metal or bars else None)
+        elif kind == '.jsonl':
+            write_jsonl(iter(records), path)
+        elif kind == '.json':
+            write_json(records, path)
+        elif kind == '.xlsx':
+            from .preview import PreviewExtractor
+            from .report import write_batch_report
+
+            previews = PreviewExtractor(previews_dir) if previews_dir else None
+            write_batch_report(iter(records), path, metadata, previews, report_columns or None,
+                               nesting, cutlist)
+        click.echo(f"已写出 {path}", err=True)
+
+
+def _check_outputs(outputs, previews_dir=None):
+    for path in outputs:
+        if output_format(path) is None:
+            raise click.BadParameter(
+                f"无法识别的输出格式: {path}（可选: {', '.join(OUTPUT_FORMATS)}）",
+                param_hint='-o/--output')
+    if previews_dir and not PIL_AVAILABLE:
+        raise click.BadParameter("嵌入预览图需要 Pillow（pip install Pillow）",
+                                 param_hint='--previews')
+
+
+def _use_processes(backend, workers, processes=False):
+    # NX 会话属于整个进程且不是线程安全的，多个线程会互相关闭对方的零件，
+    # 多个工作者时每个工作者用自己的子进程（各自的会话）
+    return processes or (workers > 1 and not BACKENDS[backend].thread_safe)
+
+
+def _check_accuracy(accuracy, refine):
+    # --refine 的快速估价低于精测精度才有意义，否则精测选不出任何零件
+    if not refine:
+        return DEFAULT_ACCURACY if accuracy is None else accuracy
+    if accuracy is None:
+        return FAST_ACCURACY
+    if accuracy >= DEFAULT_ACCURACY:
+        raise click.BadParameter(f"--refine 的快速估价精度必须低于 {DEFAULT_ACCURACY}",
+                                 param_hint='-a/--accuracy')
+    return accuracy
+
+
+def _recycle_reasons(memory):
+    labels = {'hang': '调用超时', 'crash': '子进程异常', 'parts': '零件数', 'memory': '内存'}
+    reasons = memory.get('recycle_reasons') or {}
+    if not reasons:
+        return ''
+    return '（' + '，'.join(f"{labels.get(k, k)} {v}" for k, v in sorted(reasons.items())) + '）'
+
+
+def _engine(materials, rates):
+    card = RateCard.from_yaml(rates) if rates else RateCard()
+    library = MaterialLibrary.from_yaml(materials) if materials else MaterialLibrary()
+    return QuoteEngine(card, library)
+
+
+@click.group()
+def cli():
+    """NX 报价助手：批量提取零件几何并计价。"""
+
+
+@cli.command()
+@click.argument('inputs', nargs=-1)
+@click.option('-m', '--manifest', type=click.Path(exists=True, dir_okay=False),
+              help="清单文件，每行一个路径或通配符")
+@click.option('--pattern', default='*.prt', show_default=True, help="文件夹中查找的文件名")
+@click.option('-b', '--backend', type=click.Choice(sorted(BACKENDS)), default='nx',
+              show_default=True, help="测量后端；fake 不需要 NX")
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help="工作者数；NX 后端大于 1 时每个工作者在自己的子进程中测量")
+@click.option('-a', '--accuracy', type=click.FloatRange(0.0, 1.0, min_open=True),
+              help=f"测量精度；默认 {DEFAULT_ACCURACY}，--refine 时为快速估价的精度，默认 "
+                   f"{FAST_ACCURACY}")
+@click.option('--refine', is_flag=True,
+              help=f"先按 --accuracy 快速估价，再以 {DEFAULT_ACCURACY} 重测价格敏感的零件")
+@click.option('--body-timeout', type=float, help="单个实体的测量时限（秒）")
+@click.option('--part-timeout', type=float, help="单个零件的时间预算（秒）")
+@click.option('--features', is_flag=True,
+              help="提取面类型、孔、最小内圆角和边长（耗时增加，见汇总中的占比）")
+@click.option('--sheet-metal', is_flag=True,
+              help="识别钣金件，提取板厚、展开尺寸、切割长度和折弯数并估算排样")
+@click.option('--sheet', 'sheets', multiple=True, metavar='长x宽',
+              help="排样用的板材规格（mm），可重复；默认 "
+                   + ' '.join(sheet_label(s) for s in STANDARD_SHEETS))
+@click.option('--cut-list', is_flag=True,
+              help="识别车削 / 锯切的棒料件，按标准棒料长度排料，给出采购清单和废料率")
+@click.option('--bar', 'bars', type=click.FloatRange(min=0, min_open=True), multiple=True,
+              metavar='长度', help="棒料长度（mm），可重复；默认 "
+                                   + ' '.join(bar_label(b) for b in STANDARD_BARS))
+@click.option('--kerf', type=click.FloatRange(min=0), default=SAW_KERF * 1e3, show_default=True,
+              help="锯缝宽度（mm）")
+@click.option('--processes', is_flag=True,
+              help="每个工作者在独立的子进程中测量（各自的 NX 会话）")
+@click.option('--recycle-after', type=click.IntRange(min=1),
+              help="每个子进程处理多少个零件后重启（启用 --processes）")
+@click.option('--max-rss', type=click.FloatRange(min=0, min_open=True),
+              help="子进程内存超过该值（MB）时重启（启用 --processes）")
+@click.option('--cache', 'cache_dir', default=DEFAULT_CACHE_DIR, show_default=True,
+              help="结果缓存目录")
+@click.option('--no-cache', is_flag=True, help="不读写缓存")
+@click.option('--materials', type=click.Path(exists=True, dir_okay=False), help="材料库 YAML")
+@click.option('--rates', type=click.Path(exists=True, dir_okay=False), help="费率表 YAML")
+@click.option('-o', '--output', 'outputs', multiple=True,
+              help="输出文件，可重复；按扩展名选择 csv / jsonl / json / xlsx")
+@click.option('--previews', 'previews_dir', help="在 xlsx 中嵌入预览图，缩略图缓存到该目录")
+@click.option('--history', 'history_db',
+              help="把本次结果写入报价历史库（SQLite 文件）；已有的库同时用于预测耗时")
+@click.option('--note', help="写入历史库的备注，如询价单号")
+@click.option('--progress/--no-progress', default=None,
+              help="显示进度条；默认在终端中显示")
+@click.option('--status-file', type=click.Path(dir_okay=False),
+              help="定时把进度写入该 JSON 文件")
+@click.option('--status-port', type=click.IntRange(0, 65535),
+              help="在本机该端口提供 HTTP 进度端点（GET /status）")
+@click.option('--status-interval', type=click.FloatRange(min=0, min_open=True),
+              default=PROGRESS_INTERVAL, show_default=True, help="进度刷新间隔（秒）")
+def extract(inputs, manifest, pattern, backend, workers, accuracy, refine, body_timeout,
+            part_timeout, features, sheet_metal, sheets, cut_list, bars, kerf, processes,
+            recycle_after, max_rss, cache_dir, no_cache, materials, rates, outputs, previews_dir,
+            history_db, note, progress, status_file, status_port, status_interval):
+    """批量提取零件并计价。"""
+    _check_outputs(outputs, previews_dir)
+    # 回收只能通过结束子进程释放会话内存
+    processes = _use_processes(backend, workers, processes or bool(recycle_after or max_rss))
+    accuracy = _check_accuracy(accuracy, refine)
+    sheets = _sheet_sizes(sheets)
+    paths = expand_inputs(inputs, manifest, pattern)
+    if not paths:
+        raise click.UsageError("没有找到零件文件")
+
+    engine = _engine(materials, rates)
+    tracker = _progress_tracker(progress, status_file, status_port, status_interval)
+    runner = BatchRunner(backend=backend, accuracy=DEFAULT_ACCURACY if refine else accuracy,
+                         materials=materials, cache=None if no_cache else cache_dir,
+                         body_timeout=body_timeout, part_timeout=part_timeout, workers=workers,
+                         processes=processes, recycle_after=recycle_after, max_rss_mb=max_rss,
+                         features=features, sheet_metal=sheet_metal,
+                         runtime=_runtime_model(history_db, backend), progress=tracker)
+
+    click.echo(f"{len(paths)} 个零件，后端 {backend}，{workers} 个"
+               f"{'子进程' if processes else '工作线程'}", err=True)
+    fingerprints = runner.fingerprints(paths)
+    _echo_estimate(runner.estimate(paths, fingerprints))
+    try:
+        if refine:
+            tiered = TieredRunner(runner, fast_accuracy=accuracy, engine=engine)
+            records = tiered.estimate(paths)
+            refined = tiered.refine(records)
+            click.echo(f"精测 {len(refined)} 个价格敏感的零件", err=True)
+            summary = tiered.fast.summary
+        else:
+            records = runner.run(paths, fingerprints)
+            engine.price([r for r in records if r['error'] is None])
+            summary = runner.summary
+    finally:
+        if tracker is not None:
+            tracker.close()
+
+    click.echo(f"完成：测量 {summary['measured']}，缓存命中 {summary['cache_hits']}，"
+               f"重复 {summary['duplicates']}，失败 {summary['errors']}，"
+               f"耗时 {summary['elapsed_s']:.2f} 秒", err=True)
+    schedule = summary.get('schedule')
+    if schedule:
+        click.echo(f"耗时预测：预计测量 {_duration(schedule['predicted_s'])}，实际 "
+                   f"{_duration(sum(schedule['busy_s']))}", err=True)
+    if schedule and schedule['workers'] > 1:
+        click.echo(f"调度：完工 {schedule['makespan_s']:.2f} 秒，利用率 "
+                   f"{schedule['utilization']:.0%}，窃取 {schedule['steals']} 次", err=True)
+    if summary.get('feature_share') is not None:
+        click.echo(f"特征提取：{summary['feature_time_s']:.2f} 秒，占测量耗时 "
+                   f"{summary['feature_share']:.0%}", err=True)
+    nesting = None
+    if sheet_metal:
+        apply_nesting(records, sheets)
+        nesting = nest_records(records, sheets)
+        _echo_nesting(nesting)
+    cutlist = None
+    if cut_list:
+        groups = cut_records(records, tuple(b / 1e3 for b in bars) or STANDARD_BARS, kerf / 1e3)
+        _echo_cutlist(groups)
+        cutlist = purchase_list(groups)
+    memory = summary.get('memory')
+    if memory and memory['peak_rss_mb'] is not None:
+        click.echo(f"内存：峰值 {memory['peak_rss_mb']:.0f} MB，平均 {memory['avg_rss_mb']:.0f} MB，"
+                   f"回收 {memory['recycles']} 次{_recycle_reasons(memory)}", err=True)
+    if memory and memory['processes']:
+        for usage in memory['workers']:
+            if usage['rss_peak_mb'] is not None:
+                click.echo(f"  子进程 {usage['worker']}：{usage['parts']} 个零件，内存峰值 "
+                           f"{usage['rss_peak_mb']:.0f} MB，重启 {usage['recycles']} 次", err=True)
+
+    if history_db:
+        run_id = HistoryStore(history_db).record_run(
+            records, summary, backend=backend, workers=workers, note=note)
+        click.echo(f"已写入历史库 {history_db}（批次 {run_id}）", err=True)
+
+    write_outputs(records, outputs, previews_dir,
+                  metadata={'后端': backend, '工作线程': workers, '耗时 (秒)': summary['elapsed_s']},
+                  features=features, sheet_metal=sheet_metal, nesting=nesting, bars=cut_list,
+                  cutlist=cutlist)
+    if not outputs:
+        write_jsonl_stdout(records)
+
+
+def _progress_tracker(progress, status_file, status_port, interval):
+    """按命令行选项组装进度输出端；都没有时返回 None"""
+    if progress is None:
+        progress = sys.stderr.isatty()
+    reporters = []
+    if progress:
+        reporters.append(TerminalProgress())
+    if status_file:
+        reporters.append(StatusFile(status_file))
+    if status_port is not None:
+        server = StatusServer(status_port)
+        click.echo(f"进度端点：{server.url}", err=True)
+        reporters.append(server)
+    if not reporters:
+        return None
+    return ProgressTracker(reporters, interval=interval)
+
+
+def _runtime_model(history_db, backend):
+    """由已有的历史库拟合耗时模型；没有库或样本不足时返回 None"""
+    if not history_db or not os.path.exists(history_db):
+        return None
+    model = RuntimeModel.from_history(HistoryStore(history_db), backend=backend)
+    if not model.fitted:
+        click.echo(f"耗时模型：历史库中 {backend} 后端的样本不足，按文件大小估计", err=True)
+        return None
+    described = '，'.join(f"{name} {info['samples']} 个样本、典型误差 {info['error']:.0%}"
+                         for name, info in model.describe().items())
+    click.echo(f"耗时模型：{described}", err=True)
+    return model
+
+
+def _duration(seconds):
+    """把秒数格式化为 '1 小时 05 分'、'3 分 20 秒' 或 '12.3 秒'"""
+    if seconds >= 3600:
+        return f"{int(seconds // 3600)} 小时 {int(seconds % 3600 // 60):02d} 分"
+    if seconds >= 60:
+        return f"{int(seconds // 60)} 分 {int(seconds % 60):02d} 秒"
+    return f"{seconds:.1f} 秒"
+
+
+def _echo_estimate(estimate):
+    """输出 BatchRunner.estimate() 的结果"""
+    basis = '，'.join(f"{name} {count}" for name, count in sorted(estimate['basis'].items()))
+    click.echo(f"预计：测量 {estimate['to_measure']} 个零件（缓存 {estimate['cached']}，"
+               f"重复 {estimate['duplicates']}），合计 {_duration(estimate['work_s'])}，"
+               f"完工约 {_duration(estimate['eta_s'])}"
+               + (f"；依据 {basis}" if basis else ''), err=True)
+
+
+def _echo_nesting(groups):
+    """输出每组排样结果和合计"""
+    for row in groups:
+        label = f"排样：{row['material'] or '未知材料'} {row['thickness_m'] * 1e3:g} mm，{row['parts']} 件"
+        if not row['sheets']:
+            click.echo(f"{label}放不下任何板材", err=True)
+            continue
+        extra = f"，{row['unplaced']} 件放不下" if row['unplaced'] else ""
+        click.echo(f"{label}，{row['sheet_size']} 板 {row['sheets']} 张，"
+                   f"利用率 {row['utilization']:.0%}{extra}", err=True)
+    if len(groups) > 1:
+        totals = nesting_totals(groups)
+        click.echo(f"排样合计：{totals['parts']} 件，板材 {totals['sheets']} 张，"
+                   f"利用率 {totals['utilization'] or 0:.0%}", err=True)
+
+
+def _echo_cutlist(groups):
+    """输出每组棒料排料结果和合计"""
+    for row in groups:
+        label = f"下料：{row['material'] or '未知材料'} {row['section']}，{row['parts']} 件"
+        if not row['bars']:
+            click.echo(f"{label}长于任何棒料", err=True)
+            continue
+        stock = ' + '.join(f"{bar_label(p['bar_length_m'])} 棒料 {p['bars']} 根"
+                           for p in row['purchase'])
+        extra = f"，{row['unplaced']} 件长于棒料" if row['unplaced'] else ""
+        click.echo(f"{label}，{stock}，废料率 {row['waste']:.1%}（{row['method']}）{extra}",
+                   err=True)
+    if len(groups) > 1:
+        totals = cutlist_totals(groups)
+        click.echo(f"下料合计：{totals['parts']} 件，棒料 {totals['bars']} 根，"
+                   f"废料率 {totals['waste'] or 0:.1%}", err=True)
+
+
+def write_jsonl_stdout(records):
+    """没有指定输出时把记录以 JSON Lines 写到标准输出"""
+    encode = json_encoder()
+    out = sys.stdout.buffer
+    for record in records:
+        out.write(encode(record))
+        out.write(b'\n')
+    out.flush()
+
+
+def read_records(path):
+    """
+    读取 extract 写出的 .jsonl / .json 结果。
+
+    返回:
+        list: 零件记录
+    """
+    kind = output_format(path)
+    if kind not in ('.jsonl', '.json'):
+        raise click.BadParameter(f"只能读取 .jsonl 或 .json 结果: {path}", param_hint='RESULTS')
+
+    compression = path.lower().rsplit('.', 1)[-1]
+    if compression == 'gz':
+        import gzip
+        opener = gzip.open
+    elif compression == 'zst':
+        import zstandard
+        opener = lambda p, mode, encoding: zstandard.open(p, mode, encoding=encoding)  # noqa: E731
+    else:
+        opener = open
+
+    with opener(path, 'rt', encoding='utf-8') as f:
+        if kind == '.json':
+            data = json.load(f)
+            return data if isinstance(data, list) else [data]
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@cli.command()
+@click.argument('inputs', nargs=-1)
+@click.option('-m', '--manifest', type=click.Path(exists=True, dir_okay=False),
+              help="清单文件，每行一个路径或通配符")
+@click.option('--pattern', default='*.prt', show_default=True, help="文件夹中查找的文件名")
+@click.option('-b', '--backend', type=click.Choice(sorted(BACKENDS)), default='nx',
+              show_default=True, help="按该后端的历史耗时和缓存估计")
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help="工作者数；NX 后端大于 1 时按子进程估计")
+@click.option('-a', '--accuracy', type=click.FloatRange(0.0, 1.0, min_open=True),
+              default=DEFAULT_ACCURACY, show_default=True, help="测量精度")
+@click.option('--cache', 'cache_dir', default=DEFAULT_CACHE_DIR, show_default=True,
+              help="结果缓存目录")
+@click.option('--no-cache', is_flag=True, help="不使用缓存")
+@click.option('--history', 'history_db', type=click.Path(exists=True, dir_okay=False),
+              help="报价历史库；由其中的测量耗时拟合耗时模型")
+def estimate(inputs, manifest, pattern, backend, workers, accuracy, cache_dir, no_cache,
+             history_db):
+    """不打开零件，估计整批提取需要的时间。"""
+    processes = _use_processes(backend, workers)
+    paths = expand_inputs(inputs, manifest, pattern)
+    if not paths:
+        raise click.UsageError("没有找到零件文件")
+    runner = BatchRunner(backend=backend, accuracy=accuracy,
+                         cache=None if no_cache else cache_dir, workers=workers,
+                         processes=processes, runtime=_runtime_model(history_db, backend))
+    click.echo(f"{len(paths)} 个零件，后端 {backend}，{workers} 个"
+               f"{'子进程' if processes else '工作线程'}", err=True)
+    _echo_estimate(runner.estimate(paths))
+
+
+@cli.command()
+@click.argument('results', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', 'outputs', multiple=True, required=True,
+              help="输出文件，可重复；按扩展名选择 csv / jsonl / json / xlsx")
+@click.option('--materials', type=click.Path(exists=True, dir_okay=False), help="材料库 YAML")
+@click.option('--rates', type=click.Path(exists=True, dir_okay=False), help="费率表 YAML")
+@click.option('--previews', 'previews_dir', help="在 xlsx 中嵌入预览图，缩略图缓存到该目录")
+def report(results, outputs, materials, rates, previews_dir):
+    """由 extract 保存的结果重新计价并生成报表。"""
+    _check_outputs(outputs, previews_dir)
+    records = read_records(results)
+    if rates or materials:
+        _engine(materials, rates).price([r for r in records if not r.get('error')])
+    click.echo(f"{len(records)} 个零件", err=True)
+    sheet_metal = any('sheet_body_count' in r for r in records)
+    bars = any('bar_section' in r for r in records)
+    workbook = any(output_format(p) == '.xlsx' for p in outputs)
+    nesting = cutlist = None
+    if sheet_metal and workbook:
+        nesting = nest_records(records)
+        _echo_nesting(nesting)
+    if bars and workbook:
+        groups = cut_records(records)
+        _echo_cutlist(groups)
+        cutlist = purchase_list(groups)
+    write_outputs(records, outputs, previews_dir, metadata={'结果文件': results},
+                  features=any('face_count' in r for r in records),
+                  sheet_metal=sheet_metal, nesting=nesting, bars=bars, cutlist=cutlist)
+
+
+def _sheet_sizes(values):
+    """解析 --sheet 的 '3000x1500'（mm），返回以 m 为单位的规格列表"""
+    if not values:
+        return STANDARD_SHEETS
+    sizes = []
+    for value in values:
+        try:
+            length, width = (float(v) / 1e3 for v in value.lower().replace('×', 'x').split('x'))
+            if length <= 0 or width <= 0:
+                raise ValueError
+        except ValueError:
+            raise click.BadParameter(f"应为 长x宽（mm），如 3000x1500: {value}",
+                                     param_hint='--sheet')
+        sizes.append((max(length, width), min(length, width)))
+    return sizes
+
+
+def _field_tolerances(values):
+    tolerances = {}
+    for value in values:
+        field, sep, tol = value.partition('=')
+        try:
+            if not sep or field not in DIFF_FIELDS:
+                raise ValueError
+            tolerances[field] = float(tol)
+        except ValueError:
+            raise click.BadParameter(f"应为 字段=相对容差，字段可选: {', '.join(DIFF_FIELDS)}",
+                                     param_hint='--field-tolerance')
+    return tolerances
+
+
+@cli.command()
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', 'outputs', multiple=True,
+              help="输出文件，可重复；csv / jsonl / json")
+@click.option('-k', '--key', type=click.Choice(KEYS), default='auto', show_default=True,
+              help="零件标识：零件号、文件名或几何指纹；auto 优先用零件号")
+@click.option('-t', '--tolerance', type=click.FloatRange(min=0), default=DEFAULT_TOLERANCE,
+              show_default=True, help="默认相对容差")
+@click.option('--field-tolerance', multiple=True, metavar='FIELD=TOL',
+              help="单个字段的相对容差，可重复，如 volume_m3=0.005")
+@click.option('--all', 'include_all', is_flag=True, help="输出中包含未变化的零件")
+def diff(old, new, outputs, key, tolerance, field_tolerance, include_all):
+    """对比两个版本的提取结果，列出变化和超差的零件。"""
+    for path in outputs:
+        if output_format(path) not in ('.csv', '.jsonl', '.json'):
+            raise click.BadParameter(f"对比结果只能写出 csv / jsonl / json: {path}",
+                                     param_hint='-o/--output')
+    tolerances = _field_tolerances(field_tolerance)
+
+    columns = diff_columns(read_records(old), read_records(new), key=key,
+                           tolerance=tolerance, tolerances=tolerances)
+    summary = diff_summary(columns)
+    click.echo(f"新增 {summary['added']}，删除 {summary['removed']}，变化 {summary['changed']}，"
+               f"失败 {summary['error']}，未变 {summary['unchanged']}", err=True)
+    over = ', '.join(f"{field} {count}" for field, count in summary['over'].items() if count)
+    if over:
+        click.echo(f"超差字段：{over}", err=True)
+    if summary['duplicates']:
+        click.echo(f"警告：{summary['duplicates']} 个标识重复出现，只对比第一条", err=True)
+
+    rows = diff_rows(columns, None if include_all else ('added', 'removed', 'error', 'changed'))
+    for path in outputs:
+        kind = output_format(path)
+        if kind == '.csv':
+            write_csv(iter(rows), path, columns=diff_output_columns())
+        elif kind == '.jsonl':
+            write_jsonl(iter(rows), path)
+        else:
+            write_json(rows, path)
+        click.echo(f"已写出 {path}", err=True)
+    if not outputs:
+        write_jsonl_stdout(rows)
+
+
+@cli.group()
+def cache():
+    """查看或清空结果缓存。"""
+
+
+@cache.command('stats')
+@click.option('--cache', 'cache_dir', default=DEFAULT_CACHE_DIR, show_default=True)
+def cache_stats(cache_dir):
+    """缓存条目数和占用空间。"""
+    if not os.path.isdir(cache_dir):
+        click.echo(f"{cache_dir}: 不存在")
+        return
+    count = len(ResultCache(cache_dir))
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _dirs, files in os.walk(cache_dir) for name in files)
+    click.echo(f"{cache_dir}: {count} 个条目，{size / 1024:.1f} KB")
+
+
+@cache.command('clear')
+@click.option('--cache', 'cache_dir', default=DEFAULT_CACHE_DIR, show_default=True)
+@click.confirmation_option(prompt="确定清空缓存？")
+def cache_clear(cache_dir):
+    """删除所有缓存条目。"""
+    if not os.path.isdir(cache_dir):
+        click.echo(f"{cache_dir}: 不存在")
+        return
+    removed = ResultCache(cache_dir).clear()
+    click.echo(f"已删除 {removed} 个条目")
+
+
+@cli.group()
+def history():
+    """查询报价历史库。"""
+
+
+@history.command('runs')
+@click.argument('database', type=click.Path(exists=True, dir_okay=False))
+@click.option('-n', '--limit', type=click.IntRange(min=1), default=20, show_default=True)
+def history_runs(database, limit):
+    """最近的批处理。"""
+    for run in HistoryStore(database).runs(limit):
+        elapsed = f"{run['elapsed_s']:.1f} 秒" if run['elapsed_s'] is not None else "未完成"
+        click.echo(f"#{run['id']}  {run['started']}  {run['backend'] or '-'}  "
+                   f"{run['parts'] or 0} 个零件，失败 {run['errors'] or 0}，{elapsed}"
+                   + (f"  {run['note']}" if run['note'] else ''))
+
+
+@history.command('part')
+@click.argument('database', type=click.Path(exists=True, dir_okay=False))
+@click.option('-p', '--part-number', help="零件号")
+@click.option('-f', '--fingerprint', help="几何指纹")
+@click.option('-c', '--customer', help="客户")
+@click.option('-n', '--limit', type=click.IntRange(min=1), default=1, show_default=True,
+              help="返回的测量次数；1 表示只要最近一次成功的测量")
+def history_part(database, part_number, fingerprint, customer, limit):
+    """按零件号、指纹或客户查询历史测量，以 JSON Lines 输出。"""
+    if not (part_number or fingerprint or customer):
+        raise click.UsageError("需要 --part-number、--fingerprint 或 --customer 之一")
+    store = HistoryStore(database)
+    if limit == 1:
+        row = store.last_metrics(part_number, fingerprint, customer)
+        rows = [row] if row else []
+    else:
+        rows = store.part_history(part_number, fingerprint, customer, limit=limit)
+    if not rows:
+        click.echo("没有找到记录", err=True)
+    write_jsonl_stdout(rows)
+
+
+def main():
+    cli(prog_name='nxquote')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+列式数据工具
+
+批处理的记录是字典列表；批量计算时把需要的字段一次性转换为
+NumPy 数组，计算完成后再写回记录。
+"""
+
+import numpy as np
+
+
+def to_columns(records, fields, dtype=float):
+    """
+    将记录列表转换为列数组。
+
+    参数:
+        records: 字典列表
+        fields: 字段名列表
+        dtype: 数组类型；浮点列中的 None 转换为 NaN
+
+    返回:
+        dict: 字段名到数组的字典
+    """
+    columns = {}
+    for field in fields:
+        if dtype is float:
+            values = [r.get(field) for r in records]
+            columns[field] = np.array([np.nan if v is None else v for v in values], dtype=float)
+        else:
+            columns[field] = np.array([r.get(field) for r in records], dtype=dtype)
+    return columns
+
+
+def body_columns(records, fields):
+    """
+    将所有零件的实体展平为列数组。
+
+    参数:
+        records: 零件记录列表，每条记录的 bodies 为实体字典列表
+        fields: 实体字段名列表
+
+    返回:
+        tuple: (part_index, columns, bodies)
+            part_index: 每个实体所属零件在 records 中的下标
+            columns: 字段名到数组的字典
+            bodies: 展平后的实体字典列表，与数组顺序一致
+    """
+    bodies = []
+    owners = []
+    for i, record in enumerate(records):
+        part_bodies = record.get('bodies') or ()
+        bodies.extend(part_bodies)
+        owners.extend([i] * len(part_bodies))
+
+    part_index = np.array(owners, dtype=np.intp)
+    return part_index, to_columns(bodies, fields), bodies
+
+
+def write_columns(records, columns):
+    """
+    将列数组写回记录。
+
+    参数:
+        records: 字典列表
+        columns: 字段名到数组的字典，数组长度与 records 相同；NaN 写回为 None
+    """
+    names = list(columns)
+    lists = [columns[name].tolist() for name in names]
+    for i, record in enumerate(records):
+        for name, values in zip(names, lists):
+            value = values[i]
+            record[name] = value if value == value else None
@@ -0,0 +1,217 @@
+"""
+.prt 容器读取器
+
+直接解析 NX .prt 文件的 SPLMSSTR 流容器，无需启动 NX。
+
+容器布局（小端序）:
+    'SPLMSSTR' 魔数 + 1 字节版本 + u64 主流偏移 + u64 FOOTER 偏移
+    'HEADER' + u32 条目数 + 条目表
+    ...流数据...
+    'FOOTER' + u32 条目数 + 条目表 + 4 字节校验
+
+每个条目为 u32 名称长度 + UTF-8 名称；以 '/' 结尾的是目录，
+后跟 16 字节 CLSID，否则后跟 u64 偏移和 u64 长度。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+MAGIC = b'SPLMSSTR'
+
+# 只有这些流承载几何数据；预览图、属性、元数据等在每次保存时都会变化
+GEOMETRY_STREAMS = ('/Root/UG_PART/UG_PART',)
+
+# 指纹算法版本，修改算法时递增以使旧缓存失效
+FINGERPRINT_VERSION = b'prtfp1'
+
+_U32 = struct.Struct('<I')
+_U64X2 = struct.Struct('<QQ')
+
+
+class ContainerError(ValueError):
+    """文件不是有效的 SPLMSSTR 容器"""
+
+
+class PrtContainer:
+    """
+    以内存映射方式打开的 .prt 容器。
+
+    流内容以 memoryview 形式返回，不复制数据。
+    使用完毕后应调用 close()，或使用 with 语句。
+    """
+
+    def __init__(self, path):
+        """
+        打开容器并读取流目录。
+
+        参数:
+            path: .prt 文件路径
+        """
+        self.path = path
+        self.version = None
+        self.main_offset = None
+        self.streams = {}
+        self.directories = []
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise ContainerError(f"空文件: {path}")
+        self._view = memoryview(self._map)
+        try:
+            self._read_directory()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_directory(self):
+        """解析 HEADER 和 FOOTER 中的条目表"""
+        buf = self._map
+        if len(buf) < 25 or buf[:8] != MAGIC:
+            raise ContainerError(f"不是 SPLMSSTR 容器: {self.path}")
+
+        self.version = buf[8]
+        self.main_offset, footer_offset = _U64X2.unpack_from(buf, 9)
+
+        self._read_section(25, b'HEADER')
+        if 0 < footer_offset < len(buf):
+            self._read_section(footer_offset, b'FOOTER')
+
+    def _read_section(self, pos, tag):
+        """
+        读取一个条目表。
+
+        参数:
+            pos: 标签所在偏移
+            tag: 期望的标签 (b'HEADER' 或 b'FOOTER')
+
+        返回:
+            int: 条目表结束后的偏移
+        """
+        buf = self._map
+        size = len(buf)
+        if buf[pos:pos + 6] != tag:
+            raise ContainerError(f"缺少 {tag.decode()} 标记: {self.path}")
+        pos += 6
+        count, = _U32.unpack_from(buf, pos)
+        pos += 4
+
+        for _ in range(count):
+            name_len, = _U32.unpack_from(buf, pos)
+            pos += 4
+            name = buf[pos:pos + name_len].decode('utf-8', 'replace')
+            pos += name_len
+            if name.endswith('/'):
+                self.directories.append(name)
+                pos += 16  # CLSID
+                continue
+            offset, length = _U64X2.unpack_from(buf, pos)
+            pos += 16
+            if offset + length > size:
+                raise ContainerError(f"流 {name} 超出文件范围: {self.path}")
+            self.streams[name] = (offset, length)
+
+        return pos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.streams
+
+    def names(self):
+        """返回所有流名称（按文件偏移排序）"""
+        return sorted(self.streams, key=lambda n: self.streams[n][0])
+
+    def stream_sizes(self):
+        """
+        返回各流的字节数。
+
+        返回:
+            dict: 流名称到长度的字典
+        """
+        return {name: length for name, (_, length) in self.streams.items()}
+
+    def stream(self, name):
+        """
+        获取流内容的零拷贝视图。
+
+        参数:
+            name: 完整流名称，如 '/Root/part/attrs'
+
+        返回:
+            memoryview: 流内容视图；调用方不应在 close() 之后继续持有
+        """
+        offset, length = self.streams[name]
+        return self._view[offset:offset + length]
+
+    def read(self, name):
+        """
+        读取流内容的副本。
+
+        参数:
+            name: 完整流名称
+
+        返回:
+            bytes: 流内容
+        """
+        with self.stream(name) as view:
+            return view.tobytes()
+
+    def close(self):
+        """释放内存映射和文件句柄"""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def fingerprint_part(path, streams=GEOMETRY_STREAMS):
+    """
+    计算零件的几何指纹。
+
+    只对几何相关的流做哈希，因此另存、改属性、刷新预览图
+    不会改变指纹；不是 SPLMSSTR 容器的文件退化为对整个文件做哈希。
+
+    参数:
+        path: .prt 文件路径
+        streams: 参与哈希的流名称
+
+    返回:
+        str: 32 位十六进制指纹
+    """
+    digest = hashlib.blake2b(FINGERPRINT_VERSION, digest_size=16)
+
+    try:
+        container = PrtContainer(path)
+    except ContainerError:
+        if os.path.getsize(path) == 0:
+            return digest.hexdigest()
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            digest.update(b'raw')
+            digest.update(data)
+        return digest.hexdigest()
+
+    with container:
+        for name in streams:
+            if name not in container:
+                continue
+            digest.update(name.encode('utf-8'))
+            with container.stream(name) as view:
+                digest.update(_U32.pack(len(view) & 0xFFFFFFFF))
+                digest.update(view)
+
+    return digest.hexdigest()
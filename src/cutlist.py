@@ -0,0 +1,519 @@
+"""
+棒料 / 管料下料优化
+
+车削件和锯切件按棒料报价：零件毛坯沿轴向的长度就是下料长度，
+截面决定棒料规格。这里用零件记录中已有的边界框和毛坯尺寸（见
+metrics.py）识别棒料件，把同一 (材料, 截面) 的下料件排到标准长度
+的棒料上，给出采购清单和废料率：
+
+    轴向      截面两个尺寸相差不超过 ROUND_TOLERANCE、且体积不超过
+              边界框的 ROUND_FILL（圆柱占外接长方体的 π/4）时视为圆截面，
+              剩下的方向是轴向；否则最长方向是次长的 BAR_MIN_RATIO
+              倍以上时按型材处理，轴向取最长方向
+    截面      圆截面取两个毛坯尺寸的较大者，按 SECTION_STEP 向上取整
+              为棒料直径（'Ø45'）；型材为 '宽×高'
+    下料长度  轴向的毛坯尺寸；每件另加一个锯缝 SAW_KERF，每根棒料
+              去掉料头 BAR_END_TRIM
+
+排料先用 First Fit Decreasing：下料件从长到短放入第一根放得下的
+最长棒料，全部放完后每根换成放得下的最短规格。下料长度种类不多时
+再用列生成求解（Gilmore–Gomory）：主问题是 LP 松弛，定价问题是
+各规格棒料上的无界背包，最后对生成的切割方案求整数解；结果比
+FFD 用料更少时采用。列生成需要 SciPy（>= 1.9），没有时只用 FFD。
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from scipy.optimize import LinearConstraint, linprog, milp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# 标准棒料长度（m）
+STANDARD_BARS = (3.0, 6.0)
+
+# 锯缝宽度和每根棒料的料头（m）
+SAW_KERF = 0.003
+BAR_END_TRIM = 0.02
+
+# 圆截面判定：两个截面尺寸的相对差，以及体积占边界框的比例上限
+ROUND_TOLERANCE = 0.02
+ROUND_FILL = np.pi / 4 + 0.02
+
+# 非圆截面按型材处理时，最长尺寸与次长尺寸之比的下限
+BAR_MIN_RATIO = 2.0
+
+# 棒料截面的最大尺寸和取整步长（m）
+BAR_MAX_SECTION = 0.3
+SECTION_STEP = 0.005
+
+# 列生成的长度精度（m）、下料长度种类上限、迭代上限和总时限（秒）
+LENGTH_STEP = 0.001
+REFINE_MAX_LENGTHS = 300
+REFINE_MAX_ROUNDS = 200
+REFINE_TIME_LIMIT = 5.0
+
+# 比较长度时的容差（m）
+EPS = 1e-9
+
+# 零件记录中的下料列
+BAR_FIELDS = [
+    'bar_section',
+    'bar_cut_length_m',
+    'bar_usage_m',
+]
+
+# 流式 CSV 的列声明（见 sinks.parse_columns()）
+BAR_COLUMNS = [
+    'bar_section',
+    ('bar_cut_length_m', '.6g'),
+    ('bar_usage_m', '.6g'),
+]
+
+# 报价工作簿零件明细的附加列：(表头, 记录字段, 换算系数, 数字格式, 列宽)
+BAR_REPORT_COLUMNS = [
+    ('棒料截面', 'bar_section', None, None, 10),
+    ('下料长 (mm)', 'bar_cut_length_m', 1e3, '0.0', 12),
+    ('用料长 (mm)', 'bar_usage_m', 1e3, '0.0', 12),
+]
+
+
+def bar_label(length):
+    """棒料长度的标签，如 6000（mm）"""
+    return f"{length * 1e3:g}"
+
+
+def _round_up(size, step):
+    return np.ceil(size / step - 1e-9) * step
+
+
+def _bar_blanks(records, max_section=BAR_MAX_SECTION):
+    """
+    整批的棒料件（每个零件一件）。
+
+    返回:
+        tuple: (记录下标数组, 下料长度数组, 截面标签列表)
+    """
+    owner, length, sections = [], [], []
+    for i, record in enumerate(records):
+        if record.get('error') or record.get('sheet_body_count'):
+            continue
+        size = [record.get(k) for k in ('length_m', 'width_m', 'height_m')]
+        stock = [record.get(k) for k in ('stock_length_m', 'stock_width_m', 'stock_height_m')]
+        if any(v is None for v in size + stock):
+            continue
+        size = np.asarray(size, dtype=float)
+        stock = np.asarray(stock, dtype=float)
+        if not (np.isfinite(stock).all() and size.min() > 0):
+            continue
+        # 轴向：截面最接近圆的方向
+        pairs = ((1, 2), (0, 2), (0, 1))
+        spread = [abs(size[a] - size[b]) / max(size[a], size[b]) for a, b in pairs]
+        axis = int(np.argmin(spread))
+        fill = (record.get('volume_m3') or 0.0) / size.prod()
+        if spread[axis] <= ROUND_TOLERANCE and fill <= ROUND_FILL:
+            section = _round_up(stock[list(pairs[axis])].max(), SECTION_STEP)
+            if section > max_section + EPS:
+                continue
+            label = f"Ø{section * 1e3:g}"
+        else:
+            order = np.argsort(size)
+            if size[order[2]] < BAR_MIN_RATIO * size[order[1]]:
+                continue
+            axis = int(order[2])
+            side = _round_up(np.sort(stock[order[:2]])[::-1], SECTION_STEP)
+            if side[0] > max_section + EPS:
+                continue
+            label = f"{side[0] * 1e3:g}×{side[1] * 1e3:g}"
+        owner.append(i)
+        length.append(float(stock[axis]))
+        sections.append(label)
+    return np.array(owner, dtype=np.intp), np.array(length, dtype=float), sections
+
+
+def _downsize(used, capacity):
+    """每根棒料换成放得下的最短规格，返回规格下标数组"""
+    order = np.argsort(capacity)
+    fits = used[:, None] <= capacity[order][None, :] + EPS
+    return order[np.argmax(fits, axis=1)]
+
+
+def first_fit_decreasing(lengths, bars=STANDARD_BARS, kerf=SAW_KERF, trim=BAR_END_TRIM):
+    """
+    First Fit Decreasing 排料。
+
+    下料件从长到短放入第一根放得下的棒料，放不下时开一根最长规格的
+    新棒料；全部放完后每根换成放得下的最短规格。
+
+    参数:
+        lengths: 下料长度数组（m）
+        bars: 棒料长度列表（m）
+        kerf: 锯缝宽度（m）
+        trim: 每根棒料的料头（m）
+
+    返回:
+        tuple: (每根棒料的 (规格下标, 下料件下标列表) 列表, 放不下的下料件下标列表)
+    """
+    lengths = np.asarray(lengths, dtype=float)
+    capacity = np.asarray(bars, dtype=float) - trim
+    need = lengths + kerf
+    room = capacity.max()
+    remaining = np.empty(len(lengths))
+    contents = []
+    unplaced = []
+    for i in np.argsort(-need, kind='stable').tolist():
+        if need[i] > room + EPS:
+            unplaced.append(i)
+            continue
+        hits = np.flatnonzero(remaining[:len(contents)] >= need[i] - EPS)
+        if len(hits):
+            k = int(hits[0])
+        else:
+            k = len(contents)
+            contents.append([])
+            remaining[k] = room
+        contents[k].append(i)
+        remaining[k] -= need[i]
+    if not contents:
+        return [], unplaced
+    stock = _downsize(room - remaining[:len(contents)], capacity)
+    return list(zip(stock.tolist(), contents)), unplaced
+
+
+def _knapsack(weights, values, capacity):
+    """
+    无界背包：容量为 capacity 的棒料上价值最大的切割方案。
+
+    逐种下料件更新 dp；dp 按件长 w 排成 (c // w, w) 的矩阵后，
+    「取 k 件」的递推是一列上的累计最大值，整列一次算完。
+
+    参数:
+        weights: 每种下料件占用的整数长度
+        values: 每种下料件的价值（对偶价格）
+        capacity: 棒料的整数容量
+
+    返回:
+        tuple: (最大价值, 每种下料件的件数数组)
+    """
+    dp = np.zeros(capacity + 1)
+    history = []
+    for w, v in zip(weights.tolist(), values.tolist()):
+        history.append(dp)
+        if w > capacity or v <= 0:
+            continue
+        rows = -(-(capacity + 1) // w)
+        grid = np.full(rows * w, -np.inf)
+        grid[:capacity + 1] = dp
+        grid = grid.reshape(rows, w)
+        k = np.arange(rows)[:, None] * v
+        dp = (np.maximum.accumulate(grid - k, axis=0) + k).ravel()[:capacity + 1]
+
+    counts = np.zeros(len(weights), dtype=np.int64)
+    c = capacity
+    best = dp[c]
+    for i in range(len(weights) - 1, -1, -1):
+        before = history[i]
+        w, v = int(weights[i]), values[i]
+        if w <= c and v > 0 and best > before[c] + 1e-12:
+            ks = np.arange(c // w + 1)
+            reached = before[c - ks * w] + ks * v
+            k = int(np.flatnonzero(reached >= best - 1e-9)[0])
+            counts[i] = k
+            c -= k * w
+        best = before[c]
+    return float(dp[capacity]), counts
+
+
+def _patterns_to_bars(columns, stocks, uses, demand):
+    """
+    把各方案的使用次数展开为棒料，多切的件从后往前去掉。
+
+    返回:
+        list: 每根棒料的 (规格下标, 各种下料件件数数组)
+    """
+    surplus = np.maximum(np.array(columns).T @ uses - demand, 0)
+    bars = []
+    for j in np.flatnonzero(uses).tolist():
+        for _copy in range(int(uses[j])):
+            counts = columns[j].copy()
+            cut = np.minimum(counts, surplus)
+            counts -= cut
+            surplus -= cut
+            if counts.any():
+                bars.append((stocks[j], counts))
+    return bars
+
+
+def column_generation(lengths, bars=STANDARD_BARS, kerf=SAW_KERF, trim=BAR_END_TRIM,
+                      incumbent=None, max_lengths=REFINE_MAX_LENGTHS,
+                      max_rounds=REFINE_MAX_ROUNDS, time_limit=REFINE_TIME_LIMIT):
+    """
+    列生成求解下料问题（需要 SciPy）。
+
+    长度按 LENGTH_STEP 取整为整数；主问题最小化所用棒料的总长度，
+    每轮对各规格求一次背包，把降低成本为负的方案加入，直到没有
+    改进。整数解先把 LP 解向下取整，剩余的件用 FFD 补齐；仍未达到
+    下界时再在生成的方案上求整数规划，取两者中用料少的。
+
+    每轮由对偶价格得到 LP 最优值的下界（Farley 界：LP 值除以各规格
+    背包价值与棒料长度之比的最大值）。整数解的总长度是各规格长度
+    最大公约数的整数倍，下界取整后已不小于 incumbent 时提前结束。
+
+    参数:
+        lengths: 下料长度数组（m）
+        bars / kerf / trim: 同 first_fit_decreasing()
+        incumbent: 可选，已有方案的棒料总长（m），如 FFD 的结果
+        max_lengths: 下料长度种类超过该值时不求解
+        max_rounds: 列生成的最大轮数
+        time_limit: 总时限（秒），列生成和整数规划各用一半
+
+    返回:
+        tuple: (每根棒料的 (规格下标, 下料件下标列表) 列表, LP 下界（m）)；
+            不能求解或不可能优于 incumbent 时返回 None
+    """
+    if not SCIPY_AVAILABLE or not len(lengths):
+        return None
+    started = time.perf_counter()
+    need = np.ceil((np.asarray(lengths, dtype=float) + kerf) / LENGTH_STEP - 1e-6)
+    capacity = np.floor((np.asarray(bars, dtype=float) - trim) / LENGTH_STEP + 1e-6)
+    need, capacity = need.astype(np.int64), capacity.astype(np.int64)
+    if need.max() > capacity.max():
+        return None
+    sizes, kind, demand = np.unique(need, return_inverse=True, return_counts=True)
+    kind = kind.reshape(-1)
+    if len(sizes) > max_lengths:
+        return None
+    cost = np.round(np.asarray(bars, dtype=float) / LENGTH_STEP)
+    grain = float(np.gcd.reduce(cost.astype(np.int64)))
+    target = np.inf if incumbent is None else round(incumbent / LENGTH_STEP)
+
+    def beaten(lower):
+        return np.ceil(lower / grain - 1e-6) * grain >= target
+
+    # 棒料长度不小于容量，下料件总长就是一个下界
+    if beaten(float(need.sum())):
+        return None
+
+    # 初始方案：每种下料件在每种放得下的规格上单独切满
+    columns, stocks = [], []
+    for s, cap in enumerate(capacity.tolist()):
+        for i, w in enumerate(sizes.tolist()):
+            if w <= cap:
+                column = np.zeros(len(sizes), dtype=np.int64)
+                column[i] = min(cap // w, demand[i])
+                columns.append(column)
+                stocks.append(s)
+
+    lower = 0.0
+    for _round in range(max_rounds):
+        lp = linprog(cost[stocks], A_ub=-np.array(columns).T, b_ub=-demand, bounds=(0, None),
+                     method='highs')
+        if lp.status != 0:
+            return None
+        solution = lp.x
+        dual = -lp.ineqlin.marginals
+        added = False
+        ratio = 1.0
+        for s, cap in enumerate(capacity.tolist()):
+            value, counts = _knapsack(sizes, dual, int(cap))
+            ratio = max(ratio, value / cost[s])
+            if cost[s] - value < -1e-6 and counts.any():
+                columns.append(counts)
+                stocks.append(s)
+                added = True
+        lower = max(lower, lp.fun / ratio)
+        if beaten(lower):
+            return None
+        if not added or time.perf_counter() - started > time_limit / 2:
+            break
+    solution = np.concatenate([solution, np.zeros(len(stocks) - len(solution))])
+
+    # LP 解向下取整，剩余的件用 FFD
+    floor = np.floor(solution + 1e-9).astype(np.int64)
+    chosen = _patterns_to_bars(columns, stocks, floor, demand)
+    produced = sum((counts for _s, counts in chosen), np.zeros(len(sizes), dtype=np.int64))
+    residual = np.repeat(np.arange(len(sizes)), demand - produced)
+    if len(residual):
+        extra, _unplaced = first_fit_decreasing(sizes[residual] * LENGTH_STEP, bars, 0.0,
+                                                trim)
+        for s, cut in extra:
+            chosen.append((s, np.bincount(residual[cut], minlength=len(sizes))))
+    total = sum(cost[s] for s, _counts in chosen)
+
+    remaining = time_limit - (time.perf_counter() - started)
+    if np.ceil(lower / grain - 1e-6) * grain < total and remaining > 0:
+        matrix = np.array(columns).T
+        result = milp(cost[stocks], constraints=LinearConstraint(matrix, lb=demand, ub=np.inf),
+                      integrality=np.ones(len(stocks)), bounds=(0, np.inf),
+                      options={'time_limit': remaining, 'mip_rel_gap': grain / max(total, 1.0)})
+        if result.x is not None:
+            uses = np.round(result.x).astype(np.int64)
+            if cost[stocks] @ uses < total - 0.5:
+                chosen = _patterns_to_bars(columns, stocks, uses, demand)
+
+    # 各件按种类分给棒料，再把每根换成放得下的最短规格
+    waiting = [list(np.flatnonzero(kind == i)[::-1]) for i in range(len(sizes))]
+    layout = [[waiting[i].pop() for i in np.repeat(np.arange(len(sizes)), counts)]
+              for _s, counts in chosen]
+    used = np.array([(need[items] * LENGTH_STEP).sum() for items in layout])
+    stock = _downsize(used, np.asarray(bars, dtype=float) - trim)
+    return list(zip(stock.tolist(), layout)), float(lower * LENGTH_STEP)
+
+
+def cut_group(lengths, bars=STANDARD_BARS, kerf=SAW_KERF, trim=BAR_END_TRIM, refine=True,
+              items=None):
+    """
+    为一组下料件排料并给出采购量。
+
+    参数:
+        lengths: 下料长度数组（m）
+        bars / kerf / trim: 同 first_fit_decreasing()
+        refine: 是否尝试列生成（需要 SciPy）
+        items: 可选，各下料件的标识；默认为下标
+
+    返回:
+        dict: method（'FFD' 或 '列生成'）、bars（棒料根数）、purchase（按规格的
+            {bar_length_m, bars, pieces, cut_length_m} 列表）、pieces（已排件数）、unplaced（放不下的
+            标识列表）、cut_length_m（已排下料长度）、stock_length_m（棒料总长）、
+            waste（废料率）、lower_bound_m（列生成的 LP 下界，未求解时为 None）、
+            layouts（每根棒料的 (棒料长度, 标识列表)）
+    """
+    lengths = np.asarray(lengths, dtype=float)
+    if items is None:
+        items = list(range(len(lengths)))
+    bar_lengths = np.asarray(bars, dtype=float)
+    packed, unplaced = first_fit_decreasing(lengths, bars, kerf, trim)
+    method = 'FFD'
+    bound = None
+    placed = np.setdiff1d(np.arange(len(lengths)), unplaced)
+    if refine and len(placed):
+        incumbent = sum(bar_lengths[s] for s, _cut in packed)
+        solved = column_generation(lengths[placed], bars, kerf, trim, incumbent)
+        if solved is not None:
+            layout, bound = solved
+            total = sum(bar_lengths[s] for s, _cut in layout)
+            if total < incumbent - EPS:
+                packed = [(s, placed[cut].tolist()) for s, cut in layout]
+                method = '列生成'
+
+    stock = np.array([s for s, _cut in packed], dtype=np.intp)
+    stock_length = float(bar_lengths[stock].sum()) if len(stock) else 0.0
+    cut_length = float(lengths[placed].sum())
+    purchase = []
+    for s, bar_length in enumerate(bar_lengths.tolist()):
+        cuts = [i for k, cut in packed if k == s for i in cut]
+        if cuts:
+            purchase.append({'bar_length_m': bar_length, 'bars': int((stock == s).sum()),
+                             'pieces': len(cuts), 'cut_length_m': float(lengths[cuts].sum())})
+    return {
+        'method': method,
+        'bars': len(packed),
+        'purchase': purchase,
+        'pieces': len(placed),
+        'unplaced': [items[i] for i in unplaced],
+        'cut_length_m': cut_length,
+        'stock_length_m': stock_length,
+        'waste': 1.0 - cut_length / stock_length if stock_length else None,
+        'lower_bound_m': bound,
+        'layouts': [(float(bar_lengths[s]), [items[i] for i in cut]) for s, cut in packed],
+    }
+
+
+def cut_records(records, bars=STANDARD_BARS, kerf=SAW_KERF, trim=BAR_END_TRIM, refine=True):
+    """
+    对整批棒料件按 (材料, 截面) 分组排料，写入 BAR_FIELDS。
+
+    零件数量取记录的 quantity（缺省为 1），每件按数量重复。
+
+    写入的字段（只写棒料件）:
+        bar_section: 棒料截面，如 'Ø45'、'40×20'（mm）
+        bar_cut_length_m: 下料长度（轴向毛坯尺寸）
+        bar_usage_m: 每件分摊的棒料长度（按下料长度分摊本组的棒料总长）
+
+    参数:
+        records: 零件记录列表（原地修改）
+        bars / kerf / trim / refine: 同 cut_group()
+
+    返回:
+        list: 每组一个字典，含 material、section、parts（下料件数）、
+            unplaced（放不下的件数），以及 cut_group() 返回的其余字段；
+            layouts 中的标识为 (记录下标, 件号)
+    """
+    for record in records:
+        for name in BAR_FIELDS:
+            record.pop(name, None)
+    owner, length, sections = _bar_blanks(records)
+    groups = {}
+    for k, i in enumerate(owner.tolist()):
+        groups.setdefault((records[i].get('material'), sections[k]), []).append(k)
+
+    rows = []
+    for key in sorted(groups, key=lambda g: (str(g[0]), g[1])):
+        material, section = key
+        blanks = np.array(groups[key], dtype=np.intp)
+        quantity = np.array([max(int(records[i].get('quantity') or 1), 1) for i in owner[blanks]])
+        copies = np.repeat(blanks, quantity)
+        items = []
+        seen = {}
+        for k in copies.tolist():
+            seen[k] = seen.get(k, 0) + 1
+            items.append((int(owner[k]), seen[k]))
+        result = cut_group(length[copies], bars, kerf, trim, refine, items)
+        cut = result['cut_length_m']
+        share = result['stock_length_m'] / cut if cut else None
+        lost = {i for i, _copy in result['unplaced']}
+        for k in blanks.tolist():
+            record = records[owner[k]]
+            record['bar_section'] = section
+            record['bar_cut_length_m'] = float(length[k])
+            record['bar_usage_m'] = float(length[k] * share) if share and owner[k] not in lost \
+                else None
+        result.update({
+            'material': material,
+            'section': section,
+            'parts': len(items),
+            'unplaced': len(result['unplaced']),
+        })
+        rows.append(result)
+    return rows
+
+
+def purchase_list(groups):
+    """
+    采购清单：每个 (材料, 截面, 棒料长度) 一行。
+
+    参数:
+        groups: cut_records() 的结果
+
+    返回:
+        list: 字典列表，含 material、section、bar_length_m、bars、pieces、
+            cut_length_m、stock_length_m、method
+    """
+    return [
+        dict(row, material=group['material'], section=group['section'],
+             stock_length_m=row['bar_length_m'] * row['bars'], method=group['method'])
+        for group in groups for row in group['purchase']
+    ]
+
+
+def cutlist_totals(groups):
+    """
+    排料结果的合计。
+
+    返回:
+        dict: groups、bars、parts、unplaced、cut_length_m、stock_length_m、waste
+    """
+    cut = sum(g['cut_length_m'] for g in groups)
+    stock = sum(g['stock_length_m'] for g in groups)
+    return {
+        'groups': len(groups),
+        'bars': sum(g['bars'] for g in groups),
+        'parts': sum(g['parts'] for g in groups),
+        'unplaced': sum(g['unplaced'] for g in groups),
+        'cut_length_m': cut,
+        'stock_length_m': stock,
+        'waste': 1.0 - cut / stock if stock else None,
+    }
@@ -0,0 +1,162 @@
+"""
+重复零件检测
+
+客户上传的文件中经常包含换了文件名的同一个零件。
+两级检测：
+    1. 测量前按几何指纹分组，内容相同的文件只测量一次；
+    2. 测量后按几何签名（体积、表面积、排序后的边界框尺寸、实体数量）
+       在哈希网格中查找，标记重复和近似重复的零件供报价员复核。
+"""
+
+import math
+from collections import OrderedDict
+
+from .container import fingerprint_part
+
+# 几何签名各分量相对差异不超过此值视为重复
+EXACT_TOLERANCE = 1e-6
+
+# 相对差异不超过此值视为近似重复
+NEAR_TOLERANCE = 0.02
+
+
+def group_by_fingerprint(paths, fingerprints=None):
+    """
+    按几何指纹对文件分组。
+
+    参数:
+        paths: 文件路径列表
+        fingerprints: 可选，已计算好的 {路径: 指纹} 字典
+
+    返回:
+        OrderedDict: 指纹到路径列表的字典，保持首次出现的顺序
+    """
+    groups = OrderedDict()
+    for path in paths:
+        if fingerprints is not None and path in fingerprints:
+            fp = fingerprints[path]
+        else:
+            fp = fingerprint_part(path)
+        groups.setdefault(fp, []).append(path)
+    return groups
+
+
+def geometric_signature(record):
+    """
+    计算零件的几何签名。
+
+    参数:
+        record: 包含 volume_m3、area_m2、length_m、width_m、height_m、body_count 的字典
+
+    返回:
+        tuple: (实体数量, 对数分量元组)；缺少有效几何时返回 None
+    """
+    values = [record.get('volume_m3'), record.get('area_m2')]
+    # 排序后的边界框尺寸与零件摆放方向无关
+    extents = sorted((record.get('length_m'), record.get('width_m'), record.get('height_m')),
+                     key=lambda v: -1.0 if v is None else v, reverse=True)
+    values.extend(extents)
+
+    if any(v is None or v <= 0 for v in values):
+        return None
+    return int(record.get('body_count') or 0), tuple(math.log(v) for v in values)
+
+
+class GridIndex:
+    """
+    对数空间中的哈希网格索引。
+
+    网格键为 (实体数量, 体积格, 面积格)，格宽等于容差，
+    因此容差内的候选项只可能落在相邻的 3x3 个格子里。
+    """
+
+    def __init__(self, tolerance=NEAR_TOLERANCE):
+        self.cell = math.log1p(tolerance)
+        self._cells = {}
+
+    def _coords(self, logs):
+        return math.floor(logs[0] / self.cell), math.floor(logs[1] / self.cell)
+
+    def insert(self, item, signature):
+        """
+        插入一个条目。
+
+        参数:
+            item: 任意条目标识
+            signature: geometric_signature() 的返回值
+        """
+        count, logs = signature
+        cv, ca = self._coords(logs)
+        self._cells.setdefault((count, cv, ca), []).append((item, logs))
+
+    def candidates(self, signature):
+        """
+        返回相邻格子中的所有条目。
+
+        参数:
+            signature: geometric_signature() 的返回值
+
+        返回:
+            list: (条目, 对数分量) 元组列表
+        """
+        count, logs = signature
+        cv, ca = self._coords(logs)
+        found = []
+        for dv in (-1, 0, 1):
+            for da in (-1, 0, 1):
+                found.extend(self._cells.get((count, cv + dv, ca + da), ()))
+        return found
+
+
+def flag_duplicates(records, exact_tolerance=EXACT_TOLERANCE, near_tolerance=NEAR_TOLERANCE):
+    """
+    在测量结果中标记重复和近似重复的零件。
+
+    每条记录会被设置:
+        duplicate_of: 几何相同的首个零件文件名，否则为 None
+        near_duplicate_of: 几何近似的零件文件名，否则为 None
+        near_duplicate_delta: 与该零件的最大相对差异
+
+    已由指纹分组标记为 duplicate_of 的记录保持不变。
+
+    参数:
+        records: 零件记录列表（就地修改）
+        exact_tolerance: 重复的相对容差
+        near_tolerance: 近似重复的相对容差
+
+    返回:
+        list: 同一个记录列表
+    """
+    exact_limit = math.log1p(exact_tolerance)
+    near_limit = math.log1p(near_tolerance)
+    index = GridIndex(near_tolerance)
+
+    for record in records:
+        record.setdefault('duplicate_of', None)
+        record['near_duplicate_of'] = None
+        record['near_duplicate_delta'] = None
+
+        signature = geometric_signature(record)
+        if signature is None:
+            continue
+
+        best, best_delta = None, None
+        for other, other_logs in index.candidates(signature):
+            delta = max(abs(a - b) for a, b in zip(signature[1], other_logs))
+            if delta <= near_limit and (best_delta is None or delta < best_delta):
+                best, best_delta = other, delta
+
+        if best is not None and best_delta <= exact_limit:
+            if record['duplicate_of'] is None:
+                record['duplicate_of'] = best['file']
+            continue
+
+        if best is not None:
+            record['near_duplicate_of'] = best['file']
+            record['near_duplicate_delta'] = math.expm1(best_delta)
+
+        # 已是重复的记录不作为代表项入网格
+        if record['duplicate_of'] is None:
+            index.insert(record, signature)
+
+    return records
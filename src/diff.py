@@ -0,0 +1,312 @@
+"""
+结果对比
+
+客户发来装配的新版本时，把两次提取的结果按零件标识做哈希连接，
+逐零件计算质量、面积、尺寸等的变化，并标出超出容差的零件。
+
+连接和计算都在列数组上完成：每侧的记录只转换一次为 NumPy 数组，
+连接结果是两侧的行下标，之后按下标整列取值相减。
+
+零件标识（key）:
+    part_number: 零件号属性（见 attrs.QUOTE_FIELDS），不区分大小写
+    file: 不含扩展名的文件名，不区分大小写
+    fingerprint: 几何指纹，只能找出内容完全相同的文件
+    auto: 有零件号时用零件号，否则用文件名
+
+状态（status）:
+    added / removed: 只在新 / 旧结果中出现
+    error: 任一侧测量失败
+    changed: 至少一个字段超出容差
+    unchanged: 所有字段都在容差内
+"""
+
+import os
+
+import numpy as np
+
+from .attrs import QUOTE_FIELDS
+from .columns import to_columns
+
+# 默认对比的字段
+DIFF_FIELDS = [
+    'body_count',
+    'volume_m3',
+    'area_m2',
+    'length_m',
+    'width_m',
+    'height_m',
+    'mass_kg',
+    'quoted_unit_price',
+]
+
+# 默认相对容差
+DEFAULT_TOLERANCE = 0.01
+
+# 各字段的绝对容差下限，避免接近 0 的值因相对容差过小而误报
+ABS_TOLERANCES = {
+    'body_count': 0.0,
+    'volume_m3': 1e-9,      # 1 mm³
+    'area_m2': 1e-6,        # 1 mm²
+    'length_m': 1e-4,       # 0.1 mm
+    'width_m': 1e-4,
+    'height_m': 1e-4,
+    'mass_kg': 1e-4,
+    'quoted_unit_price': 0.01,
+}
+
+KEYS = ('auto', 'part_number', 'file', 'fingerprint')
+
+STATUSES = ('added', 'removed', 'error', 'changed', 'unchanged')
+
+# 零件号属性名（小写）到优先级
+_PART_NUMBER_NAMES = {name.lower(): rank for rank, name in enumerate(QUOTE_FIELDS['part_number'])}
+
+
+def _file_key(record):
+    name = record.get('file') or os.path.basename(record.get('path') or '')
+    return os.path.splitext(name)[0].strip().lower() or None
+
+
+def _part_number(record):
+    value = record.get('part_number')
+    if value in (None, ''):
+        # 与 quote_fields() 相同的取值规则，只查零件号一个字段
+        best = None
+        for name, candidate in (record.get('attributes') or {}).items():
+            rank = _PART_NUMBER_NAMES.get(str(name).strip().lower())
+            if rank is not None and candidate not in (None, '') and (best is None or rank < best):
+                best, value = rank, candidate
+    return None if value in (None, '') else str(value).strip().lower()
+
+
+def part_keys(records, key='auto'):
+    """
+    计算记录的零件标识。
+
+    参数:
+        records: 零件记录列表
+        key: KEYS 之一
+
+    返回:
+        list: 标识字符串；无法确定时为 None
+    """
+    if key not in KEYS:
+        raise ValueError(f"未知的零件标识: {key}（可选: {', '.join(KEYS)}）")
+    if key == 'file':
+        return [_file_key(r) for r in records]
+    if key == 'fingerprint':
+        return [r.get('fingerprint') for r in records]
+    if key == 'part_number':
+        return [_part_number(r) for r in records]
+    return [_part_number(r) or _file_key(r) for r in records]
+
+
+def hash_join(old_keys, new_keys):
+    """
+    按标识对两组记录做全外连接。
+
+    新结果建哈希表，旧结果逐个探查；同一标识出现多次时只连接第一条，
+    其余作为未匹配的行保留。
+
+    参数:
+        old_keys: 旧结果的标识列表
+        new_keys: 新结果的标识列表
+
+    返回:
+        tuple: (old_index, new_index, duplicates)
+            old_index / new_index: 等长的 intp 数组，未匹配的一侧为 -1；
+                顺序为旧结果顺序，之后是只在新结果中的行
+            duplicates: 重复出现的标识集合
+    """
+    table = {}
+    duplicates = set()
+    for j, k in enumerate(new_keys):
+        if k is None:
+            continue
+        if k in table:
+            duplicates.add(k)
+        else:
+            table[k] = j
+
+    seen = set()
+    old_index = []
+    new_index = []
+    matched = np.zeros(len(new_keys), dtype=bool)
+    for i, k in enumerate(old_keys):
+        j = -1
+        if k is not None:
+            if k in seen:
+                duplicates.add(k)
+            else:
+                seen.add(k)
+                j = table.get(k, -1)
+                if j >= 0:
+                    matched[j] = True
+        old_index.append(i)
+        new_index.append(j)
+
+    added = np.flatnonzero(~matched)
+    old_index = np.concatenate([np.array(old_index, dtype=np.intp),
+                                np.full(len(added), -1, dtype=np.intp)])
+    new_index = np.concatenate([np.array(new_index, dtype=np.intp), added.astype(np.intp)])
+    return old_index, new_index, duplicates
+
+
+def _take(values, index):
+    """按下标取值，-1 取 NaN"""
+    out = np.full(len(index), np.nan)
+    present = index >= 0
+    out[present] = values[index[present]]
+    return out
+
+
+def _pick(items, index):
+    return [items[i] if i >= 0 else None for i in index.tolist()]
+
+
+def diff_columns(old, new, key='auto', fields=None, tolerance=DEFAULT_TOLERANCE,
+                 tolerances=None):
+    """
+    对比两组结果，返回列数组。
+
+    超差条件: |新 - 旧| > 绝对容差 + 相对容差 × |旧|；一侧有值另一侧为空也算超差。
+
+    参数:
+        old: 旧结果记录列表
+        new: 新结果记录列表
+        key: 零件标识，见 KEYS
+        fields: 对比的字段；None 使用 DIFF_FIELDS
+        tolerance: 默认相对容差
+        tolerances: 可选，字段名到相对容差的字典，覆盖默认值
+
+    返回:
+        dict: key、status、file_old、file_new、changed_fields（列表），
+            old_index、new_index（数组），以及每个字段的
+            {字段}_old / _new / _delta / _rel（浮点数组）和 _over（布尔数组）；
+            另有 duplicates（重复出现的标识列表）
+    """
+    fields = list(fields or DIFF_FIELDS)
+    tolerances = tolerances or {}
+    old_keys = part_keys(old, key)
+    new_keys = part_keys(new, key)
+    old_index, new_index, duplicates = hash_join(old_keys, new_keys)
+    n = len(old_index)
+
+    old_cols = to_columns(old, fields)
+    new_cols = to_columns(new, fields)
+    both = (old_index >= 0) & (new_index >= 0)
+
+    result = {
+        'key': [new_keys[j] if j >= 0 else old_keys[i]
+                for i, j in zip(old_index.tolist(), new_index.tolist())],
+        'file_old': _pick([r.get('file') for r in old], old_index),
+        'file_new': _pick([r.get('file') for r in new], new_index),
+        'old_index': old_index,
+        'new_index': new_index,
+        'duplicates': sorted(duplicates),
+    }
+
+    over_any = np.zeros(n, dtype=bool)
+    over_matrix = np.zeros((n, len(fields)), dtype=bool)
+    for k, field in enumerate(fields):
+        a = _take(old_cols[field], old_index)
+        b = _take(new_cols[field], new_index)
+        delta = b - a
+        rel = np.full(n, np.nan)
+        np.divide(delta, np.abs(a), out=rel, where=np.nan_to_num(a) != 0)
+        limit = ABS_TOLERANCES.get(field, 0.0) + tolerances.get(field, tolerance) * np.abs(a)
+        with np.errstate(invalid='ignore'):
+            over = np.abs(delta) > limit
+        over |= np.isnan(a) != np.isnan(b)
+        over &= both
+        result[f'{field}_old'] = a
+        result[f'{field}_new'] = b
+        result[f'{field}_delta'] = delta
+        result[f'{field}_rel'] = rel
+        result[f'{field}_over'] = over
+        over_matrix[:, k] = over
+        over_any |= over
+
+    old_error = _take(np.array([bool(r.get('error')) for r in old], dtype=float), old_index)
+    new_error = _take(np.array([bool(r.get('error')) for r in new], dtype=float), new_index)
+    error = both & ((old_error == 1.0) | (new_error == 1.0))
+
+    status = np.full(n, 'unchanged', dtype=object)
+    status[over_any] = 'changed'
+    status[error] = 'error'
+    status[new_index < 0] = 'removed'
+    status[old_index < 0] = 'added'
+    result['status'] = status
+
+    names = np.array(fields, dtype=object)
+    changed_fields = [None] * n
+    for i in np.flatnonzero(over_any & (status == 'changed')).tolist():
+        changed_fields[i] = ','.join(names[over_matrix[i]])
+    result['changed_fields'] = changed_fields
+    result['fields'] = fields
+    return result
+
+
+def diff_rows(columns, statuses=None):
+    """
+    把 diff_columns() 的结果转换为行记录。
+
+    参数:
+        columns: diff_columns() 的返回值
+        statuses: 可选，只保留这些状态的行
+
+    返回:
+        list: 行字典；NaN 转换为 None
+    """
+    status = columns['status']
+    if statuses is None:
+        index = np.arange(len(status))
+    else:
+        index = np.flatnonzero(np.isin(status, list(statuses)))
+    positions = index.tolist()
+
+    names = ['key', 'status', 'file_old', 'file_new', 'changed_fields']
+    lists = []
+    for name in names:
+        values = columns[name]
+        lists.append([values[i] for i in positions] if isinstance(values, list)
+                     else values[index].tolist())
+    for field in columns['fields']:
+        for suffix in ('_old', '_new', '_delta', '_rel'):
+            names.append(field + suffix)
+            lists.append(columns[field + suffix][index].tolist())
+
+    rows = []
+    for values in zip(*lists):
+        rows.append({name: value if value == value else None
+                     for name, value in zip(names, values)})
+    return rows
+
+
+def diff_summary(columns):
+    """
+    对比结果的统计。
+
+    返回:
+        dict: 各状态的零件数、各字段超差的零件数（over）和重复标识数
+    """
+    status = columns['status']
+    summary = {name: int((status == name).sum()) for name in STATUSES}
+    summary['over'] = {field: int(columns[f'{field}_over'].sum()) for field in columns['fields']}
+    summary['duplicates'] = len(columns['duplicates'])
+    return summary
+
+
+def diff_output_columns(fields=None):
+    """
+    写出 CSV 时的列声明（见 sinks.parse_columns()）。
+
+    参数:
+        fields: 对比的字段；None 使用 DIFF_FIELDS
+    """
+    columns = ['key', 'status', 'file_old', 'file_new', 'changed_fields']
+    for field in fields or DIFF_FIELDS:
+        spec = '.0f' if field == 'body_count' else '.6g'
+        columns.extend([(f'{field}_old', spec), (f'{field}_new', spec),
+                        (f'{field}_delta', spec), (f'{field}_rel', '.4f')])
+    return columns
@@ -5,7 +5,6 @@
 """
 
 import csv
-import json
 from datetime import datetime
 
 try:
@@ -37,22 +36,33 @@ class DataExporter:
         """
         self.output_dir = output_dir
 
-    def to_csv(self, data, filename):
+    def to_csv(self, data, filename, columns=None, compression='auto'):
         """
         将数据导出到 CSV 文件。
 
+        给出 columns 或 data 为迭代器时按声明的列流式写出
+        （见 sinks.write_csv()），否则以所有记录的键的并集为表头。
+
         参数:
-            data: 包含模型数据的字典列表
-            filename: 输出文件名
+            data: 包含模型数据的字典列表，或记录的迭代器
+            filename: 输出文件名；.gz / .zst 结尾时压缩
+            columns: 可选，列声明；迭代器未给出时使用 sinks.RECORD_COLUMNS
+            compression: 流式写出时的压缩方式
 
         返回:
             str: 创建的文件路径
         """
+        filepath = f"{self.output_dir}/{filename}"
+
+        if columns is not None or not isinstance(data, (list, dict)):
+            from .sinks import write_csv
+
+            write_csv(data, filepath, columns, compression)
+            return filepath
+
         if not data:
             return None
 
-        filepath = f"{self.output_dir}/{filename}"
-
         # 获取所有唯一的键作为表头
         if isinstance(data, list):
             keys = set()
@@ -70,30 +80,39 @@ class DataExporter:
 
         return filepath
 
-    def to_json(self, data, filename):
+    def to_json(self, data, filename, indent=True, engine='auto'):
         """
         将数据导出到 JSON 文件。
 
+        文件名以 .jsonl（或 .jsonl.gz / .jsonl.zst）结尾时，data 可以是
+        记录的迭代器，逐条写为 JSON Lines。已安装 orjson 或 msgspec 时
+        使用它们编码，否则使用标准库 json，见 sinks.py。
+
         参数:
-            data: 字典或字典列表
+            data: 字典、字典列表或记录的迭代器
             filename: 输出文件名
+            indent: 普通 JSON 是否缩进
+            engine: JSON 编码库：'orjson'、'msgspec'、'json' 或 'auto'
 
         返回:
             str: 创建的文件路径
         """
-        filepath = f"{self.output_dir}/{filename}"
+        from .sinks import write_json, write_jsonl
 
-        # 将元组转换为列表以便 JSON 序列化
-        def convert(obj):
-            if isinstance(obj, dict):
-                return {k: convert(v) for k, v in obj.items()}
-            elif isinstance(obj, (list, tuple)):
-                return [convert(item) for item in obj]
-            else:
-                return obj
+        filepath = f"{self.output_dir}/{filename}"
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(convert(data), f, indent=2, ensure_ascii=False)
+        # 去掉压缩后缀再判断，out.jsonl.bak.json 这类文件名仍按普通 JSON 写出
+        name = filename.lower()
+        for suffix in ('.gz', '.zst'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        if name.endswith('.jsonl'):
+            if isinstance(data, dict):
+                data = [data]
+            write_jsonl(data, filepath, engine)
+        else:
+            write_json(data, filepath, indent, engine)
 
         return filepath
 
@@ -155,6 +174,36 @@ class DataExporter:
 
         return filepath
 
+    def create_batch_report(self, records, filename, metadata=None, previews=None,
+                            extra_columns=None, nesting=None, cutlist=None):
+        """
+        创建整批零件的多工作表报价工作簿。
+
+        流式写出，记录只遍历一次，见 report.write_batch_report()。
+
+        参数:
+            records: 零件记录的可迭代对象
+            filename: 输出文件名
+            metadata: 可选，写入元数据工作表的附加键值
+            previews: 可选，PreviewExtractor；给出时在零件明细中嵌入预览图
+            extra_columns: 可选，零件明细的附加列，如 features.FEATURE_REPORT_COLUMNS
+            nesting: 可选，nesting.nest_records() 的结果；给出时写出排样工作表
+            cutlist: 可选，cutlist.purchase_list() 的采购清单；给出时写出下料工作表
+
+        返回:
+            str: 创建的文件路径，如果 openpyxl 不可用则返回 None
+        """
+        if not OPENPYXL_AVAILABLE:
+            print("未安装 openpyxl。运行: pip install openpyxl")
+            return None
+
+        from .report import write_batch_report
+
+        filepath = f"{self.output_dir}/{filename}"
+        write_batch_report(records, filepath, metadata, previews, extra_columns, nesting,
+                           cutlist)
+        return filepath
+
     def create_quotation_report(self, data, filename):
         """
         创建格式化的报价报告。
@@ -0,0 +1,253 @@
+"""
+几何特征提取
+
+机加工报价除了体积和面积，还需要知道零件上有多少平面、圆柱面和
+自由曲面，有几个孔、孔径多大，最小内圆角多大（决定刀具），以及边长。
+
+后端对每个实体只遍历一次面和边，返回紧凑的数组（body_topology()）：
+
+    face_class   int8，面类别，FACE_CLASSES 的下标
+    face_radius  float，圆柱面的半径、圆环面和倒圆面的截面半径（m），其余为 NaN
+    face_concave bool，法向指向轴线的回转面（孔壁、内圆角）
+    face_axis    (n, 6) float，回转面轴线上一点和轴向，其余为 NaN
+    face_plane   (n, 6) float，平面上一点和外法向，其余为 NaN（钣金板厚用，见 sheetmetal.py）
+    face_box     (n, 6) float，面的边界框（m）
+    edge_length  float，各边长度（m）
+
+统计全部在数组上完成。孔的判定：凹圆柱面按 (半径, 轴线) 分组（NX 常把
+一个孔拆成两个半圆柱面），组内各面边界框的并集在垂直于轴线的方向上
+覆盖整圆时算作一个孔；只覆盖部分圆周的是型腔转角等内圆角。
+最小内圆角取不属于孔的凹回转面的最小半径，决定可用的最大刀具。
+
+特征随零件记录一起按几何指纹缓存；提取耗时记入 feature_time_s，
+以便只对需要的批次开启。
+"""
+
+import numpy as np
+
+# 面类别
+FACE_CLASSES = ('planar', 'cylindrical', 'conical', 'freeform')
+PLANAR, CYLINDRICAL, CONICAL, FREEFORM = range(len(FACE_CLASSES))
+
+# UF_MODL_ask_face_data 的面类型代码
+UF_CYLINDER = 16
+UF_CONE = 17
+UF_TORUS = 19
+UF_PLANE = 22
+UF_BLEND = 23
+
+# 面类型代码到面类别；圆环面和倒圆面按自由曲面计数
+UF_FACE_CLASSES = {
+    UF_PLANE: PLANAR,
+    UF_CYLINDER: CYLINDRICAL,
+    UF_CONE: CONICAL,
+}
+
+# 孔去重时的长度精度（m）
+HOLE_TOLERANCE = 1e-6
+
+# 零件记录中的特征列
+FEATURE_FIELDS = [
+    'face_count',
+    'planar_faces',
+    'cylindrical_faces',
+    'conical_faces',
+    'freeform_faces',
+    'hole_count',
+    'hole_sizes',
+    'min_internal_radius_m',
+    'edge_count',
+    'edge_length_m',
+    'min_edge_length_m',
+    'feature_time_s',
+]
+
+# 流式 CSV 的列声明（见 sinks.parse_columns()）
+FEATURE_COLUMNS = [
+    'face_count',
+    'planar_faces',
+    'cylindrical_faces',
+    'conical_faces',
+    'freeform_faces',
+    'hole_count',
+    'hole_sizes',
+    ('min_internal_radius_m', '.6g'),
+    'edge_count',
+    ('edge_length_m', '.6g'),
+    ('min_edge_length_m', '.6g'),
+    ('feature_time_s', '.3f'),
+]
+
+# 报价工作簿零件明细的附加列：(表头, 记录字段, 换算系数, 数字格式, 列宽)
+FEATURE_REPORT_COLUMNS = [
+    ('面数', 'face_count', None, '0', 8),
+    ('平面', 'planar_faces', None, '0', 8),
+    ('圆柱面', 'cylindrical_faces', None, '0', 8),
+    ('自由曲面', 'freeform_faces', None, '0', 10),
+    ('孔数', 'hole_count', None, '0', 8),
+    ('孔径 (mm)', 'hole_sizes', None, None, 20),
+    ('最小内圆角 (mm)', 'min_internal_radius_m', 1e3, '0.00', 14),
+    ('边长合计 (mm)', 'edge_length_m', 1e3, '0.0', 14),
+]
+
+
+def empty_topology():
+    """没有面和边的拓扑数组"""
+    return {
+        'face_class': np.zeros(0, dtype=np.int8),
+        'face_radius': np.zeros(0),
+        'face_concave': np.zeros(0, dtype=bool),
+        'face_axis': np.zeros((0, 6)),
+        'face_plane': np.zeros((0, 6)),
+        'face_box': np.zeros((0, 6)),
+        'edge_length': np.zeros(0),
+    }
+
+
+def _hole_keys(radius, axis):
+    """
+    孔的去重键：半径、单位化的轴向（统一符号）和轴线上离原点最近的点。
+
+    返回:
+        tuple: ((n, 7) 取整后的键, 统一符号后的单位轴向)
+    """
+    point = axis[:, :3]
+    direction = axis[:, 3:]
+    norm = np.linalg.norm(direction, axis=1, keepdims=True)
+    direction = np.divide(direction, norm, out=np.zeros_like(direction), where=norm > 0)
+    # 轴向 d 与 -d 是同一条轴线：让第一个非零分量为正
+    first = np.argmax(np.abs(direction) > 1e-9, axis=1)
+    sign = np.sign(direction[np.arange(len(direction)), first])
+    sign[sign == 0] = 1.0
+    direction = direction * sign[:, None]
+    foot = point - (point * direction).sum(axis=1, keepdims=True) * direction
+    # 半径和位置按 HOLE_TOLERANCE 取整，轴向按 1e-6 取整
+    keys = np.column_stack([radius / HOLE_TOLERANCE, direction / 1e-6, foot / HOLE_TOLERANCE])
+    return np.round(keys).astype(np.int64), direction
+
+
+def find_holes(radius, axis, box):
+    """
+    把凹圆柱面归并为孔。
+
+    参数:
+        radius: 各面的半径
+        axis: 各面的轴线 (n, 6)
+        box: 各面的边界框 (n, 6)
+
+    返回:
+        tuple: (每个面所属的组号, 每组是否为整圆的孔, 每组的半径)
+    """
+    keys, direction = _hole_keys(radius, axis)
+    _unique, first, group = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    group = group.reshape(-1)
+    count = len(first)
+    low = np.full((count, 3), np.inf)
+    high = np.full((count, 3), -np.inf)
+    np.minimum.at(low, group, box[:, :3])
+    np.maximum.at(high, group, box[:, 3:])
+    # 半径 r、轴向 d 的整圆在世界坐标轴 i 上的投影长度为 2r·sqrt(1 - d_i²)
+    r = radius[first]
+    d = direction[first]
+    expected = 2.0 * r[:, None] * np.sqrt(np.clip(1.0 - d * d, 0.0, 1.0))
+    full = ((high - low) >= expected * 0.99 - HOLE_TOLERANCE).all(axis=1)
+    return group, full, r
+
+
+def body_features(topology):
+    """
+    由拓扑数组计算一个实体的特征。
+
+    参数:
+        topology: body_topology() 返回的数组字典
+
+    返回:
+        dict: 各类面数、hole_count、hole_diameters_m（孔径列表）、
+            min_internal_radius_m、edge_count、edge_length_m、min_edge_length_m
+    """
+    face_class = topology['face_class']
+    radius = topology['face_radius']
+    concave = topology['face_concave']
+    edges = topology['edge_length']
+
+    counts = np.bincount(face_class, minlength=len(FACE_CLASSES)) if len(face_class) else \
+        np.zeros(len(FACE_CLASSES), dtype=int)
+
+    round_concave = concave & ~np.isnan(radius)
+    in_hole = np.zeros(len(face_class), dtype=bool)
+    diameters = []
+    candidates = np.flatnonzero(round_concave & (face_class == CYLINDRICAL))
+    if len(candidates):
+        group, full, group_radius = find_holes(radius[candidates],
+                                               topology['face_axis'][candidates],
+                                               topology['face_box'][candidates])
+        in_hole[candidates] = full[group]
+        diameters = sorted((2.0 * group_radius[full]).tolist())
+
+    internal = radius[round_concave & ~in_hole]
+    return {
+        'face_count': int(len(face_class)),
+        'planar_faces': int(counts[PLANAR]),
+        'cylindrical_faces': int(counts[CYLINDRICAL]),
+        'conical_faces': int(counts[CONICAL]),
+        'freeform_faces': int(counts[FREEFORM]),
+        'hole_count': len(diameters),
+        'hole_diameters_m': diameters,
+        'min_internal_radius_m': float(internal.min()) if len(internal) else None,
+        'edge_count': int(len(edges)),
+        'edge_length_m': float(edges.sum()),
+        'min_edge_length_m': float(edges.min()) if len(edges) else None,
+    }
+
+
+def hole_sizes(diameters):
+    """
+    孔径列表格式化为 'Ø6.8×2 Ø5×1'（mm，按孔径从大到小）。
+
+    参数:
+        diameters: 孔径列表（m）
+
+    返回:
+        str: 格式化的文本；没有孔时返回 None
+    """
+    if not diameters:
+        return None
+    values, counts = np.unique(np.round(np.asarray(diameters) * 1e3, 2), return_counts=True)
+    return ' '.join(f"Ø{v:g}×{c}" for v, c in zip(values[::-1].tolist(), counts[::-1].tolist()))
+
+
+def part_features(bodies):
+    """
+    汇总实体特征为零件级特征。
+
+    参数:
+        bodies: 实体记录列表；带 features 字段的实体参与汇总
+
+    返回:
+        dict: FEATURE_FIELDS 中除 feature_time_s 外的字段；没有实体特征时各字段为 None
+    """
+    found = [b['features'] for b in bodies if b.get('features')]
+    if not found:
+        return {name: None for name in FEATURE_FIELDS if name != 'feature_time_s'}
+
+    def total(name):
+        return sum(f[name] for f in found)
+
+    def smallest(name):
+        values = [f[name] for f in found if f[name] is not None]
+        return min(values) if values else None
+
+    diameters = [d for f in found for d in f['hole_diameters_m']]
+    return {
+        'face_count': total('face_count'),
+        'planar_faces': total('planar_faces'),
+        'cylindrical_faces': total('cylindrical_faces'),
+        'conical_faces': total('conical_faces'),
+        'freeform_faces': total('freeform_faces'),
+        'hole_count': total('hole_count'),
+        'hole_sizes': hole_sizes(diameters),
+        'min_internal_radius_m': smallest('min_internal_radius_m'),
+        'edge_count': total('edge_count'),
+        'edge_length_m': total('edge_length_m'),
+        'min_edge_length_m': smallest('min_edge_length_m'),
+    }
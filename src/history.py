@@ -0,0 +1,552 @@
+"""
+报价历史库
+
+把每次批量提取的零件、实体和报价写入一个 SQLite 文件，用于查询
+“这个零件号上次测量的结果”、客户的历史零件，以及为耗时估计积累数据。
+
+表结构:
+    runs    每次批处理一行：时间、后端、精度、统计
+    parts   每个零件一行：指纹、零件号、客户、测量值和完整记录（JSON）
+    bodies  每个实体一行
+    quotes  每个零件每个数量阶梯一行
+
+数据库使用 WAL 模式，读不阻塞写。每个线程使用自己的连接；写入在
+BEGIN IMMEDIATE 事务中用 executemany 批量完成，多个工作线程或进程
+同时写入时由 busy_timeout 排队，仍然冲突时重试。
+
+注意：SQLite 依赖文件锁，数据库不要放在网络共享目录上。
+"""
+
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .attrs import quote_fields
+from .container import GEOMETRY_STREAMS, ContainerError, PrtContainer
+
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    finished TEXT,
+    host TEXT,
+    backend TEXT,
+    accuracy REAL,
+    workers INTEGER,
+    parts INTEGER,
+    measured INTEGER,
+    cache_hits INTEGER,
+    errors INTEGER,
+    elapsed_s REAL,
+    note TEXT,
+    summary TEXT
+);
+
+CREATE TABLE IF NOT EXISTS parts (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    fingerprint TEXT,
+    file TEXT,
+    path TEXT,
+    part_number TEXT,
+    revision TEXT,
+    customer TEXT,
+    material TEXT,
+    backend TEXT,
+    accuracy REAL,
+    accuracy_level TEXT,
+    error TEXT,
+    unit TEXT,
+    body_count INTEGER,
+    failed_body_count INTEGER,
+    volume_m3 REAL,
+    area_m2 REAL,
+    length_m REAL,
+    width_m REAL,
+    height_m REAL,
+    mass_kg REAL,
+    measure_time_s REAL,
+    feature_time_s REAL,
+    duplicate_of TEXT,
+    cache_hit INTEGER,
+    file_size INTEGER,
+    geometry_bytes INTEGER,
+    record TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bodies (
+    part_id INTEGER NOT NULL REFERENCES parts(id),
+    body_index INTEGER,
+    status TEXT,
+    material TEXT,
+    volume_m3 REAL,
+    area_m2 REAL
+);
+
+CREATE TABLE IF NOT EXISTS quotes (
+    part_id INTEGER NOT NULL REFERENCES parts(id),
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    quantity INTEGER,
+    unit_price REAL,
+    total REAL,
+    quoted INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS parts_fingerprint ON parts(fingerprint);
+CREATE INDEX IF NOT EXISTS parts_part_number_nocase ON parts(part_number COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS parts_customer_nocase ON parts(customer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS parts_run ON parts(run_id);
+CREATE INDEX IF NOT EXISTS bodies_part ON bodies(part_id);
+CREATE INDEX IF NOT EXISTS quotes_part ON quotes(part_id);
+"""
+
+# parts 表中直接取自记录的列
+PART_COLUMNS = [
+    'fingerprint', 'file', 'path', 'material', 'backend', 'accuracy', 'accuracy_level', 'error',
+    'unit', 'body_count', 'failed_body_count', 'volume_m3', 'area_m2', 'length_m', 'width_m',
+    'height_m', 'mass_kg', 'measure_time_s', 'feature_time_s', 'duplicate_of',
+]
+
+# 写入冲突时的重试次数
+WRITE_RETRIES = 5
+
+_TIER_PRICE = re.compile(r'^unit_price_q(\d+)$')
+
+
+def _json_default(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def file_stats(path):
+    """
+    读取零件文件的大小和几何流大小，用于耗时估计。
+
+    返回:
+        tuple: (文件字节数, 几何流字节数)；无法读取的项为 None
+    """
+    if not path:
+        return None, None
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None, None
+    try:
+        with PrtContainer(path) as container:
+            sizes = container.stream_sizes()
+        return size, sum(sizes.get(name, 0) for name in GEOMETRY_STREAMS)
+    except (OSError, ContainerError):
+        return size, None
+
+
+class HistoryStore:
+    """
+    SQLite 报价历史库。
+
+    用法:
+        history = HistoryStore('quotes.db')
+        run_id = history.record_run(records, runner.summary, backend='nx')
+        history.last_metrics(part_number='PN-1001')
+        history.part_history(fingerprint=fp)
+    """
+
+    def __init__(self, path, timeout=30.0):
+        """
+        打开（必要时创建）历史库。
+
+        参数:
+            path: 数据库文件路径
+            timeout: 等待其他写入者释放锁的时间（秒）
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"历史库版本 {version} 高于当前程序支持的版本 {SCHEMA_VERSION}")
+        with self._write() as db:
+            # 写锁内重新读取版本：另一个进程可能刚完成升级
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    db.execute(statement)
+            if version == 1:
+                _migrate_v1(db)
+            if version in (1, 2):
+                _migrate_v2(db)
+            db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def _connect(self):
+        """当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None：事务由 _write() 显式控制
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _WriteTransaction(self._connect())
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ------------------------------------------------------------------ 写入
+
+    def start_run(self, backend=None, accuracy=None, workers=None, note=None):
+        """
+        登记一次批处理。
+
+        返回:
+            int: run_id
+        """
+        with self._write() as db:
+            cursor = db.execute(
+                "INSERT INTO runs (started, host, backend, accuracy, workers, note) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_now(), socket.gethostname(), backend, accuracy, workers, note))
+            return cursor.lastrowid
+
+    def finish_run(self, run_id, summary=None):
+        """
+        记录批处理的结束时间和统计。
+
+        参数:
+            run_id: start_run() 返回的编号
+            summary: BatchRunner.summary
+        """
+        summary = summary or {}
+        with self._write() as db:
+            db.execute(
+                "UPDATE runs SET finished = ?, parts = ?, measured = ?, cache_hits = ?, "
+                "errors = ?, elapsed_s = ?, summary = ? WHERE id = ?",
+                (_now(), summary.get('parts'), summary.get('measured'), summary.get('cache_hits'),
+                 summary.get('errors'), summary.get('elapsed_s'), _dumps(summary), run_id))
+
+    def add_parts(self, run_id, records, bodies=True, stats=True):
+        """
+        批量写入零件记录，连同实体和报价。
+
+        参数:
+            run_id: 所属批处理
+            records: 零件记录列表
+            bodies: 是否写入实体明细
+            stats: 是否读取文件大小和几何流大小
+
+        返回:
+            list: 各记录的 part_id
+        """
+        part_rows = []
+        for record in records:
+            file_size, geometry_bytes = (file_stats(record.get('path')) if stats
+                                         else (None, None))
+            part_rows.append(
+                [run_id]
+                + [record.get(name) for name in PART_COLUMNS]
+                + list(_quote_keys(record))
+                + [1 if record.get('cache_hit') else 0,
+                   file_size,
+                   geometry_bytes,
+                   _dumps(record)])
+
+        names = (['run_id'] + PART_COLUMNS
+                 + ['part_number', 'revision', 'customer', 'cache_hit', 'file_size',
+                    'geometry_bytes', 'record'])
+        insert = (f"INSERT INTO parts (id, {', '.join(names)}) "
+                  f"VALUES ({', '.join('?' * (len(names) + 1))})")
+
+        with self._write() as db:
+            # 写锁内分配连续的编号，实体和报价直接引用
+            first = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM parts").fetchone()[0]
+            ids = list(range(first, first + len(part_rows)))
+            db.executemany(insert, ([part_id] + row for part_id, row in zip(ids, part_rows)))
+            if bodies:
+                db.executemany(
+                    "INSERT INTO bodies (part_id, body_index, status, material, volume_m3, "
+                    "area_m2) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((part_id, body.get('index'), body.get('measure_status'), body.get('material'),
+                      body.get('volume_m3'), body.get('area_m2'))
+                     for part_id, record in zip(ids, records)
+                     for body in record.get('bodies') or ()))
+            db.executemany(
+                "INSERT INTO quotes (part_id, run_id, quantity, unit_price, total, quoted) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (row for part_id, record in zip(ids, records)
+                 for row in _quote_rows(part_id, run_id, record)))
+        return ids
+
+    def record_run(self, records, summary=None, backend=None, accuracy=None, workers=None,
+                   note=None, bodies=True):
+        """
+        登记一次批处理并写入全部记录。
+
+        参数:
+            records: 零件记录列表
+            summary: BatchRunner.summary
+            backend / accuracy / workers / note: 写入 runs 表；accuracy 为 None
+                时取各记录自己的测量精度，精度不一（如分级精测）时为空
+            bodies: 是否写入实体明细
+
+        返回:
+            int: run_id
+        """
+        if accuracy is None:
+            accuracies = {r.get('accuracy') for r in records if r.get('accuracy') is not None}
+            accuracy = accuracies.pop() if len(accuracies) == 1 else None
+        run_id = self.start_run(backend, accuracy, workers, note)
+        self.add_parts(run_id, records, bodies=bodies)
+        self.finish_run(run_id, summary)
+        return run_id
+
+    # ------------------------------------------------------------------ 查询
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    @staticmethod
+    def _filters(part_number=None, fingerprint=None, customer=None, material=None,
+                 success=False):
+        clauses = []
+        params = []
+        for column, value in (('part_number', part_number), ('fingerprint', fingerprint),
+                              ('customer', customer), ('material', material)):
+            if value is None:
+                continue
+            if column in ('part_number', 'customer'):
+                # 与 *_nocase 索引的排序规则一致，查询才能走索引
+                clauses.append(f"p.{column} = ? COLLATE NOCASE")
+                params.append(_text(value))
+            else:
+                clauses.append(f"p.{column} = ?")
+                params.append(value)
+        if success:
+            clauses.append("p.error IS NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+
+    def last_metrics(self, part_number=None, fingerprint=None, customer=None):
+        """
+        零件最近一次成功测量的结果。
+
+        参数:
+            part_number: 零件号（不区分大小写）
+            fingerprint: 几何指纹
+            customer: 客户（不区分大小写）
+
+        返回:
+            dict: parts 表的一行（不含 record 列）加上 run_started；没有时返回 None
+        """
+        rows = self.part_history(part_number, fingerprint, customer, limit=1, success=True)
+        return rows[0] if rows else None
+
+    def part_history(self, part_number=None, fingerprint=None, customer=None, material=None,
+                     limit=None, success=False):
+        """
+        查询零件的历史测量，按时间从新到旧。
+
+        参数:
+            part_number / fingerprint / customer / material: 过滤条件，走索引
+            limit: 最多返回的行数
+            success: 只返回成功的测量
+
+        返回:
+            list: parts 表的行（不含 record 列），附 run_started
+        """
+        where, params = self._filters(part_number, fingerprint, customer, material, success)
+        columns = ', '.join(f"p.{c}" for c in
+                            ['id', 'run_id', 'part_number', 'revision', 'customer', 'cache_hit',
+                             'file_size', 'geometry_bytes'] + PART_COLUMNS)
+        sql = (f"SELECT {columns}, r.started AS run_started FROM parts p "
+               f"JOIN runs r ON r.id = p.run_id {where} ORDER BY p.id DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def timings(self, backend=None, limit=None):
+        """
+        最近的测量耗时样本，用于拟合耗时模型（见 runtime.py）。
+
+        只取成功、非缓存命中且有耗时的零件。几何重复的零件沿用首个零件
+        的记录，不是独立的样本，也不取；measure_time_s 扣除特征提取和
+        钣金识别的耗时（feature_time_s），只留打开和测量的时间。
+
+        参数:
+            backend: 只取该后端的测量
+            limit: 最多返回的行数（从新到旧）
+
+        返回:
+            list: 含 file_size、geometry_bytes、body_count、measure_time_s 的行
+        """
+        sql = ("SELECT file_size, geometry_bytes, body_count, "
+               "measure_time_s - COALESCE(feature_time_s, 0) AS measure_time_s FROM parts "
+               "WHERE error IS NULL AND NOT cache_hit AND duplicate_of IS NULL "
+               "AND measure_time_s - COALESCE(feature_time_s, 0) > 0")
+        params = []
+        if backend is not None:
+            sql += " AND backend = ?"
+            params.append(backend)
+        sql += " ORDER BY id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def record(self, part_id):
+        """
+        读取零件写入时的完整记录。
+
+        返回:
+            dict: 零件记录；不存在时返回 None
+        """
+        row = self._connect().execute("SELECT record FROM parts WHERE id = ?",
+                                      (part_id,)).fetchone()
+        return json.loads(row['record']) if row and row['record'] else None
+
+    def bodies(self, part_id):
+        """零件的实体明细"""
+        return self._query("SELECT * FROM bodies WHERE part_id = ? ORDER BY body_index",
+                           (part_id,))
+
+    def quotes(self, part_id):
+        """零件的报价（各数量阶梯）"""
+        return self._query("SELECT * FROM quotes WHERE part_id = ? ORDER BY quantity",
+                           (part_id,))
+
+    def runs(self, limit=20):
+        """
+        最近的批处理，按时间从新到旧。
+
+        返回:
+            list: runs 表的行（不含 summary 列）
+        """
+        return self._query(
+            "SELECT id, started, finished, host, backend, accuracy, workers, parts, measured, "
+            "cache_hits, errors, elapsed_s, note FROM runs ORDER BY id DESC LIMIT ?",
+            (int(limit),))
+
+    def counts(self):
+        """各表的行数"""
+        conn = self._connect()
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('runs', 'parts', 'bodies', 'quotes')}
+
+
+def _text(value):
+    """零件号、版本和客户去掉首尾空白，保留原始大小写；查询时按 NOCASE 比较"""
+    return None if value in (None, '') else str(value).strip()
+
+
+def _quote_keys(record):
+    """
+    记录的零件号、版本和客户。
+
+    返回:
+        tuple: (part_number, revision, customer)，优先取记录中的字段，其次取属性
+    """
+    fields = quote_fields(record.get('attributes') or {})
+    return tuple(_text(record.get(name) or fields[name])
+                 for name in ('part_number', 'revision', 'customer'))
+
+
+def _migrate_v1(db):
+    """
+    版本 1 的库把零件号、版本和客户存成了小写：由完整记录恢复原始值，
+    并换成不区分大小写的索引。
+    """
+    db.execute("DROP INDEX IF EXISTS parts_part_number")
+    db.execute("DROP INDEX IF EXISTS parts_customer")
+    rows = db.execute("SELECT id, record FROM parts WHERE record IS NOT NULL").fetchall()
+    updates = [_quote_keys(json.loads(row['record'])) + (row['id'],) for row in rows]
+    db.executemany("UPDATE parts SET part_number = ?, revision = ?, customer = ? WHERE id = ?",
+                   updates)
+
+
+def _migrate_v2(db):
+    """
+    版本 3 增加 feature_time_s 和 duplicate_of 列，供 timings() 排除
+    特征耗时和重复零件：补上两列并由完整记录回填。
+    """
+    for column, kind in (('feature_time_s', 'REAL'), ('duplicate_of', 'TEXT')):
+        db.execute(f"ALTER TABLE parts ADD COLUMN {column} {kind}")
+    rows = db.execute("SELECT id, record FROM parts WHERE record IS NOT NULL").fetchall()
+    updates = []
+    for row in rows:
+        record = json.loads(row['record'])
+        if record.get('feature_time_s') is not None or record.get('duplicate_of'):
+            updates.append((record.get('feature_time_s'), record.get('duplicate_of'), row['id']))
+    db.executemany("UPDATE parts SET feature_time_s = ?, duplicate_of = ? WHERE id = ?", updates)
+
+
+def _quote_rows(part_id, run_id, record):
+    """记录中各数量阶梯和报价数量的价格"""
+    rows = []
+    for key, value in record.items():
+        match = _TIER_PRICE.match(key)
+        if match and value is not None:
+            quantity = int(match.group(1))
+            rows.append((part_id, run_id, quantity, value,
+                         record.get(f'total_q{quantity}'), 0))
+    if record.get('quoted_unit_price') is not None:
+        rows.append((part_id, run_id, record.get('quantity'), record['quoted_unit_price'],
+                     record.get('quoted_total'), 1))
+    return rows
+
+
+class _WriteTransaction:
+    """
+    BEGIN IMMEDIATE 写事务。
+
+    进入时立即取得写锁，避免两个写入者都在读阶段持有共享锁后互相等待；
+    取锁超过 busy_timeout 仍失败时按指数退避重试。
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        delay = 0.05
+        for attempt in range(WRITE_RETRIES):
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                return self.conn
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
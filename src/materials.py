@@ -0,0 +1,227 @@
+"""
+材料库
+
+按零件或实体属性查找材料的密度和单价，并对整批实体做向量化的
+质量与材料成本计算。
+
+材料库 YAML 格式:
+
+    default: steel
+    attributes: [MATERIAL, 材料]
+    materials:
+      steel:
+        density: 7850        # kg/m³
+        price_per_kg: 6.5
+        aliases: [Q235, '45#', S235JR]
+"""
+
+import numpy as np
+
+from .columns import body_columns
+
+# 内置材料表：密度 kg/m³，单价 元/kg
+DEFAULT_MATERIALS = {
+    'steel': {'density': 7850.0, 'price_per_kg': 6.5,
+              'aliases': ['Q235', 'Q345', '45#', '45', 'S235JR', 'C45', '钢', '碳钢']},
+    'stainless': {'density': 7930.0, 'price_per_kg': 22.0,
+                  'aliases': ['SUS304', '304', '316', 'SUS316', '不锈钢']},
+    'aluminum': {'density': 2700.0, 'price_per_kg': 28.0,
+                 'aliases': ['AL6061', '6061', '6061-T6', '7075', 'aluminium', '铝', '铝合金']},
+    'brass': {'density': 8500.0, 'price_per_kg': 55.0, 'aliases': ['H62', 'H59', '黄铜']},
+    'copper': {'density': 8960.0, 'price_per_kg': 75.0, 'aliases': ['T2', 'C1100', '紫铜', '铜']},
+    'titanium': {'density': 4430.0, 'price_per_kg': 180.0, 'aliases': ['TC4', 'Ti6Al4V', '钛合金']},
+    'pom': {'density': 1410.0, 'price_per_kg': 18.0, 'aliases': ['POM', '赛钢']},
+}
+
+DEFAULT_MATERIAL = 'steel'
+
+# 依次查找的材料属性名（不区分大小写）
+DEFAULT_ATTRIBUTES = ('MATERIAL', 'NX_Material', 'Material_Name', '材料')
+
+
+def _normalize(name):
+    return str(name).strip().lower()
+
+
+class MaterialLibrary:
+    """
+    材料库定义。
+
+    用 compile() 生成查找表后再用于批量计算，
+    每次运行只编译一次。
+    """
+
+    def __init__(self, materials=None, default=DEFAULT_MATERIAL, attributes=DEFAULT_ATTRIBUTES):
+        """
+        初始化材料库。
+
+        参数:
+            materials: 材料名到 {density, price_per_kg, aliases} 的字典；None 使用内置表
+            default: 无法识别材料时使用的材料名
+            attributes: 存放材料名的属性名列表
+        """
+        self.materials = dict(DEFAULT_MATERIALS if materials is None else materials)
+        if default not in self.materials:
+            raise ValueError(f"默认材料 {default} 不在材料库中")
+        self.default = default
+        self.attributes = tuple(attributes)
+
+    @classmethod
+    def from_yaml(cls, path):
+        """
+        从 YAML 文件加载材料库。
+
+        参数:
+            path: YAML 文件路径
+
+        返回:
+            MaterialLibrary: 材料库
+        """
+        import yaml
+
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+
+        materials = config.get('materials') or DEFAULT_MATERIALS
+        return cls(materials,
+                   default=config.get('default', DEFAULT_MATERIAL),
+                   attributes=config.get('attributes', DEFAULT_ATTRIBUTES))
+
+    def compile(self):
+        """
+        编译查找表。
+
+        返回:
+            MaterialTable: 编译后的查找表
+        """
+        return MaterialTable(self)
+
+
+class MaterialTable:
+    """
+    编译后的材料查找表。
+
+    材料按下标存放在 densities / prices 数组中，
+    名称和别名到下标的映射只构建一次。
+    """
+
+    def __init__(self, library):
+        self.names = list(library.materials)
+        self.densities = np.array([float(library.materials[n]['density']) for n in self.names])
+        self.prices = np.array([float(library.materials[n].get('price_per_kg', 0.0))
+                                for n in self.names])
+        self.default_code = self.names.index(library.default)
+        self.attributes = [_normalize(a) for a in library.attributes]
+
+        self._codes = {}
+        for code, name in enumerate(self.names):
+            self._codes[_normalize(name)] = code
+            for alias in library.materials[name].get('aliases') or ():
+                self._codes.setdefault(_normalize(alias), code)
+
+    def code(self, name):
+        """
+        查找材料下标。
+
+        参数:
+            name: 材料名或别名
+
+        返回:
+            int: 材料下标；未知材料返回 -1
+        """
+        if not name:
+            return -1
+        return self._codes.get(_normalize(name), -1)
+
+    def codes(self, names):
+        """
+        批量查找材料下标，每个不同的名称只查找一次。
+
+        参数:
+            names: 材料名列表，None 表示未指定
+
+        返回:
+            numpy.ndarray: 材料下标数组；未知或未指定为 -1
+        """
+        lookup = {}
+        return np.array([lookup[n] if n in lookup else lookup.setdefault(n, self.code(n))
+                         for n in names], dtype=np.intp)
+
+    def material_from_attributes(self, attributes):
+        """
+        从属性字典中取材料名。
+
+        参数:
+            attributes: 属性名到值的字典
+
+        返回:
+            str: 材料名，未找到时返回 None
+        """
+        if not attributes:
+            return None
+        lowered = {_normalize(k): v for k, v in attributes.items()}
+        for key in self.attributes:
+            value = lowered.get(key)
+            if value:
+                return value
+        return None
+
+
+def apply_materials(records, table):
+    """
+    为整批零件计算质量和材料成本。
+
+    实体材料优先取实体自身的 material，其次取零件属性中的材料，
+    都没有或无法识别时使用默认材料并在零件记录中写入 material_warning。
+
+    参数:
+        records: 零件记录列表（就地修改）
+        table: MaterialTable 查找表
+
+    返回:
+        list: 同一个记录列表
+    """
+    if not records:
+        return records
+
+    part_names = [table.material_from_attributes(r.get('attributes')) for r in records]
+    part_codes = table.codes(part_names)
+
+    part_index, columns, bodies = body_columns(records, ['volume_m3'])
+    body_codes = table.codes([b.get('material') for b in bodies])
+
+    # 实体未指定材料时继承零件材料，再退回默认材料
+    inherited = part_codes[part_index]
+    body_codes = np.where(body_codes >= 0, body_codes, inherited)
+    unresolved = body_codes < 0
+    body_codes[unresolved] = table.default_code
+
+    volume = np.nan_to_num(columns['volume_m3'])
+    mass = volume * table.densities[body_codes]
+    cost = mass * table.prices[body_codes]
+
+    count = len(records)
+    part_mass = np.bincount(part_index, weights=mass, minlength=count)
+    part_cost = np.bincount(part_index, weights=cost, minlength=count)
+    part_unresolved = np.bincount(part_index, weights=unresolved, minlength=count) > 0
+
+    names = table.names
+    for body, code, m, c in zip(bodies, body_codes.tolist(), mass.tolist(), cost.tolist()):
+        body['material'] = names[code]
+        body['mass_kg'] = m
+        body['material_cost'] = c
+
+    resolved_part = np.where(part_codes >= 0, part_codes, table.default_code).tolist()
+    for i, record in enumerate(records):
+        record['material'] = names[resolved_part[i]]
+        record['mass_kg'] = float(part_mass[i])
+        record['material_cost'] = float(part_cost[i])
+        if part_unresolved[i]:
+            raw = part_names[i]
+            default = names[table.default_code]
+            if raw:
+                record['material_warning'] = f"材料 {raw} 无法识别，按 {default} 计算"
+            else:
+                record['material_warning'] = f"未指定材料，按 {default} 计算"
+
+    return records
@@ -0,0 +1,142 @@
+"""
+派生指标
+
+由已测量的几何（体积、表面积、边界框）计算机加工报价需要的派生列：
+毛坯尺寸、毛坯体积、去除体积、材料利用比（buy-to-fly）和面体比。
+
+派生列对整批零件做数组运算，并记录所用余量的标识 derived_key；
+余量不变的记录不会重复计算，余量改变时也只重算派生列。
+"""
+
+import numpy as np
+
+from .columns import to_columns, write_columns
+
+# 派生计算所需的测量列
+MEASURED_FIELDS = ['volume_m3', 'area_m2', 'length_m', 'width_m', 'height_m']
+
+# 派生列
+DERIVED_FIELDS = [
+    'stock_length_m',
+    'stock_width_m',
+    'stock_height_m',
+    'stock_volume_m3',
+    'removed_volume_m3',
+    'buy_to_fly',
+    'surface_to_volume',
+]
+
+
+class StockAllowance:
+    """
+    毛坯余量设置。
+
+    用法:
+        allowance = StockAllowance(side_mm=3.0, top_mm=5.0, round_mm=5.0)
+    """
+
+    def __init__(self, side_mm=3.0, top_mm=None, round_mm=1.0):
+        """
+        初始化余量。
+
+        参数:
+            side_mm: 长、宽方向每侧余量 (mm)
+            top_mm: 高度方向每侧余量 (mm)；None 表示与 side_mm 相同
+            round_mm: 毛坯尺寸向上取整的步长 (mm)；0 表示不取整
+        """
+        self.side_mm = float(side_mm)
+        self.top_mm = self.side_mm if top_mm is None else float(top_mm)
+        self.round_mm = float(round_mm)
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        从配置字典创建余量。
+
+        参数:
+            config: 包含 side_mm / top_mm / round_mm 的字典，可为 None
+
+        返回:
+            StockAllowance: 余量设置
+        """
+        return cls(**(config or {}))
+
+    def key(self):
+        """
+        余量标识，写入记录的 derived_key。
+
+        返回:
+            str: 标识字符串
+        """
+        return f"side={self.side_mm:g},top={self.top_mm:g},round={self.round_mm:g}"
+
+
+def _stock_size(size, allowance_mm, round_mm):
+    stock = size + 2.0 * allowance_mm / 1000.0
+    if round_mm > 0:
+        step = round_mm / 1000.0
+        # 减去微小量，避免浮点误差把恰好整数倍的尺寸再进一档
+        stock = np.ceil(stock / step - 1e-9) * step
+    return stock
+
+
+def derive_columns(columns, allowance):
+    """
+    计算派生列。
+
+    参数:
+        columns: 至少包含 MEASURED_FIELDS 的列数组字典
+        allowance: StockAllowance
+
+    返回:
+        dict: DERIVED_FIELDS 到数组的字典；缺少几何的零件为 NaN
+    """
+    volume = columns['volume_m3']
+    area = columns['area_m2']
+
+    stock_length = _stock_size(columns['length_m'], allowance.side_mm, allowance.round_mm)
+    stock_width = _stock_size(columns['width_m'], allowance.side_mm, allowance.round_mm)
+    stock_height = _stock_size(columns['height_m'], allowance.top_mm, allowance.round_mm)
+    stock_volume = stock_length * stock_width * stock_height
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        positive = volume > 0
+        buy_to_fly = np.where(positive, stock_volume / volume, np.nan)
+        surface_to_volume = np.where(positive, area / volume, np.nan)
+
+    return {
+        'stock_length_m': stock_length,
+        'stock_width_m': stock_width,
+        'stock_height_m': stock_height,
+        'stock_volume_m3': stock_volume,
+        'removed_volume_m3': np.maximum(stock_volume - volume, 0.0),
+        'buy_to_fly': buy_to_fly,
+        'surface_to_volume': surface_to_volume,
+    }
+
+
+def apply_derived(records, allowance, force=False):
+    """
+    为记录计算派生列。
+
+    derived_key 与当前余量一致的记录会被跳过。
+
+    参数:
+        records: 零件记录列表（就地修改）
+        allowance: StockAllowance
+        force: 为 True 时全部重算
+
+    返回:
+        list: 本次重新计算了派生列的记录
+    """
+    key = allowance.key()
+    stale = [r for r in records if force or r.get('derived_key') != key]
+    if not stale:
+        return []
+
+    derived = derive_columns(to_columns(stale, MEASURED_FIELDS), allowance)
+    write_columns(stale, derived)
+    for record in stale:
+        record['derived_key'] = key
+    return stale
+
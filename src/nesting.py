@@ -0,0 +1,323 @@
+"""
+二维排样
+
+把整批钣金坯料（展开尺寸的矩形）排到标准板材上，给出要订购的板数
+和材料利用率。sheetmetal.nesting_summary() 的网格估算不混排，这里
+按 MaxRects 算法真正摆放每一件：
+
+    每张板维护一组互相可重叠的最大空闲矩形（free list）；
+    坯料按面积从大到小依次放入，在所有空闲矩形的两种朝向中取短边
+    余量最小的位置（Best Short Side Fit），放下后切分与之相交的空闲
+    矩形，并去掉被其他空闲矩形包含的新矩形。
+
+空闲矩形保存在 NumPy 数组中，打分、求交和包含判断都是整列运算；
+所有板的空闲矩形另有一张按板号索引的总表，一次比较就能找到能放下
+坯料的第一张板，不必逐张尝试。同一 (材料, 板厚) 的坯料在每种板材
+规格上各排一次，取消耗板材面积最小的规格，几千件坯料在数秒内完成。
+
+坯料目前是矩形；以后有轮廓时仍以外接矩形参与排样。
+"""
+
+import numpy as np
+
+from .sheetmetal import NEST_GAP, SHEET_MARGIN, STANDARD_SHEETS, THICKNESS_TOLERANCE, \
+    _blanks, sheet_label
+
+# 比较长度时的容差（m）
+EPS = 1e-9
+
+
+class MaxRectsSheet:
+    """
+    一张板材上的 MaxRects 排样。
+
+    坐标以板材可用区域的左下角为原点；放入的尺寸已包含零件间距。
+
+    用法:
+        sheet = MaxRectsSheet(2.98, 1.48)
+        fit = sheet.find(0.4, 0.2)
+        if fit is not None:
+            sheet.place(item, *fit)
+    """
+
+    def __init__(self, width, height):
+        """
+        参数:
+            width / height: 可用区域的宽和高
+        """
+        self.width = width
+        self.height = height
+        # 空闲矩形 (x, y, w, h)
+        self.free = np.array([[0.0, 0.0, width, height]])
+        self.used = 0.0
+        self.placements = []
+
+    def find(self, w, h, rotate=True):
+        """
+        查找放置位置（Best Short Side Fit）。
+
+        参数:
+            w / h: 坯料尺寸
+            rotate: 是否允许旋转 90°
+
+        返回:
+            tuple: (空闲矩形下标, 放置宽, 放置高, 是否旋转)；放不下时返回 None
+        """
+        fw = self.free[:, 2]
+        fh = self.free[:, 3]
+        turns = (False, True) if rotate and w != h else (False,)
+        # 各朝向的放置尺寸排成一列，空闲矩形与之两两比较
+        pw = np.array([h if t else w for t in turns])[:, None]
+        ph = np.array([w if t else h for t in turns])[:, None]
+        dx = fw[None, :] - pw
+        dy = fh[None, :] - ph
+        fits = (dx >= -EPS) & (dy >= -EPS)
+        if not fits.any():
+            return None
+        short = np.where(fits, np.minimum(dx, dy), np.inf).ravel()
+        long_ = np.where(fits, np.maximum(dx, dy), np.inf).ravel()
+        k = int(np.lexsort((long_, short))[0])
+        turn, index = divmod(k, len(fw))
+        return index, float(pw[turn, 0]), float(ph[turn, 0]), turns[turn]
+
+    def place(self, item, index, w, h, rotated):
+        """
+        放入坯料并更新空闲矩形。
+
+        参数:
+            item: 坯料标识，原样记入 placements
+            index / w / h / rotated: find() 的返回值
+        """
+        x, y = self.free[index, 0], self.free[index, 1]
+        self.placements.append((item, float(x), float(y), float(w), float(h), rotated))
+        self.used += w * h
+
+        free = self.free
+        fx, fy, fw, fh = free[:, 0], free[:, 1], free[:, 2], free[:, 3]
+        hit = ((fx < x + w - EPS) & (fx + fw > x + EPS)
+               & (fy < y + h - EPS) & (fy + fh > y + EPS))
+        keep = free[~hit]
+        cut = free[hit]
+        cx, cy, cw, ch = cut[:, 0], cut[:, 1], cut[:, 2], cut[:, 3]
+        # 每个相交的空闲矩形最多切出左、右、下、上四块
+        pieces = np.concatenate([
+            np.column_stack([cx, cy, x - cx, ch]),
+            np.column_stack([np.full_like(cx, x + w), cy, cx + cw - (x + w), ch]),
+            np.column_stack([cx, cy, cw, y - cy]),
+            np.column_stack([cx, np.full_like(cy, y + h), cw, cy + ch - (y + h)]),
+        ])
+        pieces = pieces[(pieces[:, 2] > EPS) & (pieces[:, 3] > EPS)]
+        pieces = pieces[~self._contained(pieces, keep)]
+        self.free = np.concatenate([keep, pieces]) if len(pieces) else keep
+
+    @staticmethod
+    def _contained(pieces, keep):
+        """
+        新切出的矩形中被其他矩形包含的（相同的矩形只保留第一个）。
+
+        原有的空闲矩形不会被新矩形包含：新矩形都位于某个被切分的
+        旧矩形之内，而旧矩形之间已经去掉了包含关系。
+        """
+        if not len(pieces):
+            return np.zeros(0, dtype=bool)
+        px0, py0 = pieces[:, 0], pieces[:, 1]
+        px1, py1 = px0 + pieces[:, 2], py0 + pieces[:, 3]
+
+        def inside(other):
+            ox0, oy0 = other[:, 0], other[:, 1]
+            ox1, oy1 = ox0 + other[:, 2], oy0 + other[:, 3]
+            return ((px0[:, None] >= ox0[None, :] - EPS) & (py0[:, None] >= oy0[None, :] - EPS)
+                    & (px1[:, None] <= ox1[None, :] + EPS) & (py1[:, None] <= oy1[None, :] + EPS))
+
+        contained = inside(keep).any(axis=1) if len(keep) else np.zeros(len(pieces), dtype=bool)
+        among = inside(pieces)
+        np.fill_diagonal(among, False)
+        # 互相包含即相同的矩形：只有下标较大的算被包含
+        mutual = among & among.T
+        among &= ~(mutual & np.tri(len(pieces), k=-1, dtype=bool).T)
+        return contained | among.any(axis=1)
+
+
+def pack(width, height, sheet_width, sheet_height, gap=NEST_GAP, margin=SHEET_MARGIN,
+         rotate=True, items=None):
+    """
+    把一组矩形坯料排到同一规格的板材上，需要时开新板。
+
+    坯料按面积从大到小放入，每件放进能放下的第一张板（First Fit），
+    都放不下时开新板。所有板的空闲矩形另存一张总表（每行带板号），
+    一次整列比较就能找出能放下的第一张板，不必逐张尝试。
+
+    参数:
+        width / height: 坯料尺寸数组（m）
+        sheet_width / sheet_height: 板材尺寸（m）
+        gap: 零件间距（m）
+        margin: 板边留量（m）
+        rotate: 是否允许旋转 90°
+        items: 可选，各坯料的标识；默认为下标
+
+    返回:
+        tuple: (MaxRectsSheet 列表, 放不下任何空板的坯料标识列表)
+    """
+    width = np.asarray(width, dtype=float)
+    height = np.asarray(height, dtype=float)
+    if items is None:
+        items = list(range(len(width)))
+    # 每件四周各留半个间距，可用区域相应扩大一个间距
+    room_w = sheet_width - 2.0 * margin + gap
+    room_h = sheet_height - 2.0 * margin + gap
+    w = width + gap
+    h = height + gap
+    order = np.lexsort((-np.maximum(w, h), -(w * h)))
+
+    sheets = []
+    unplaced = []
+    # 空闲矩形总表：宽、高和所属的板号
+    free_w = np.zeros(0)
+    free_h = np.zeros(0)
+    owner = np.zeros(0, dtype=np.intp)
+    for i in order.tolist():
+        a, b = w[i], h[i]
+        fits = (free_w >= a - EPS) & (free_h >= b - EPS)
+        if rotate:
+            fits |= (free_w >= b - EPS) & (free_h >= a - EPS)
+        candidates = owner[fits]
+        fit = None
+        if len(candidates):
+            number = int(candidates.min())
+            sheet = sheets[number]
+            fit = sheet.find(a, b, rotate)
+        if fit is None:
+            sheet = MaxRectsSheet(room_w, room_h)
+            fit = sheet.find(a, b, rotate)
+            if fit is None:
+                # 比空板还大
+                unplaced.append(items[i])
+                continue
+            number = len(sheets)
+            sheets.append(sheet)
+        sheet.place(items[i], *fit)
+
+        stay = owner != number
+        free_w = np.concatenate([free_w[stay], sheet.free[:, 2]])
+        free_h = np.concatenate([free_h[stay], sheet.free[:, 3]])
+        owner = np.concatenate([owner[stay], np.full(len(sheet.free), number, dtype=np.intp)])
+    return sheets, unplaced
+
+
+def nest_group(width, height, area, sheets=STANDARD_SHEETS, gap=NEST_GAP, margin=SHEET_MARGIN,
+               rotate=True, items=None):
+    """
+    为一组坯料选择板材规格并排样。
+
+    在每种规格上各排一次，优先放得下最多坯料的规格，其次取消耗板材
+    面积最小的，再次取最后一张板用得更满的。
+
+    参数:
+        width / height: 坯料展开尺寸数组（m）
+        area: 坯料展开面积数组（m²），用于利用率
+        sheets: 板材规格 (长, 宽) 列表（m）
+        gap / margin / rotate / items: 同 pack()
+
+    返回:
+        dict: sheet_size、sheet_index、sheets（板数）、unplaced（放不下的坯料标识列表）、
+            flat_area_m2（已排坯料的展开面积）、sheet_area_m2（板材面积合计）、
+            utilization（两者之比）、last_sheet_usage（最后一张板的占用比例）、
+            layouts（每张板的 (标识, x, y, 宽, 高, 是否旋转) 列表，坐标含板边留量）
+    """
+    area = np.asarray(area, dtype=float)
+    if items is None:
+        items = list(range(len(area)))
+    position = {item: k for k, item in enumerate(items)}
+    best = None
+    for index, (length, breadth) in enumerate(sheets):
+        packed, unplaced = pack(width, height, length, breadth, gap, margin, rotate, items)
+        sheet_area = length * breadth
+        last = packed[-1].used / (packed[-1].width * packed[-1].height) if packed else 0.0
+        key = (len(unplaced), len(packed) * sheet_area, -last)
+        if best is None or key < best[0]:
+            best = (key, index, unplaced, packed, last)
+    _key, index, unplaced, packed, last = best
+
+    length, breadth = sheets[index]
+    placed_area = float(area.sum() - sum(area[position[item]] for item in unplaced))
+    total = len(packed) * length * breadth
+    layouts = [[(item, x + margin, y + margin, w - gap, h - gap, turned)
+                for item, x, y, w, h, turned in sheet.placements] for sheet in packed]
+    return {
+        'sheet_size': sheet_label((length, breadth)),
+        'sheet_index': index,
+        'sheets': len(packed),
+        'unplaced': list(unplaced),
+        'flat_area_m2': placed_area,
+        'sheet_area_m2': total,
+        'utilization': placed_area / total if total else None,
+        'last_sheet_usage': float(last),
+        'layouts': layouts,
+    }
+
+
+def nest_records(records, sheets=STANDARD_SHEETS, gap=NEST_GAP, margin=SHEET_MARGIN,
+                 rotate=True):
+    """
+    对整批零件的钣金坯料按 (材料, 板厚) 分组排样。
+
+    零件数量取记录的 quantity（缺省为 1），每件坯料按数量重复；
+    需要先以 BatchRunner(sheet_metal=True) 提取展开指标。
+
+    参数:
+        records: 零件记录列表
+        sheets / gap / margin / rotate: 同 nest_group()
+
+    返回:
+        list: 每组一个字典，含 material、thickness_m、parts（坯料件数）、
+            unplaced（放不下的件数），以及 nest_group() 返回的其余字段；
+            layouts 中的坯料标识为 (记录下标, 件号)
+    """
+    owner, length, width, area, thickness = _blanks(records)
+    if not len(owner):
+        return []
+    positions = owner.tolist()
+    quantity = np.array([max(int(records[i].get('quantity') or 1), 1) for i in positions])
+    steps = np.round(thickness / THICKNESS_TOLERANCE).astype(np.int64).tolist()
+    groups = {}
+    for k, key in enumerate(zip((records[i].get('material') for i in positions), steps)):
+        groups.setdefault(key, []).append(k)
+
+    rows = []
+    for key in sorted(groups, key=lambda g: (str(g[0]), g[1])):
+        material, step = key
+        blanks = np.array(groups[key], dtype=np.intp)
+        copies = np.repeat(blanks, quantity[blanks])
+        items = []
+        seen = {}
+        for k in copies.tolist():
+            seen[k] = seen.get(k, 0) + 1
+            items.append((positions[k], seen[k]))
+        result = nest_group(length[copies], width[copies], area[copies], sheets, gap, margin,
+                            rotate, items)
+        del result['sheet_index']
+        result.update({
+            'material': material,
+            'thickness_m': round(step * THICKNESS_TOLERANCE, 6),
+            'parts': len(items),
+            'unplaced': len(result['unplaced']),
+        })
+        rows.append(result)
+    return rows
+
+
+def nesting_totals(groups):
+    """
+    排样结果的合计。
+
+    返回:
+        dict: groups、sheets、parts、unplaced、utilization
+    """
+    sheet_area = sum(g['sheet_area_m2'] for g in groups)
+    return {
+        'groups': len(groups),
+        'sheets': sum(g['sheets'] for g in groups),
+        'parts': sum(g['parts'] for g in groups),
+        'unplaced': sum(g['unplaced'] for g in groups),
+        'utilization': sum(g['flat_area_m2'] for g in groups) / sheet_area if sheet_area else None,
+    }
@@ -0,0 +1,265 @@
+"""
+预览图提取
+
+NX 保存零件时会把当前视图渲染成 JPEG 存入容器的 /Root/images/preview
+流。这里直接从内存映射的容器中取出这张图，不需要启动 NX 渲染。
+
+缩略图按预览图内容的哈希缓存：安装了 Pillow 时缩小并重新编码为
+JPEG，否则保留原图，只按最大尺寸计算显示大小。
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+
+try:
+    from PIL import Image as PILImage
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from .container import ContainerError, PrtContainer
+
+PREVIEW_STREAM = '/Root/images/preview'
+
+# 缩略图默认的最大显示尺寸（像素）
+THUMBNAIL_SIZE = (160, 120)
+
+_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'bmp': 'bmp'}
+
+# JPEG 中携带图像尺寸的 SOF 标记（排除 DHT/JPG/DAC）
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def image_type(data):
+    """
+    按文件头判断图像格式。
+
+    返回:
+        str: 'jpeg'、'png'、'bmp'，无法识别时返回 None
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:2] == b'BM':
+        return 'bmp'
+    return None
+
+
+def image_size(data):
+    """
+    从文件头读取图像尺寸，不解码像素。
+
+    参数:
+        data: 图像字节
+
+    返回:
+        tuple: (宽, 高)，无法识别时返回 None
+    """
+    kind = image_type(data)
+    if kind == 'png' and len(data) >= 24:
+        return struct.unpack('>II', bytes(data[16:24]))
+    if kind == 'bmp' and len(data) >= 26:
+        width, height = struct.unpack('<ii', bytes(data[18:26]))
+        return width, abs(height)
+    if kind != 'jpeg':
+        return None
+
+    pos = 2
+    end = len(data)
+    while pos + 4 <= end:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', bytes(data[pos + 2:pos + 4]))[0]
+        if marker in _SOF_MARKERS and pos + 9 <= end:
+            height, width = struct.unpack('>HH', bytes(data[pos + 5:pos + 9]))
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def fit_size(size, max_size):
+    """
+    按比例缩放到不超过最大尺寸（不放大）。
+
+    返回:
+        tuple: (宽, 高)
+    """
+    width, height = size
+    scale = min(1.0, max_size[0] / float(width), max_size[1] / float(height))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def read_preview(path):
+    """
+    读取零件的预览图。
+
+    参数:
+        path: .prt 文件路径
+
+    返回:
+        bytes: 图像数据；文件不可读、不是容器或没有预览图时返回 None
+    """
+    try:
+        with PrtContainer(path) as container:
+            if PREVIEW_STREAM not in container:
+                return None
+            return container.read(PREVIEW_STREAM)
+    except (OSError, ContainerError):
+        return None
+
+
+class PreviewExtractor:
+    """
+    预览缩略图提取器。
+
+    用法:
+        previews = PreviewExtractor('.nxquote-cache/previews')
+        thumb = previews.thumbnail('tests/m.prt')
+        thumb['width'], thumb['height'], previews.data(thumb)
+    """
+
+    def __init__(self, cache_dir=None, max_size=THUMBNAIL_SIZE, quality=85):
+        """
+        初始化提取器。
+
+        参数:
+            cache_dir: 缩略图缓存目录；None 表示只缓存在内存中
+            max_size: 缩略图最大尺寸 (宽, 高)，像素
+            quality: Pillow 重新编码 JPEG 的质量
+        """
+        self.cache_dir = cache_dir
+        self.max_size = tuple(max_size)
+        self.quality = quality
+        self._memory = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, preview):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(preview)
+        h.update(f"{self.max_size[0]}x{self.max_size[1]}q{self.quality}".encode('ascii'))
+        h.update(b'pil' if PIL_AVAILABLE else b'raw')
+        return h.hexdigest()
+
+    def _cache_path(self, key, kind):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{_EXTENSIONS[kind]}")
+
+    def _shrink(self, preview, kind):
+        """
+        生成缩略图数据。
+
+        返回:
+            tuple: (数据, 格式)
+        """
+        if not PIL_AVAILABLE:
+            return preview, kind
+
+        from io import BytesIO
+
+        with PILImage.open(BytesIO(preview)) as img:
+            img = img.convert('RGB')
+            img.thumbnail(self.max_size)
+            out = BytesIO()
+            img.save(out, format='JPEG', quality=self.quality)
+        return out.getvalue(), 'jpeg'
+
+    def thumbnail(self, path):
+        """
+        提取零件的缩略图。
+
+        参数:
+            path: .prt 文件路径
+
+        返回:
+            dict: format、width、height（显示尺寸）、file（缓存文件，
+                无缓存目录时为 None）和 data（无缓存目录时的图像数据）；
+                没有可用或无法解码的预览图时返回 None
+        """
+        preview = read_preview(path)
+        if not preview:
+            return None
+        kind = image_type(preview)
+        if kind is None:
+            return None
+
+        key = self._key(preview)
+        thumb = self._memory.get(key)
+        if thumb is not None:
+            return thumb
+
+        cached = None
+        if self.cache_dir:
+            for candidate_kind in ('jpeg', kind):
+                candidate = self._cache_path(key, candidate_kind)
+                if os.path.exists(candidate):
+                    cached = (candidate, candidate_kind)
+                    break
+
+        if cached is not None:
+            with open(cached[0], 'rb') as f:
+                data = f.read()
+            kind = cached[1]
+            file_path = cached[0]
+        else:
+            try:
+                data, kind = self._shrink(preview, kind)
+            except (OSError, ValueError):
+                # 文件头正常但数据截断或损坏：跳过该零件的预览图，不中断报表
+                return None
+            file_path = self._store(key, kind, data) if self.cache_dir else None
+
+        size = image_size(data)
+        if size is None:
+            return None
+        width, height = fit_size(size, self.max_size)
+        thumb = {
+            'format': kind,
+            'width': width,
+            'height': height,
+            'file': file_path,
+            'data': None if file_path else data,
+        }
+        self._memory[key] = thumb
+        return thumb
+
+    def _store(self, key, kind, data):
+        """原子写入缓存文件"""
+        path = self._cache_path(key, kind)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    @staticmethod
+    def data(thumb):
+        """
+        读取缩略图数据。
+
+        参数:
+            thumb: thumbnail() 的返回值
+
+        返回:
+            bytes: 图像数据
+        """
+        if thumb['data'] is not None:
+            return thumb['data']
+        with open(thumb['file'], 'rb') as f:
+            return f.read()
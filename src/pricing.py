@@ -0,0 +1,230 @@
+"""
+报价计算
+
+在提取结果之上按费率表计算报价：毛坯材料费、按去除体积和表面积
+估算的加工工时、准备费分摊和数量阶梯折扣。毛坯尺寸和去除体积取自
+派生列（见 metrics.py），记录中没有时按引擎的余量现算。
+
+所有计算都是对整批零件的 NumPy 数组表达式。记录只在 prepare()
+时转换一次为列数组，之后更换费率表重新计价不再接触记录。
+
+费率表 YAML 格式见 config/rates.yaml。
+"""
+
+import numpy as np
+
+from .columns import to_columns, write_columns
+from .materials import MaterialLibrary
+from .metrics import DERIVED_FIELDS, MEASURED_FIELDS, StockAllowance, derive_columns
+
+# 默认费率表
+DEFAULT_RATES = {
+    # 毛坯材料相对材料单价的加价系数（锯切损耗、运费等）
+    'stock_markup': 1.1,
+    # 粗加工材料去除率 (cm³/min)
+    'removal_rate_cm3_min': 20.0,
+    # 精加工表面处理速率 (cm²/min)
+    'finish_rate_cm2_min': 50.0,
+    # 每个零件的装夹/换刀时间 (min)
+    'handling_min': 5.0,
+    # 机床费率 (元/h)
+    'machine_rate_per_h': 120.0,
+    # 每批次的编程和调机时间 (h)，按数量分摊
+    'setup_h': 1.0,
+    # 利润率
+    'margin': 0.2,
+    # 数量阶梯及加工费折扣
+    'quantity_breaks': {1: 0.0, 10: 0.05, 50: 0.10, 100: 0.15, 500: 0.20},
+}
+
+
+class RateCard:
+    """
+    报价费率表。
+
+    用法:
+        card = RateCard.from_yaml('config/rates.yaml')
+        card = RateCard(machine_rate_per_h=150)
+    """
+
+    def __init__(self, **rates):
+        """
+        初始化费率表。
+
+        参数:
+            **rates: 覆盖 DEFAULT_RATES 中的项
+        """
+        unknown = set(rates) - set(DEFAULT_RATES)
+        if unknown:
+            raise ValueError(f"未知的费率项: {', '.join(sorted(unknown))}")
+
+        merged = dict(DEFAULT_RATES, **rates)
+        for key, value in merged.items():
+            if key != 'quantity_breaks':
+                setattr(self, key, float(value))
+
+        breaks = sorted((int(q), float(d)) for q, d in merged['quantity_breaks'].items())
+        if not breaks or breaks[0][0] != 1:
+            breaks.insert(0, (1, 0.0))
+        self.quantities = np.array([q for q, _ in breaks], dtype=float)
+        self.discounts = np.array([d for _, d in breaks], dtype=float)
+
+    @classmethod
+    def from_yaml(cls, path):
+        """
+        从 YAML 文件加载费率表。
+
+        参数:
+            path: YAML 文件路径
+
+        返回:
+            RateCard: 费率表
+        """
+        import yaml
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(**(yaml.safe_load(f) or {}))
+
+    def discount_for(self, quantity):
+        """
+        查找数量对应的折扣。
+
+        参数:
+            quantity: 数量数组
+
+        返回:
+            numpy.ndarray: 折扣数组
+        """
+        idx = np.searchsorted(self.quantities, quantity, side='right') - 1
+        return self.discounts[np.clip(idx, 0, None)]
+
+
+class QuoteEngine:
+    """
+    批量报价引擎。
+
+    用法:
+        engine = QuoteEngine(RateCard())
+        columns = engine.prepare(records)
+        prices = engine.price_columns(columns)
+        engine.price(records)   # 计算并写回记录
+    """
+
+    def __init__(self, rate_card=None, materials=None, allowance=None):
+        """
+        初始化报价引擎。
+
+        参数:
+            rate_card: RateCard；None 使用默认费率
+            materials: MaterialLibrary；None 使用内置材料表
+            allowance: 记录缺少派生列时使用的 StockAllowance
+        """
+        self.rate_card = rate_card or RateCard()
+        self.materials = (materials or MaterialLibrary()).compile()
+        self.allowance = allowance or StockAllowance()
+
+    def prepare(self, records):
+        """
+        把记录转换为计价所需的列数组。
+
+        参数:
+            records: 零件记录列表
+
+        返回:
+            dict: 列名到数组的字典
+        """
+        columns = to_columns(records, MEASURED_FIELDS + DERIVED_FIELDS + ['quantity'])
+
+        missing = np.isnan(columns['stock_volume_m3'])
+        if missing.any():
+            derived = derive_columns(columns, self.allowance)
+            for name in DERIVED_FIELDS:
+                columns[name] = np.where(missing, derived[name], columns[name])
+
+        codes = self.materials.codes([r.get('material') for r in records])
+        codes[codes < 0] = self.materials.default_code
+        columns['density'] = self.materials.densities[codes]
+        columns['price_per_kg'] = self.materials.prices[codes]
+        return columns
+
+    def price_columns(self, columns, rate_card=None):
+        """
+        对列数组计价。
+
+        参数:
+            columns: prepare() 返回的列数组
+            rate_card: 可选，临时使用的费率表
+
+        返回:
+            dict: 输出列名到数组的字典；unit_price / total 为
+                (零件数, 数量阶梯数) 的二维数组
+        """
+        card = rate_card or self.rate_card
+        area = np.nan_to_num(columns['area_m2'])
+        stock_volume = np.nan_to_num(columns['stock_volume_m3'])
+        removed_volume = np.nan_to_num(columns['removed_volume_m3'])
+
+        stock_mass = stock_volume * columns['density']
+        stock_cost = stock_mass * columns['price_per_kg'] * card.stock_markup
+
+        # m³ -> cm³ 为 1e6，m² -> cm² 为 1e4
+        machining_min = (removed_volume * 1e6 / card.removal_rate_cm3_min
+                         + area * 1e4 / card.finish_rate_cm2_min
+                         + card.handling_min)
+        machining_h = machining_min / 60.0
+        machining_cost = machining_h * card.machine_rate_per_h
+        setup_cost = card.setup_h * card.machine_rate_per_h
+
+        # 数量阶梯：加工费打折，准备费按数量分摊
+        q = card.quantities
+        run_cost = machining_cost[:, None] * (1.0 - card.discounts)[None, :]
+        unit_price = (stock_cost[:, None] + run_cost + setup_cost / q[None, :]) * (1.0 + card.margin)
+
+        result = {
+            'stock_mass_kg': stock_mass,
+            'stock_cost': stock_cost,
+            'machining_time_h': machining_h,
+            'machining_cost': machining_cost,
+            'unit_price': unit_price,
+            'total': unit_price * q[None, :],
+        }
+
+        quantity = columns.get('quantity')
+        if quantity is not None and not np.isnan(quantity).all():
+            qty = np.where(np.isnan(quantity), 1.0, np.maximum(quantity, 1.0))
+            price = (stock_cost + machining_cost * (1.0 - card.discount_for(qty))
+                     + setup_cost / qty) * (1.0 + card.margin)
+            result['quoted_unit_price'] = price
+            result['quoted_total'] = price * qty
+
+        return result
+
+    def price(self, records, rate_card=None):
+        """
+        计价并把结果写回记录。
+
+        每个数量阶梯 q 写入 unit_price_q{q} 和 total_q{q} 两列。
+
+        参数:
+            records: 零件记录列表（就地修改）
+            rate_card: 可选，临时使用的费率表
+
+        返回:
+            list: 同一个记录列表
+        """
+        if not records:
+            return records
+
+        card = rate_card or self.rate_card
+        prices = self.price_columns(self.prepare(records), card)
+
+        flat = {}
+        for name, values in prices.items():
+            if values.ndim == 1:
+                flat[name] = values
+                continue
+            for j, q in enumerate(card.quantities.astype(int).tolist()):
+                flat[f'{name}_q{q}'] = values[:, j]
+
+        write_columns(records, flat)
+        return records
@@ -0,0 +1,388 @@
+"""
+批处理进度与吞吐量
+
+几千个零件的批次要跑几个小时，只在结束时输出汇总看不出进度。
+ProgressTracker 汇总工作者的事件，定时交给输出端：
+
+    TerminalProgress   终端进度条（写 stderr，原地刷新）
+    StatusFile         定时重写的 JSON 状态文件，可由其他程序轮询
+    StatusServer       可选的本地 HTTP 状态端点，GET /status 返回同样的 JSON
+
+热路径不加锁：每个工作者只写自己的计数字典（与 resources.worker_usage
+相同的做法），后台线程按间隔读取各字典求和。读到的是略旧的数值，
+对进度显示没有影响。
+
+状态包括已完成零件数、零件/秒、实体/秒、各阶段平均耗时（测量、
+特征提取）、失败数和预计剩余时间。剩余时间优先按调度器的预计耗时
+（见 scheduler.CostModel、runtime.py）折算：已完成部分的实际耗时与
+预计耗时之比乘以剩余的预计耗时；没有预计耗时时按零件数折算。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认刷新间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# 终端进度条宽度（字符）
+BAR_WIDTH = 24
+
+# 状态端点默认只监听本机
+STATUS_HOST = '127.0.0.1'
+
+
+def worker_progress(index):
+    """新工作者的进度计数"""
+    return {
+        'worker': index,
+        'parts': 0,
+        'bodies': 0,
+        'failures': 0,
+        'measure_s': 0.0,
+        'feature_s': 0.0,
+        'featured': 0,
+        'predicted_s': 0.0,
+    }
+
+
+def _clock(seconds):
+    """把秒数格式化为 '1:02:05' 或 '2:05'"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """
+    汇总工作者事件并定时输出批处理进度。
+
+    用法:
+        tracker = ProgressTracker([TerminalProgress(), StatusFile('status.json')])
+        runner = BatchRunner(backend='fake', progress=tracker)
+        records = runner.run(paths)
+        tracker.close()
+    """
+
+    def __init__(self, reporters=(), interval=PROGRESS_INTERVAL):
+        """
+        参数:
+            reporters: 输出端列表，各自实现 update(status) 和 close()
+            interval: 刷新间隔（秒）
+        """
+        self.reporters = list(reporters)
+        self.interval = interval
+        self.total = 0
+        self.skipped = 0
+        self.to_measure = 0
+        self.workers = 1
+        self.predicted_s = 0.0
+        self.state = 'idle'
+        self._costs = {}
+        self._slots = []
+        self._started = None
+        self._started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def begin(self, total, skipped=0, workers=1):
+        """
+        开始一批零件，清零计数并启动刷新线程。
+
+        参数:
+            total: 本批零件数
+            skipped: 不需要测量的零件数（缓存命中和重复）
+            workers: 工作线程数
+        """
+        self.finish(report=False)
+        self.total = total
+        self.skipped = skipped
+        self.to_measure = total - skipped
+        self.workers = workers
+        self.predicted_s = 0.0
+        self.state = 'running'
+        self._costs = {}
+        self._slots = []
+        self._started = time.perf_counter()
+        self._started_at = datetime.now().isoformat(timespec='seconds')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='progress', daemon=True)
+        self._thread.start()
+
+    def expect(self, paths, costs):
+        """
+        记录需要测量的零件的预计耗时，用于折算剩余时间。
+
+        参数:
+            paths: 零件路径列表
+            costs: 与 paths 对应的预计耗时（秒）
+        """
+        self._costs = {path: float(cost) for path, cost in zip(paths, costs)}
+        self.predicted_s = sum(self._costs.values())
+
+    def slot(self, index):
+        """
+        为工作线程分配计数字典；只由该线程写入。
+
+        参数:
+            index: 工作线程序号
+
+        返回:
+            dict: worker_progress() 的计数
+        """
+        counts = worker_progress(index)
+        self._slots.append(counts)
+        return counts
+
+    def part_done(self, counts, record):
+        """
+        工作者测量完一个零件后调用；只更新自己的计数，不加锁。
+
+        参数:
+            counts: slot() 返回的计数字典
+            record: 零件记录
+        """
+        counts['parts'] += 1
+        counts['bodies'] += record.get('body_count') or 0
+        if record.get('error') is not None or record.get('accuracy_level') == 'failed':
+            counts['failures'] += 1
+        counts['measure_s'] += record.get('measure_time_s') or 0.0
+        feature_time = record.get('feature_time_s')
+        if feature_time is not None:
+            counts['feature_s'] += feature_time
+            counts['featured'] += 1
+        counts['predicted_s'] += self._costs.get(record.get('path'), 0.0)
+
+    def status(self):
+        """
+        当前进度。
+
+        返回:
+            dict: state、started_at、elapsed_s、parts、done、skipped、to_measure、
+                measured、failures、bodies、parts_per_s、bodies_per_s、phases
+                （各阶段平均耗时）、predicted_s、eta_s 和各工作者完成的零件数
+        """
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        slots = list(self._slots)
+        measured = sum(c['parts'] for c in slots)
+        bodies = sum(c['bodies'] for c in slots)
+        measure_s = sum(c['measure_s'] for c in slots)
+        feature_s = sum(c['feature_s'] for c in slots)
+        featured = sum(c['featured'] for c in slots)
+        predicted_done = sum(c['predicted_s'] for c in slots)
+
+        remaining = self.to_measure - measured
+        if self.state == 'done' or remaining <= 0:
+            eta = 0.0
+        elif predicted_done > 0 and self.predicted_s > predicted_done:
+            eta = elapsed * (self.predicted_s - predicted_done) / predicted_done
+        elif measured:
+            eta = elapsed * remaining / measured
+        else:
+            eta = None
+
+        phases = {
+            'measure_s': (measure_s - feature_s) / measured if measured else None,
+            'features_s': feature_s / featured if featured else None,
+        }
+        return {
+            'state': self.state,
+            'started_at': self._started_at,
+            'elapsed_s': round(elapsed, 3),
+            'parts': self.total,
+            'done': self.skipped + measured,
+            'skipped': self.skipped,
+            'to_measure': self.to_measure,
+            'measured': measured,
+            'failures': sum(c['failures'] for c in slots),
+            'bodies': bodies,
+            'parts_per_s': round(measured / elapsed, 3) if elapsed > 0 else None,
+            'bodies_per_s': round(bodies / elapsed, 3) if elapsed > 0 else None,
+            'phases': {k: None if v is None else round(v, 3) for k, v in phases.items()},
+            'predicted_s': round(self.predicted_s, 3),
+            'eta_s': None if eta is None else round(eta, 1),
+            'workers': [{'worker': c['worker'], 'parts': c['parts']}
+                        for c in sorted(slots, key=lambda c: c['worker'])],
+        }
+
+    def _publish(self):
+        status = self.status()
+        for reporter in self.reporters:
+            try:
+                reporter.update(status)
+            except OSError:
+                # 状态文件写不进去不应中断批处理
+                pass
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._publish()
+
+    def finish(self, report=True):
+        """
+        结束本批：停止刷新线程并输出最终状态。
+
+        参数:
+            report: 是否把最终状态交给输出端
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.state = 'done'
+        if report:
+            self._publish()
+
+    def close(self):
+        """结束当前批次并关闭各输出端"""
+        self.finish()
+        for reporter in self.reporters:
+            reporter.close()
+
+
+class TerminalProgress:
+    """
+    终端进度条，原地刷新一行：
+
+        [#########...............] 120/500  24%  3.2 件/s  41 实体/s  失败 2  剩余 2:05
+    """
+
+    def __init__(self, stream=None, width=BAR_WIDTH):
+        """
+        参数:
+            stream: 输出流；None 使用 sys.stderr
+            width: 进度条宽度（字符）
+        """
+        self.stream = stream or sys.stderr
+        self.width = width
+        self._length = 0
+
+    def format(self, status):
+        """
+        一行进度文本。
+
+        参数:
+            status: ProgressTracker.status() 的结果
+
+        返回:
+            str: 进度条和吞吐量
+        """
+        fraction = status['done'] / status['parts'] if status['parts'] else 1.0
+        filled = int(round(fraction * self.width))
+        bar = '#' * filled + '.' * (self.width - filled)
+        parts = [f"[{bar}] {status['done']}/{status['parts']}", f"{fraction:4.0%}"]
+        if status['parts_per_s'] is not None:
+            parts.append(f"{status['parts_per_s']:.1f} 件/s")
+            parts.append(f"{status['bodies_per_s']:.0f} 实体/s")
+        if status['failures']:
+            parts.append(f"失败 {status['failures']}")
+        if status['state'] == 'done':
+            parts.append(f"用时 {_clock(status['elapsed_s'])}")
+        elif status['eta_s'] is not None:
+            parts.append(f"剩余 {_clock(status['eta_s'])}")
+        return '  '.join(parts)
+
+    def update(self, status):
+        line = self.format(status)
+        # 新行比上一次短时用空格盖掉残留字符
+        self.stream.write('\r' + line + ' ' * max(0, self._length - len(line)))
+        self._length = len(line)
+        if status['state'] == 'done':
+            self.stream.write('\n')
+            self._length = 0
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class StatusFile:
+    """
+    定时重写的 JSON 状态文件。
+
+    先写同目录下的临时文件再替换，读取方不会读到写了一半的内容。
+    """
+
+    def __init__(self, path):
+        """
+        参数:
+            path: 状态文件路径
+        """
+        self.path = path
+
+    def update(self, status):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(status, f, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.path)
+
+    def close(self):
+        pass
+
+
+class StatusServer:
+    """
+    本地 HTTP 状态端点。
+
+    GET / 或 /status 返回最近一次刷新的状态 JSON；请求不触碰工作者的
+    计数，只读取已编码好的内容。
+
+    用法:
+        server = StatusServer(8765)
+        print(server.url)      # http://127.0.0.1:8765/status
+    """
+
+    def __init__(self, port=0, host=STATUS_HOST):
+        """
+        参数:
+            port: 端口；0 表示由系统分配
+            host: 监听地址；默认只监听本机
+        """
+        self._body = json.dumps({'state': 'idle'}).encode('utf-8')
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/status'):
+                    self.send_error(404)
+                    return
+                body = server._body
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='status-server',
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/status"
+
+    def update(self, status):
+        self._body = json.dumps(status, ensure_ascii=False).encode('utf-8')
+
+    def close(self):
+        """停止服务并释放端口"""
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._thread = None
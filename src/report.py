@@ -0,0 +1,451 @@
+"""
+批量报价工作簿
+
+把整批零件记录写成一个多工作表的 Excel 报价工作簿：
+
+    汇总: 零件数、失败数、总质量、总价，以及按材料的小计（均为公式）
+    零件明细: 每个零件一行，总价为“单价 × 数量”公式
+    实体明细: 每个实体一行；超过单表行数上限时续写到下一个工作表
+    排样: 给出排样结果时（见 nesting.py），每个 (材料, 板厚) 一行：
+        板材规格、板数、坯料件数和利用率（公式）
+    下料: 给出棒料排料结果时（见 cutlist.py），每个 (材料, 截面, 棒料长度)
+        一行的采购清单：根数、件数、下料长度和废料率（公式）
+    元数据: 生成时间、后端、测量精度和调用方附加的信息
+
+给出 PreviewExtractor 时，零件明细末尾增加一列预览缩略图
+（直接取自 .prt 容器，见 preview.py）；openpyxl 读取图像需要 Pillow。
+
+使用 openpyxl 的只写模式，各工作表边写边落盘，记录只遍历一次，
+内存占用与零件数无关。样式在工作簿中注册一次，单元格只引用样式名。
+
+零件属性等来自记录的文本以 = + - @ 开头时写为文本单元格，Excel
+不会把它们当作公式。
+"""
+
+from datetime import datetime
+from io import BytesIO
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+    from openpyxl.drawing.image import Image
+    from openpyxl.utils import get_column_letter, quote_sheetname
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+from .preview import PIL_AVAILABLE
+
+# 以这些字符开头的文本在 Excel 中可能被当作公式
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+SUMMARY_SHEET = "汇总"
+DETAIL_SHEET = "零件明细"
+BODY_SHEET = "实体明细"
+NEST_SHEET = "排样"
+CUT_SHEET = "下料"
+META_SHEET = "元数据"
+
+# Excel 单个工作表的行数上限（含表头）
+MAX_ROWS = 1048576
+
+# 零件明细列：(表头, 记录字段, 换算系数, 数字格式, 列宽)
+# 字段为 None 时由 _detail_values() 单独处理
+DETAIL_COLUMNS = [
+    ('文件', 'file', None, None, 28),
+    ('材料', 'material', None, None, 12),
+    ('实体数', 'body_count', None, '0', 8),
+    ('体积 (cm³)', 'volume_m3', 1e6, '0.00', 12),
+    ('表面积 (cm²)', 'area_m2', 1e4, '0.00', 12),
+    ('长 (mm)', 'length_m', 1e3, '0.0', 10),
+    ('宽 (mm)', 'width_m', 1e3, '0.0', 10),
+    ('高 (mm)', 'height_m', 1e3, '0.0', 10),
+    ('质量 (kg)', 'mass_kg', 1.0, '0.000', 10),
+    ('材料费', 'material_cost', 1.0, '#,##0.00', 12),
+    ('毛坯费', 'stock_cost', 1.0, '#,##0.00', 12),
+    ('加工工时 (h)', 'machining_time_h', 1.0, '0.00', 12),
+    ('加工费', 'machining_cost', 1.0, '#,##0.00', 12),
+    ('数量', 'quantity', None, '0', 8),
+    ('单价', None, None, '#,##0.00', 12),
+    ('总价', None, None, '#,##0.00', 14),
+    ('精度', 'accuracy_level', None, None, 10),
+    ('重复', 'duplicate_of', None, None, 20),
+    ('错误', 'error', None, None, 40),
+]
+
+BODY_COLUMNS = [
+    ('文件', 'file', None, None, 28),
+    ('序号', 'index', None, '0', 6),
+    ('状态', 'measure_status', None, None, 10),
+    ('材料', 'material', None, None, 12),
+    ('体积 (cm³)', 'volume_m3', 1e6, '0.00', 12),
+    ('表面积 (cm²)', 'area_m2', 1e4, '0.00', 12),
+    ('质量 (kg)', 'mass_kg', 1.0, '0.000', 10),
+    ('材料费', 'material_cost', 1.0, '#,##0.00', 12),
+]
+
+# 排样列：(表头, 字段, 换算系数, 数字格式, 列宽)；利用率为公式
+NEST_COLUMNS = [
+    ('材料', 'material', None, None, 12),
+    ('板厚 (mm)', 'thickness_m', 1e3, '0.0#', 10),
+    ('板材 (mm)', 'sheet_size', None, None, 12),
+    ('板数', 'sheets', None, '0', 8),
+    ('坯料件数', 'parts', None, '0', 10),
+    ('放不下', 'unplaced', None, '0', 8),
+    ('展开面积 (m²)', 'flat_area_m2', None, '0.000', 14),
+    ('板材面积 (m²)', 'sheet_area_m2', None, '0.000', 14),
+    ('利用率', None, None, '0.0%', 10),
+    ('末张占用', 'last_sheet_usage', None, '0.0%', 10),
+]
+
+# 下料列：(表头, 字段, 换算系数, 数字格式, 列宽)；废料率为公式
+CUT_COLUMNS = [
+    ('材料', 'material', None, None, 12),
+    ('截面 (mm)', 'section', None, None, 10),
+    ('棒料长 (mm)', 'bar_length_m', 1e3, '0', 12),
+    ('根数', 'bars', None, '0', 8),
+    ('件数', 'pieces', None, '0', 8),
+    ('下料长度 (m)', 'cut_length_m', None, '0.000', 14),
+    ('棒料长度 (m)', 'stock_length_m', None, '0.000', 14),
+    ('废料率', None, None, '0.0%', 10),
+    ('排料方法', 'method', None, None, 10),
+]
+
+_DETAIL_INDEX = {header: i for i, (header, *_rest) in enumerate(DETAIL_COLUMNS)}
+
+
+def _column(header):
+    """零件明细中某列的字母"""
+    return get_column_letter(_DETAIL_INDEX[header] + 1)
+
+
+class _Text(str):
+    """来自记录、可能被当作公式的文本；写入时固定为文本单元格"""
+
+
+def _scaled(value, factor):
+    if isinstance(value, str):
+        return _Text(value) if value.startswith(FORMULA_PREFIXES) else value
+    if value is None or factor is None:
+        return value
+    return value * factor
+
+
+def _unit_price(record):
+    price = record.get('quoted_unit_price')
+    if price is None:
+        price = record.get('unit_price_q1')
+    return price
+
+
+class _Styles:
+    """工作簿共享的样式，每种只注册一次"""
+
+    def __init__(self, wb):
+        thin = Side(style='thin')
+        header = NamedStyle('nx_header')
+        header.font = Font(bold=True)
+        header.fill = PatternFill('solid', fgColor='DDEBF7')
+        header.border = Border(bottom=thin)
+        header.alignment = Alignment(horizontal='center')
+        title = NamedStyle('nx_title')
+        title.font = Font(bold=True, size=14)
+        note = NamedStyle('nx_note')
+        note.font = Font(italic=True, color='808080')
+        for style in (header, title, note):
+            wb.add_named_style(style)
+
+    @staticmethod
+    def cell(ws, value, style=None, number_format=None):
+        if isinstance(value, _Text):
+            cell = WriteOnlyCell(ws, str(value))
+            cell.data_type = 's'
+            if style:
+                cell.style = style
+            return cell
+        if value is None or not (style or number_format):
+            # 无样式的值直接写入，省去单元格对象
+            return value
+        cell = WriteOnlyCell(ws, value)
+        if style:
+            cell.style = style
+        if number_format:
+            cell.number_format = number_format
+        return cell
+
+
+def _thumbnail_image(thumb):
+    """
+    嵌入的缩略图。
+
+    有缓存文件时传文件路径，图像数据在保存工作簿时才读取；
+    显示尺寸取 PreviewExtractor 给出的大小。
+    """
+    image = Image(thumb['file'] or BytesIO(thumb['data']))
+    image.width = thumb['width']
+    image.height = thumb['height']
+    return image
+
+
+class _BodySheets:
+    """实体明细，写满一个工作表后续写到下一个"""
+
+    def __init__(self, wb, styles):
+        self.wb = wb
+        self.styles = styles
+        self.sheet_count = 0
+        self.ws = None
+        self.rows = 0
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        name = BODY_SHEET if self.sheet_count == 1 else f"{BODY_SHEET} {self.sheet_count}"
+        self.ws = self.wb.create_sheet(name)
+        _header(self.ws, self.styles, BODY_COLUMNS)
+        self.rows = 1
+
+    def append(self, record):
+        for body in record.get('bodies') or ():
+            if self.ws is None or self.rows >= MAX_ROWS:
+                self._new_sheet()
+            row = []
+            for header, key, factor, fmt, _width in BODY_COLUMNS:
+                value = record.get('file') if key == 'file' else body.get(key)
+                row.append(self.styles.cell(self.ws, _scaled(value, factor), number_format=fmt))
+            self.ws.append(row)
+            self.rows += 1
+
+
+def _header(ws, styles, columns):
+    """设置列宽、冻结表头并写入表头行"""
+    for i, (_header_text, _key, _factor, _fmt, width) in enumerate(columns, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.freeze_panes = 'A2'
+    ws.append([styles.cell(ws, c[0], 'nx_header') for c in columns])
+
+
+def _detail_values(record, row, extra_columns=()):
+    """零件明细一行的值，row 为 Excel 行号"""
+    values = []
+    for header, key, factor, _fmt, _width in DETAIL_COLUMNS:
+        if header == '单价':
+            value = _unit_price(record)
+        elif header == '总价':
+            value = f"={_column('单价')}{row}*{_column('数量')}{row}"
+        elif key == 'quantity':
+            value = record.get('quantity') or 1
+        else:
+            value = _scaled(record.get(key), factor)
+        values.append(value)
+    for _header_text, key, factor, _fmt, _width in extra_columns:
+        values.append(_scaled(record.get(key), factor))
+    return values
+
+
+def write_batch_report(records, filepath, metadata=None, previews=None, extra_columns=None,
+                       nesting=None, cutlist=None):
+    """
+    写出批量报价工作簿。
+
+    参数:
+        records: 零件记录的可迭代对象（可以是生成器，只遍历一次）
+        filepath: 输出 .xlsx 路径
+        metadata: 可选，写入元数据工作表的附加键值
+        previews: 可选，PreviewExtractor；给出时按记录的 path 嵌入预览图
+        extra_columns: 可选，零件明细末尾的附加列，格式同 DETAIL_COLUMNS，
+            如 features.FEATURE_REPORT_COLUMNS
+        nesting: 可选，nesting.nest_records() 的分组结果；给出时写出排样工作表，
+            汇总中增加板数和利用率
+        cutlist: 可选，cutlist.purchase_list() 的采购清单；给出时写出下料工作表，
+            汇总中增加棒料根数和废料率
+
+    返回:
+        dict: 统计信息（parts、bodies、failed、body_sheets）
+    """
+    if not OPENPYXL_AVAILABLE:
+        raise ImportError("未安装 openpyxl。运行: pip install openpyxl")
+    if previews is not None and not PIL_AVAILABLE:
+        raise ImportError("嵌入预览图需要 Pillow。运行: pip install Pillow")
+
+    wb = Workbook(write_only=True)
+    styles = _Styles(wb)
+
+    # 工作表顺序即创建顺序；汇总最后才写，但排在第一个
+    summary = wb.create_sheet(SUMMARY_SHEET)
+    detail = wb.create_sheet(DETAIL_SHEET)
+    bodies = _BodySheets(wb, styles)
+
+    extra_columns = list(extra_columns or ())
+    columns = DETAIL_COLUMNS + extra_columns
+    if previews is not None:
+        width, height = previews.max_size
+        # 列宽约 7 像素一个字符，行高单位为磅（0.75 磅/像素）
+        columns.append(('预览', None, None, None, width / 7.0 + 1))
+        detail.sheet_format.defaultRowHeight = height * 0.75 + 4
+        detail.sheet_format.customHeight = True
+        preview_column = get_column_letter(len(columns))
+    _header(detail, styles, columns)
+    formats = [c[3] for c in DETAIL_COLUMNS + extra_columns]
+
+    parts = 0
+    body_total = 0
+    failed = 0
+    materials = set()
+    backends = set()
+    accuracies = set()
+    for record in records:
+        parts += 1
+        row = parts + 1
+        values = _detail_values(record, row, extra_columns)
+        detail.append([styles.cell(detail, v, number_format=f) for v, f in zip(values, formats)])
+        bodies.append(record)
+        if previews is not None and record.get('path'):
+            thumb = previews.thumbnail(record['path'])
+            if thumb is not None and thumb['format'] in ('jpeg', 'png'):
+                image = _thumbnail_image(thumb)
+                image.anchor = f"{preview_column}{row}"
+                detail.add_image(image)
+
+        body_total += record.get('body_count') or 0
+        if record.get('error'):
+            failed += 1
+        if record.get('material'):
+            materials.add(record['material'])
+        if record.get('backend'):
+            backends.add(record['backend'])
+        if record.get('accuracy') is not None:
+            accuracies.add(record['accuracy'])
+
+    if parts:
+        detail.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{parts + 1}"
+
+    nesting = list(nesting or ())
+    if nesting:
+        flat = _table_column(NEST_COLUMNS, '展开面积 (m²)')
+        total = _table_column(NEST_COLUMNS, '板材面积 (m²)')
+        _write_table(wb.create_sheet(NEST_SHEET), styles, NEST_COLUMNS, nesting,
+                     lambda r: f"=IF({total}{r}>0,{flat}{r}/{total}{r},\"\")")
+    cutlist = list(cutlist or ())
+    if cutlist:
+        cut = _table_column(CUT_COLUMNS, '下料长度 (m)')
+        stock = _table_column(CUT_COLUMNS, '棒料长度 (m)')
+        _write_table(wb.create_sheet(CUT_SHEET), styles, CUT_COLUMNS, cutlist,
+                     lambda r: f"=IF({stock}{r}>0,1-{cut}{r}/{stock}{r},\"\")")
+
+    _write_summary(summary, styles, parts, sorted(materials), len(nesting), len(cutlist))
+
+    meta = wb.create_sheet(META_SHEET)
+    meta.column_dimensions['A'].width = 16
+    meta.column_dimensions['B'].width = 40
+    rows = [
+        ('生成工具', "NX 报价助手"),
+        ('生成时间', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ('零件数', parts),
+        ('实体数', body_total),
+        ('失败数', failed),
+        ('后端', ', '.join(sorted(backends))),
+        ('测量精度', ', '.join(f"{a:g}" for a in sorted(accuracies))),
+    ]
+    rows.extend((str(k), v) for k, v in (metadata or {}).items())
+    meta.append([styles.cell(meta, '项目', 'nx_header'), styles.cell(meta, '值', 'nx_header')])
+    for key, value in rows:
+        if isinstance(value, (list, tuple, dict)):
+            value = str(value)
+        meta.append([styles.cell(meta, _scaled(key, None)),
+                     styles.cell(meta, _scaled(value, None))])
+
+    wb.save(filepath)
+    return {'parts': parts, 'bodies': body_total, 'failed': failed,
+            'body_sheets': bodies.sheet_count}
+
+
+def _write_table(ws, styles, columns, rows, formula):
+    """
+    写排样、下料这类每行一个字典的表。
+
+    参数:
+        columns: 列声明，字段为 None 的列写公式
+        rows: 字典列表
+        formula: 由行号生成公式的函数
+    """
+    _header(ws, styles, columns)
+    for row, item in enumerate(rows, 2):
+        values = []
+        for _header_text, key, factor, fmt, _width in columns:
+            value = formula(row) if key is None else _scaled(item.get(key), factor)
+            values.append(styles.cell(ws, value, number_format=fmt))
+        ws.append(values)
+
+
+def _table_column(columns, header):
+    """排样、下料表中某列的列字母"""
+    return get_column_letter([c[0] for c in columns].index(header) + 1)
+
+
+def _write_summary(ws, styles, parts, materials, nest_rows=0, cut_rows=0):
+    """写汇总表，数值均为引用零件明细（和排样、下料）的公式"""
+    ws.column_dimensions['A'].width = 16
+    for letter in 'BCDE':
+        ws.column_dimensions[letter].width = 16
+
+    last = parts + 1
+    sheet = quote_sheetname(DETAIL_SHEET)
+
+    def rng(header):
+        col = _column(header)
+        return f"{sheet}!${col}$2:${col}${last}"
+
+    ws.append([styles.cell(ws, "批量报价汇总", 'nx_title')])
+    ws.append([styles.cell(ws, f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                           'nx_note')])
+    ws.append([])
+    ws.append([styles.cell(ws, '指标', 'nx_header'), styles.cell(ws, '值', 'nx_header')])
+
+    if parts:
+        totals = [
+            ('零件数', f"=COUNTA({rng('文件')})", '0'),
+            ('失败数', f"=COUNTA({rng('错误')})", '0'),
+            ('实体数', f"=SUM({rng('实体数')})", '0'),
+            ('总质量 (kg)', f"=SUM({rng('质量 (kg)')})", '0.000'),
+            ('总数量', f"=SUM({rng('数量')})", '0'),
+            ('总价', f"=SUM({rng('总价')})", '#,##0.00'),
+        ]
+    else:
+        totals = [('零件数', 0, '0')]
+    def table_sum(name, columns, count, header):
+        col = _table_column(columns, header)
+        return f"SUM({quote_sheetname(name)}!${col}$2:${col}${count + 1})"
+
+    if nest_rows:
+        flat = table_sum(NEST_SHEET, NEST_COLUMNS, nest_rows, '展开面积 (m²)')
+        total = table_sum(NEST_SHEET, NEST_COLUMNS, nest_rows, '板材面积 (m²)')
+        totals += [
+            ('板材张数', f"={table_sum(NEST_SHEET, NEST_COLUMNS, nest_rows, '板数')}", '0'),
+            ('排样利用率', f"=IF({total}>0,{flat}/{total},\"\")", '0.0%'),
+        ]
+    if cut_rows:
+        cut = table_sum(CUT_SHEET, CUT_COLUMNS, cut_rows, '下料长度 (m)')
+        stock = table_sum(CUT_SHEET, CUT_COLUMNS, cut_rows, '棒料长度 (m)')
+        totals += [
+            ('棒料根数', f"={table_sum(CUT_SHEET, CUT_COLUMNS, cut_rows, '根数')}", '0'),
+            ('棒料废料率', f"=IF({stock}>0,1-{cut}/{stock},\"\")", '0.0%'),
+        ]
+    for label, formula, fmt in totals:
+        ws.append([label, styles.cell(ws, formula, number_format=fmt)])
+
+    if not materials:
+        return
+
+    ws.append([])
+    ws.append([styles.cell(ws, h, 'nx_header') for h in ('材料', '零件数', '质量 (kg)', '总价')])
+    for name in materials:
+        criteria = '"' + name.replace('"', '""') + '"'
+        ws.append([
+            styles.cell(ws, _scaled(name, None)),
+            styles.cell(ws, f"=COUNTIF({rng('材料')},{criteria})", number_format='0'),
+            styles.cell(ws, f"=SUMIF({rng('材料')},{criteria},{rng('质量 (kg)')})",
+                        number_format='0.000'),
+            styles.cell(ws, f"=SUMIF({rng('材料')},{criteria},{rng('总价')})",
+                        number_format='#,##0.00'),
+        ])
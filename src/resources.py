@@ -0,0 +1,277 @@
+"""
+资源监控与工作者回收
+
+长时间的 NX 批处理在 OpenBaseDisplay / CloseAll 的反复循环中会逐渐
+占用更多内存。这里提供：
+
+    rss_bytes()        当前进程的常驻内存
+    MemoryMonitor      后台采样，记录整批的峰值和平均内存
+    RecyclePolicy      处理 N 个零件或内存超过阈值后回收工作者
+
+NX 会话属于整个进程，在进程内重建后端对象释放不了会话占用的内存。
+因此回收只用于子进程工作者（见 workers.py）：每个子进程在测量完一个
+零件后回报自己的 RSS，RecyclePolicy 判断需要回收时结束该子进程并
+启动新的。
+
+内存读取依次使用 psutil、Windows 的 GetProcessMemoryInfo（ctypes）、
+/proc/self/statm 和 resource.getrusage（只有峰值）。都不可用时不记录
+内存，也不按内存回收。
+"""
+
+import os
+import sys
+import threading
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    try:
+        # Windows 7 起 K32GetProcessMemoryInfo 在 kernel32 中，更早的系统在 psapi 中
+        _get_memory_info = getattr(ctypes.windll.kernel32, 'K32GetProcessMemoryInfo', None)
+        if _get_memory_info is None:
+            _get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        _get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters),
+                                     wintypes.DWORD]
+        _get_memory_info.restype = wintypes.BOOL
+        _current_process = ctypes.windll.kernel32.GetCurrentProcess
+        _current_process.restype = wintypes.HANDLE
+    except (AttributeError, OSError):
+        _get_memory_info = None
+else:
+    _get_memory_info = None
+
+_MB = 1024.0 * 1024.0
+
+_PROCESS = psutil.Process() if PSUTIL_AVAILABLE else None
+
+
+def _windows_rss():
+    if _get_memory_info is None:
+        return None
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    if not _get_memory_info(_current_process(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+def _statm_rss():
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def rss_bytes():
+    """
+    读取当前进程的常驻内存。
+
+    返回:
+        int: 字节数；无法读取时返回 None
+    """
+    if _PROCESS is not None:
+        return _PROCESS.memory_info().rss
+    if _get_memory_info is not None:
+        return _windows_rss()
+    rss = _statm_rss()
+    if rss is None:
+        rss = _peak_rss()
+    return rss
+
+
+def to_mb(value):
+    """字节换算为 MB，保留一位小数；None 原样返回"""
+    return None if value is None else round(value / _MB, 1)
+
+
+class MemoryMonitor:
+    """
+    批处理期间的内存采样。
+
+    后台线程按固定间隔采样，工作者也可以在每个零件之后调用
+    sample() 补充采样点，峰值不会因为采样间隔而漏掉太多。
+
+    用法:
+        monitor = MemoryMonitor(0.5)
+        monitor.start()
+        ...
+        monitor.stop()
+        monitor.stats()   # {'peak_rss_mb': ..., 'avg_rss_mb': ..., ...}
+    """
+
+    def __init__(self, interval=0.5):
+        """
+        参数:
+            interval: 后台采样间隔（秒）；None 或 0 表示只使用手动采样
+        """
+        self.interval = interval
+        self.count = 0
+        self.total = 0
+        self.peak = None
+        self.first = None
+        self.last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self, rss=None):
+        """
+        记录一个采样点。
+
+        参数:
+            rss: 已读取的字节数；None 时现场读取
+
+        返回:
+            int: 本次的 RSS 字节数（不可用时为 None）
+        """
+        if rss is None:
+            rss = rss_bytes()
+        if rss is None:
+            return None
+        # 各字段单独更新，多线程下偶尔少计一个点不影响统计
+        if self.first is None:
+            self.first = rss
+        self.last = rss
+        self.count += 1
+        self.total += rss
+        if self.peak is None or rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """开始采样"""
+        self.sample()
+        if self.interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='memory-monitor', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台采样并记录最后一个采样点"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.sample()
+
+    def stats(self):
+        """
+        采样统计。
+
+        返回:
+            dict: start_rss_mb、end_rss_mb、peak_rss_mb、avg_rss_mb、samples；
+                无法读取内存时数值为 None
+        """
+        return {
+            'start_rss_mb': to_mb(self.first),
+            'end_rss_mb': to_mb(self.last),
+            'peak_rss_mb': to_mb(self.peak),
+            'avg_rss_mb': to_mb(self.total / self.count) if self.count else None,
+            'samples': self.count,
+        }
+
+
+class RecyclePolicy:
+    """
+    工作者回收条件。
+
+    子进程的 RSS 包括 NX 会话本身的基础占用。阈值设得低于基础占用时，
+    新进程一启动就会超限，因此按内存回收后，该工作者至少再处理
+    min_parts 个零件才会再次因内存回收，避免每个零件都重启一次。
+
+    用法:
+        policy = RecyclePolicy(max_parts=500, max_rss_mb=4096)
+        reason = policy.check(parts_since_recycle, rss)
+    """
+
+    def __init__(self, max_parts=None, max_rss_mb=None, min_parts=5):
+        """
+        参数:
+            max_parts: 处理多少个零件后回收；None 表示不按数量回收
+            max_rss_mb: 子进程 RSS 超过该值（MB）时回收；None 表示不按内存回收
+            min_parts: 两次按内存回收之间至少处理的零件数
+        """
+        self.max_parts = max_parts
+        self.max_rss_mb = max_rss_mb
+        self.min_parts = min_parts
+
+    def __bool__(self):
+        return bool(self.max_parts or self.max_rss_mb)
+
+    def check(self, parts, rss):
+        """
+        判断是否需要回收。
+
+        参数:
+            parts: 上次回收以来处理的零件数
+            rss: 子进程当前的 RSS 字节数（可为 None）
+
+        返回:
+            str: 'parts' 或 'memory'；不需要回收时返回 None
+        """
+        if self.max_parts and parts >= self.max_parts:
+            return 'parts'
+        if (self.max_rss_mb and rss is not None and parts >= self.min_parts
+                and rss > self.max_rss_mb * _MB):
+            return 'memory'
+        return None
+
+
+def worker_usage(index):
+    """
+    新工作者的资源记录。
+
+    recycles 为重建后端或重启子进程的次数，recycle_reasons 按原因计数
+    （'hang'、'parts'、'memory'、'crash'）；rss_mb / rss_peak_mb 在子进程
+    工作者中为子进程的内存，否则为整个进程的内存。
+    """
+    return {
+        'worker': index,
+        'parts': 0,
+        'since_recycle': 0,
+        'recycles': 0,
+        'recycle_reasons': {},
+        'open_parts_peak': 0,
+        'rss_mb': None,
+        'rss_peak_mb': None,
+    }
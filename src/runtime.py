@@ -0,0 +1,190 @@
+"""
+零件耗时预测
+
+接急单前要知道整批提取大概要跑多久。历史库（history.py）的 parts 表
+记录了每个零件的文件大小、几何流大小、实体数和测量耗时，这里用它们
+拟合一个小的回归模型，在打开零件之前估计耗时：
+
+    log(耗时) = b0 + b1·log(1 + 几何流 MB) + b2·log(1 + 文件 MB) [+ b3·log(1 + 实体数)]
+
+在对数空间拟合，预测值恒为正，大小零件的相对误差同样看待；换回
+秒时乘以残差的平均 exp 值（Duan smearing），使整批合计不偏小。
+实体数只有缓存中见过该零件时才知道，因此分别拟合带实体数
+（'bodies'）、只用流大小（'streams'）和只用文件大小（'file'）三个
+子模型，预测时取可用特征最多的一个。
+
+预测的是打开和测量的时间，不含特征提取和钣金识别：样本取自
+HistoryStore.timings()，已扣除 feature_time_s，并排除沿用首个零件
+耗时的几何重复零件。
+
+模型每次由历史库重新拟合（几千行只需几毫秒），为调度器的最长任务
+优先排序（scheduler.CostModel）和命令行的预计耗时提供依据。
+"""
+
+import numpy as np
+
+# 拟合用的最近样本数
+RUNTIME_SAMPLES = 5000
+
+# 子模型至少需要的样本数
+MIN_SAMPLES = 20
+
+# 岭回归的正则化系数（不作用于截距）
+RIDGE = 1e-3
+
+# 子模型：名称和使用的特征，按优先级排列
+SUBMODELS = (
+    ('bodies', ('geometry_bytes', 'file_size', 'body_count')),
+    ('streams', ('geometry_bytes', 'file_size')),
+    ('file', ('file_size',)),
+)
+
+# 特征换算：字节按 MB，实体数按个
+_SCALE = {'geometry_bytes': 1e6, 'file_size': 1e6, 'body_count': 1.0}
+
+
+def _design(columns, names):
+    """特征矩阵：截距列加各特征的 log(1 + x)"""
+    n = len(columns[names[0]])
+    return np.column_stack([np.ones(n)] + [np.log1p(columns[name] / _SCALE[name])
+                                           for name in names])
+
+
+def _columns(rows, names):
+    """记录列表转为浮点列；缺失为 NaN"""
+    return {name: np.array([np.nan if r.get(name) is None else float(r[name]) for r in rows])
+            for name in names}
+
+
+class RuntimeModel:
+    """
+    由历史测量耗时拟合的零件耗时回归模型。
+
+    用法:
+        model = RuntimeModel.from_history(HistoryStore('quotes.db'), backend='nx')
+        seconds, basis = model.predict(file_size=2_400_000, geometry_bytes=1_800_000)
+    """
+
+    def __init__(self, ridge=RIDGE, min_samples=MIN_SAMPLES):
+        """
+        参数:
+            ridge: 岭回归的正则化系数
+            min_samples: 子模型至少需要的样本数，不足时不拟合该子模型
+        """
+        self.ridge = ridge
+        self.min_samples = min_samples
+        # 名称 -> {'coef', 'smear', 'samples', 'error'}
+        self.submodels = {}
+
+    @classmethod
+    def from_history(cls, store, backend=None, limit=RUNTIME_SAMPLES, **kwargs):
+        """
+        由历史库最近的成功测量拟合模型。
+
+        参数:
+            store: HistoryStore
+            backend: 只用该后端的测量（fake 和 nx 的耗时差几个数量级）
+            limit: 最多使用的最近样本数
+            **kwargs: 传给构造函数
+
+        返回:
+            RuntimeModel: 拟合后的模型；样本不足时没有子模型
+        """
+        model = cls(**kwargs)
+        model.fit(store.timings(backend=backend, limit=limit))
+        return model
+
+    def fit(self, rows):
+        """
+        拟合各子模型。
+
+        参数:
+            rows: 含 measure_time_s 及 file_size、geometry_bytes、body_count 的字典列表
+
+        返回:
+            RuntimeModel: self
+        """
+        names = ('measure_time_s',) + SUBMODELS[0][1]
+        columns = _columns(rows, names)
+        seconds = columns['measure_time_s']
+        self.submodels = {}
+        for name, features in SUBMODELS:
+            usable = seconds > 0
+            for feature in features:
+                usable &= np.isfinite(columns[feature]) & (columns[feature] >= 0)
+            if usable.sum() < self.min_samples:
+                continue
+            x = _design({f: columns[f][usable] for f in features}, features)
+            y = np.log(seconds[usable])
+            penalty = self.ridge * len(y) * np.eye(x.shape[1])
+            penalty[0, 0] = 0.0
+            coef = np.linalg.solve(x.T @ x + penalty, x.T @ y)
+            residual = y - x @ coef
+            self.submodels[name] = {
+                'features': features,
+                'coef': coef,
+                'smear': float(np.exp(residual).mean()),
+                'samples': int(len(y)),
+                # 典型的倍数误差：残差绝对值的中位数换回倍数
+                'error': float(np.expm1(np.median(np.abs(residual)))),
+            }
+        return self
+
+    @property
+    def fitted(self):
+        """是否至少有一个子模型"""
+        return bool(self.submodels)
+
+    def predict_columns(self, file_size, geometry_bytes=None, body_count=None):
+        """
+        批量预测。
+
+        参数:
+            file_size / geometry_bytes / body_count: 等长数组，未知的值为 NaN 或 None
+
+        返回:
+            tuple: (预计耗时数组（秒），无法预测的为 NaN；所用子模型名称数组)
+        """
+        columns = {'file_size': file_size, 'geometry_bytes': geometry_bytes,
+                   'body_count': body_count}
+        n = len(file_size)
+        columns = {k: np.full(n, np.nan) if v is None else
+                   np.array([np.nan if x is None else x for x in v], dtype=float)
+                   for k, v in columns.items()}
+        seconds = np.full(n, np.nan)
+        basis = np.full(n, None, dtype=object)
+        for name, features in SUBMODELS:
+            fit = self.submodels.get(name)
+            if fit is None:
+                continue
+            todo = np.isnan(seconds)
+            for feature in features:
+                todo &= np.isfinite(columns[feature])
+            if not todo.any():
+                continue
+            x = _design({f: columns[f][todo] for f in features}, features)
+            seconds[todo] = np.exp(x @ fit['coef']) * fit['smear']
+            basis[todo] = name
+        return seconds, basis
+
+    def predict(self, file_size=None, geometry_bytes=None, body_count=None):
+        """
+        预测一个零件的耗时。
+
+        返回:
+            tuple: (秒, 子模型名称)；没有可用的子模型时返回 None
+        """
+        seconds, basis = self.predict_columns([file_size], [geometry_bytes], [body_count])
+        if np.isnan(seconds[0]):
+            return None
+        return float(seconds[0]), basis[0]
+
+    def describe(self):
+        """
+        各子模型的样本数和典型误差，供命令行显示。
+
+        返回:
+            dict: 名称 -> {'samples', 'error'}
+        """
+        return {name: {'samples': fit['samples'], 'error': fit['error']}
+                for name, fit in self.submodels.items()}
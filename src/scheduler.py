@@ -0,0 +1,298 @@
+"""
+工作窃取调度
+
+批量中的零件从 1 个实体到上千个实体不等，按顺序平均分给工作线程时，
+分到大零件的线程最后还在跑，其余线程早已空闲。这里先估计每个零件的
+耗时，按“最长任务优先”（LPT）分配到各工作线程的双端队列：
+
+    线程从自己队列的头部取任务（剩余中最大的）
+    自己的队列空了，就从剩余预计耗时最多的队列尾部窃取（最小的）
+
+耗时估计依次使用：缓存中上次的测量耗时、由历史库拟合的耗时模型
+（见 runtime.py；特征为缓存中的实体数、几何流大小和文件大小），
+没有模型时按缓存中的实体数、容器中几何流的大小、文件大小线性估计。
+"""
+
+import heapq
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .assembly import ESTIMATE_BASE_S, ESTIMATE_PER_MB_S
+from .container import GEOMETRY_STREAMS, ContainerError, PrtContainer
+
+# 按实体数估计时每个实体的耗时（秒）
+ESTIMATE_PER_BODY_S = 0.5
+
+STRATEGIES = ('naive', 'lpt', 'stealing')
+
+
+class CostModel:
+    """
+    零件耗时估计。
+
+    用法:
+        model = CostModel(cache, runtime=RuntimeModel.from_history(store))
+        costs = model.predict(paths, fingerprints)
+    """
+
+    def __init__(self, cache=None, base_s=ESTIMATE_BASE_S, per_body_s=ESTIMATE_PER_BODY_S,
+                 per_mb_s=ESTIMATE_PER_MB_S, runtime=None):
+        """
+        参数:
+            cache: ResultCache；用于读取上次的测量耗时和实体数
+            base_s: 每个零件的固定开销（秒）
+            per_body_s: 每个实体的耗时（秒）
+            per_mb_s: 每 MB 几何流的耗时（秒）
+            runtime: 可选，拟合好的 RuntimeModel；给出时优先于线性估计
+        """
+        self.cache = cache
+        self.base_s = base_s
+        self.per_body_s = per_body_s
+        self.per_mb_s = per_mb_s
+        self.runtime = runtime if runtime is not None and runtime.fitted else None
+
+    def predict_one(self, path, fingerprint=None):
+        """
+        估计一个零件的耗时。
+
+        返回:
+            tuple: (秒, 依据)；依据为 'history'、'model:<子模型>'、'bodies'、'streams'、
+                'file' 或 'default'
+        """
+        body_count = None
+        if self.cache is not None and fingerprint:
+            previous = self.cache.peek(fingerprint)
+            if previous:
+                if previous.get('measure_time_s'):
+                    return float(previous['measure_time_s']), 'history'
+                body_count = previous.get('body_count')
+        if body_count and self.runtime is None:
+            return self.base_s + self.per_body_s * body_count, 'bodies'
+
+        try:
+            file_size = os.path.getsize(path)
+        except OSError:
+            return self.base_s, 'default'
+        try:
+            with PrtContainer(path) as container:
+                sizes = container.stream_sizes()
+            geometry = sum(sizes.get(name, 0) for name in GEOMETRY_STREAMS)
+        except (ContainerError, OSError):
+            geometry = None
+
+        if self.runtime is not None:
+            predicted = self.runtime.predict(file_size, geometry, body_count)
+            if predicted is not None:
+                return predicted[0], f"model:{predicted[1]}"
+            if body_count:
+                return self.base_s + self.per_body_s * body_count, 'bodies'
+        if geometry is not None:
+            return self.base_s + self.per_mb_s * geometry / 1e6, 'streams'
+        return self.base_s + self.per_mb_s * file_size / 1e6, 'file'
+
+    def predict(self, paths, fingerprints=None):
+        """
+        估计一组零件的耗时。
+
+        参数:
+            paths: 文件路径列表
+            fingerprints: 可选，路径到几何指纹的字典
+
+        返回:
+            numpy.ndarray: 预计耗时（秒）
+        """
+        return self.predict_with_basis(paths, fingerprints)[0]
+
+    def predict_with_basis(self, paths, fingerprints=None):
+        """
+        估计一组零件的耗时，同时给出每个零件的依据。
+
+        返回:
+            tuple: (预计耗时数组（秒）, 依据列表)
+        """
+        fingerprints = fingerprints or {}
+        predicted = [self.predict_one(p, fingerprints.get(p)) for p in paths]
+        return (np.array([seconds for seconds, _basis in predicted], dtype=float),
+                [basis for _seconds, basis in predicted])
+
+
+def lpt_assign(costs, workers):
+    """
+    按最长任务优先把任务分到各工作线程。
+
+    参数:
+        costs: 预计耗时数组
+        workers: 工作线程数
+
+    返回:
+        list: 每个工作线程的任务下标列表（各自按耗时从大到小）
+    """
+    queues = [[] for _ in range(workers)]
+    heap = [(0.0, k) for k in range(workers)]
+    for i in np.argsort(-np.asarray(costs, dtype=float), kind='stable'):
+        load, k = heapq.heappop(heap)
+        queues[k].append(int(i))
+        heapq.heappush(heap, (load + costs[i], k))
+    return queues
+
+
+def simulate(costs, workers, strategy='stealing', actual=None):
+    """
+    模拟调度，计算完工时间（makespan）。
+
+    参数:
+        costs: 调度依据的预计耗时
+        workers: 工作线程数
+        strategy: 'naive'（按输入顺序平均分段）、'lpt'（静态 LPT）或 'stealing'
+        actual: 实际耗时；None 表示与预计相同
+
+    返回:
+        float: 完工时间
+    """
+    costs = np.asarray(costs, dtype=float)
+    actual = costs if actual is None else np.asarray(actual, dtype=float)
+    n = len(costs)
+    if n == 0:
+        return 0.0
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知的调度方式: {strategy}（可选: {', '.join(STRATEGIES)}）")
+
+    if strategy == 'naive':
+        return max(float(chunk.sum()) for chunk in np.array_split(actual, workers))
+
+    queues = lpt_assign(costs, workers)
+    if strategy == 'lpt':
+        return max(float(actual[q].sum()) if q else 0.0 for q in queues)
+
+    queues = [deque(q) for q in queues]
+    remaining = [float(costs[list(q)].sum()) for q in queues]
+    heap = [(0.0, k) for k in range(workers)]
+    makespan = 0.0
+    while heap:
+        now, k = heapq.heappop(heap)
+        if queues[k]:
+            i = queues[k].popleft()
+            owner = k
+        else:
+            owner = max(range(workers), key=lambda v: remaining[v])
+            if not queues[owner]:
+                makespan = max(makespan, now)
+                continue
+            i = queues[owner].pop()
+        remaining[owner] -= costs[i]
+        heapq.heappush(heap, (now + actual[i], k))
+    return makespan
+
+
+class WorkStealingScheduler:
+    """
+    工作窃取线程池。
+
+    用法:
+        scheduler = WorkStealingScheduler(4)
+        results, stats = scheduler.run(jobs, costs, func, init=make_worker)
+    """
+
+    def __init__(self, workers):
+        """
+        参数:
+            workers: 工作线程数
+        """
+        if workers < 1:
+            raise ValueError("工作线程数必须至少为 1")
+        self.workers = workers
+
+    def run(self, jobs, costs, func, init=None, close=None):
+        """
+        执行一组任务。
+
+        参数:
+            jobs: 任务列表
+            costs: 与 jobs 对应的预计耗时
+            func: func(state, job) -> 结果
+            init: 可选，init(worker_index) -> state，每个工作线程调用一次
+            close: 可选，close(state)，工作线程退出前调用
+
+        返回:
+            tuple: (与 jobs 顺序一致的结果列表, 统计信息字典)
+        """
+        n = len(jobs)
+        costs = np.asarray(costs, dtype=float)
+        workers = max(1, min(self.workers, n))
+        queues = [deque(q) for q in lpt_assign(costs, workers)]
+        remaining = [float(costs[list(q)].sum()) for q in queues]
+        lock = threading.Lock()
+
+        results = [None] * n
+        durations = np.zeros(n)
+        busy = [0.0] * workers
+        done = [0] * workers
+        steals = [0]
+        errors = []
+
+        def take(k):
+            with lock:
+                if queues[k]:
+                    i = queues[k].popleft()
+                    owner = k
+                else:
+                    owner = max(range(workers), key=lambda v: remaining[v])
+                    if not queues[owner]:
+                        return None
+                    i = queues[owner].pop()
+                    steals[0] += 1
+                remaining[owner] -= costs[i]
+                return i
+
+        def work(k):
+            state = init(k) if init else None
+            try:
+                while not errors:
+                    i = take(k)
+                    if i is None:
+                        break
+                    start = time.perf_counter()
+                    results[i] = func(state, jobs[i])
+                    durations[i] = time.perf_counter() - start
+                    busy[k] += durations[i]
+                    done[k] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                if close:
+                    close(state)
+
+        start = time.perf_counter()
+        if workers == 1:
+            work(0)
+        else:
+            threads = [threading.Thread(target=work, args=(k,), name=f'batch-worker-{k}')
+                       for k in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        makespan = time.perf_counter() - start
+
+        if errors:
+            raise errors[0]
+
+        stats = {
+            'workers': workers,
+            'jobs': n,
+            'makespan_s': round(makespan, 3),
+            'busy_s': [round(b, 3) for b in busy],
+            'jobs_per_worker': done,
+            'steals': steals[0],
+            'utilization': round(sum(busy) / (workers * makespan), 3) if makespan > 0 else 1.0,
+            'predicted_s': round(float(costs.sum()), 3),
+            # 用实际耗时重放各调度方式，比较完工时间
+            'naive_makespan_s': round(simulate(costs, workers, 'naive', durations), 3),
+            'lpt_makespan_s': round(simulate(costs, workers, 'lpt', durations), 3),
+            'stealing_makespan_s': round(simulate(costs, workers, 'stealing', durations), 3),
+        }
+        return results, stats
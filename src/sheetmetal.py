@@ -0,0 +1,498 @@
+"""
+钣金展开指标
+
+激光切割和冲压的报价看的是板厚、展开面积、展开尺寸、切割周长和
+折弯数，三维边界框对排料没有意义。这里只用 body_topology() 的面数组
+和已测量的体积、面积判断钣金件，因此按普通实体建模或从 STEP 导入的
+钣金件也能识别：
+
+    板厚 t        成对的反向平面（外法向相对，中间是材料）之间的距离，
+                  按面的大小加权取众数；大面上下两侧决定板厚。平面按
+                  法向分组，只在同一组内按高度查找，不做两两比较
+    展开面积 F    F = V / t（中性面面积，忽略 K 因子的修正）
+    切割周长 P    侧面积 A - 2F 除以板厚，包含内孔和缺口的轮廓
+    折弯数        凹圆柱面半径 r 与同轴凸圆柱面半径 r + t 配对的组数
+    展开尺寸      无折弯时取边界框最大的两个尺寸；有折弯时宽度取折弯
+                  轴向的尺寸，长度按面积 F / 宽度，且不小于垂直方向的尺寸
+
+板厚超过 SHEET_MAX_THICKNESS 或侧面积占比超过 SIDE_AREA_RATIO 的实体
+不算钣金件。板厚不小于 2V / A，这个下限已超过 SHEET_MAX_THICKNESS 的
+实体不再查找平面对。指标随零件记录一起按几何指纹缓存。
+
+apply_nesting() 对整批的展开坯料按网格排样估算每张板能排的件数和
+材料利用率，全部在数组上完成；nesting_summary() 按材料、板厚和板材
+规格汇总需要的板数。
+"""
+
+import numpy as np
+
+from .features import CYLINDRICAL, PLANAR, _hole_keys
+
+# 钣金件的最大板厚（m）
+SHEET_MAX_THICKNESS = 0.012
+
+# 侧面积（板厚方向的面）占总表面积的最大比例
+SIDE_AREA_RATIO = 0.3
+
+# 板厚取整的精度（m），也是折弯半径配对的精度
+THICKNESS_TOLERANCE = 1e-5
+
+# 平面法向分组时单位法向各分量取整的精度
+NORMAL_TOLERANCE = 1e-4
+
+# 标准板材规格：(长, 宽)，m
+STANDARD_SHEETS = ((2.0, 1.0), (2.5, 1.25), (3.0, 1.5))
+
+# 排样时零件间距和板边留量（m）
+NEST_GAP = 0.005
+SHEET_MARGIN = 0.01
+
+# 零件记录中的钣金列
+SHEET_FIELDS = [
+    'sheet_body_count',
+    'thickness_m',
+    'flat_area_m2',
+    'flat_length_m',
+    'flat_width_m',
+    'cut_length_m',
+    'bend_count',
+]
+
+# apply_nesting() 写入的排样列
+NEST_FIELDS = [
+    'sheet_size',
+    'parts_per_sheet',
+    'sheet_usage',
+    'nest_yield',
+]
+
+# 流式 CSV 的列声明（见 sinks.parse_columns()）
+SHEET_COLUMNS = [
+    'sheet_body_count',
+    ('thickness_m', '.4g'),
+    ('flat_area_m2', '.6g'),
+    ('flat_length_m', '.6g'),
+    ('flat_width_m', '.6g'),
+    ('cut_length_m', '.6g'),
+    'bend_count',
+    'sheet_size',
+    'parts_per_sheet',
+    ('sheet_usage', '.6g'),
+    ('nest_yield', '.4f'),
+]
+
+# 报价工作簿零件明细的附加列：(表头, 记录字段, 换算系数, 数字格式, 列宽)
+SHEET_REPORT_COLUMNS = [
+    ('板厚 (mm)', 'thickness_m', 1e3, '0.0#', 10),
+    ('展开面积 (mm²)', 'flat_area_m2', 1e6, '#,##0', 14),
+    ('展开长 (mm)', 'flat_length_m', 1e3, '0.0', 12),
+    ('展开宽 (mm)', 'flat_width_m', 1e3, '0.0', 12),
+    ('切割长度 (mm)', 'cut_length_m', 1e3, '#,##0', 14),
+    ('折弯数', 'bend_count', None, '0', 8),
+    ('板材', 'sheet_size', None, None, 12),
+    ('每板件数', 'parts_per_sheet', None, '0', 10),
+    ('排样利用率', 'nest_yield', None, '0.0%', 12),
+]
+
+
+def _face_areas(box):
+    """面积的近似值：面边界框最大的两个边长之积"""
+    extent = np.sort(box[:, 3:] - box[:, :3], axis=1)
+    return extent[:, 1] * extent[:, 2]
+
+
+def plate_thickness(topology):
+    """
+    由平面对估算板厚。
+
+    平面按单位法向（统一符号后取整）分组，组内外法向相反的两侧各自
+    按沿法向的高度排序；每个平面用二分查找取材料一侧最近的反向平面，
+    距离按 THICKNESS_TOLERANCE 取整后以面积加权取众数。
+
+    参数:
+        topology: body_topology() 返回的数组字典
+
+    返回:
+        float: 板厚（m）；找不到成对平面时返回 None
+    """
+    planar = np.flatnonzero((topology['face_class'] == PLANAR)
+                            & ~np.isnan(topology['face_plane'][:, 3]))
+    if len(planar) < 2:
+        return None
+    plane = topology['face_plane'][planar]
+    point = plane[:, :3]
+    normal = plane[:, 3:]
+    norm = np.linalg.norm(normal, axis=1, keepdims=True)
+    normal = np.divide(normal, norm, out=np.zeros_like(normal), where=norm > 0)
+
+    # 法向 n 与 -n 归为一组：让第一个非零分量为正，sign 记录原来的朝向
+    first = np.argmax(np.abs(normal) > 1e-9, axis=1)
+    sign = np.sign(normal[np.arange(len(normal)), first])
+    sign[sign == 0] = 1.0
+    direction = normal * sign[:, None]
+    keys = np.round(direction / NORMAL_TOLERANCE).astype(np.int64)
+    _unique, group = np.unique(keys, axis=0, return_inverse=True)
+    group = group.reshape(-1)
+    height = np.einsum('ij,ij->i', point, direction)
+
+    nearest = np.full(len(planar), np.inf)
+    up = np.flatnonzero(sign > 0)
+    down = np.flatnonzero(sign < 0)
+    if len(up) and len(down):
+        # 按 (组, 高度) 排序，二分查找时组号在前，不会跨组
+        up = up[np.lexsort((height[up], group[up]))]
+        down = down[np.lexsort((height[down], group[down]))]
+        up_keys = np.rec.fromarrays([group[up], height[up]])
+        down_keys = np.rec.fromarrays([group[down], height[down]])
+
+        # 外法向为 +d 的面，材料在下方：取组内高度低于它的最高反向面
+        below = np.searchsorted(down_keys, np.rec.fromarrays(
+            [group[up], height[up] - THICKNESS_TOLERANCE]), side='left') - 1
+        ok = below >= 0
+        ok[ok] = group[down[below[ok]]] == group[up[ok]]
+        nearest[up[ok]] = height[up[ok]] - height[down[below[ok]]]
+
+        # 外法向为 -d 的面，材料在上方：取组内高度高于它的最低反向面
+        above = np.searchsorted(up_keys, np.rec.fromarrays(
+            [group[down], height[down] + THICKNESS_TOLERANCE]), side='right')
+        ok = above < len(up)
+        ok[ok] = group[up[above[ok]]] == group[down[ok]]
+        nearest[down[ok]] = height[up[above[ok]]] - height[down[ok]]
+
+    found = np.isfinite(nearest)
+    if not found.any():
+        return None
+
+    bins = np.round(nearest[found] / THICKNESS_TOLERANCE).astype(np.int64)
+    values, inverse = np.unique(bins, return_inverse=True)
+    areas = _face_areas(topology['face_box'][planar][found])
+    weight = np.bincount(inverse.reshape(-1), weights=areas)
+    return round(float(values[np.argmax(weight)] * THICKNESS_TOLERANCE), 6)
+
+
+def find_bends(topology, thickness):
+    """
+    识别折弯：凹圆柱面（内侧）与同轴、半径大一个板厚的凸圆柱面（外侧）。
+
+    参数:
+        topology: body_topology() 返回的数组字典
+        thickness: 板厚（m）
+
+    返回:
+        tuple: (折弯数, 折弯轴向的单位向量；没有折弯时为 None)
+    """
+    round_faces = np.flatnonzero((topology['face_class'] == CYLINDRICAL)
+                                 & ~np.isnan(topology['face_radius']))
+    if len(round_faces) < 2:
+        return 0, None
+    radius = topology['face_radius'][round_faces]
+    concave = topology['face_concave'][round_faces]
+    keys, direction = _hole_keys(np.zeros(len(round_faces)), topology['face_axis'][round_faces])
+    axis_keys = [tuple(k) for k in keys[:, 1:].tolist()]
+    steps = np.round(radius / THICKNESS_TOLERANCE).astype(np.int64).tolist()
+    t = int(round(thickness / THICKNESS_TOLERANCE))
+
+    inner = {(axis_keys[i], steps[i]) for i in np.flatnonzero(concave).tolist()}
+    bends = {}
+    for i in np.flatnonzero(~concave).tolist():
+        # 允许一个取整单位的误差
+        if any((axis_keys[i], steps[i] - t + e) in inner for e in (-1, 0, 1)):
+            bends.setdefault(axis_keys[i], i)
+    if not bends:
+        return 0, None
+    # 不平行的折弯取第一个折弯的方向作为展开宽度方向
+    return len(bends), direction[next(iter(bends.values()))]
+
+
+def body_sheet_metal(topology, volume, area, min_point, max_point,
+                     max_thickness=SHEET_MAX_THICKNESS):
+    """
+    判断实体是否为钣金件并计算展开指标。
+
+    参数:
+        topology: body_topology() 返回的数组字典
+        volume: 实体体积（m³）
+        area: 实体表面积（m²）
+        min_point / max_point: 实体边界框角点（m）
+        max_thickness: 最大板厚（m）
+
+    返回:
+        dict: thickness_m、flat_area_m2、flat_length_m、flat_width_m、
+            cut_length_m、bend_count；不是钣金件时返回 None
+    """
+    if not volume or not area or min_point is None or max_point is None:
+        return None
+    # 面积 A = 2F + 侧面积，板厚 t = V / F >= 2V / A：厚实体不必查找平面对
+    if 2.0 * volume / area > max_thickness:
+        return None
+    thickness = plate_thickness(topology)
+    if thickness is None or thickness > max_thickness:
+        return None
+
+    flat_area = volume / thickness
+    side = area - 2.0 * flat_area
+    if side < -0.02 * area or side > SIDE_AREA_RATIO * area:
+        return None
+
+    extent = np.asarray(max_point, dtype=float) - np.asarray(min_point, dtype=float)
+    bends, direction = find_bends(topology, thickness)
+    if bends:
+        width = float(np.abs(direction) @ extent)
+        # 展开长度不小于垂直于折弯线方向的边界框尺寸
+        span = float((extent * (1.0 - np.abs(direction))).max())
+        length = max(flat_area / width, span) if width > 0 else None
+    else:
+        ordered = np.sort(extent)[::-1]
+        length, width = float(ordered[0]), float(ordered[1])
+    if not width or width < thickness:
+        return None
+    return {
+        'thickness_m': thickness,
+        'flat_area_m2': flat_area,
+        'flat_length_m': length,
+        'flat_width_m': width,
+        'cut_length_m': max(side, 0.0) / thickness,
+        'bend_count': bends,
+    }
+
+
+def part_sheet_metal(bodies):
+    """
+    汇总实体的钣金指标为零件级字段。
+
+    板厚和展开尺寸取展开面积最大的实体，展开面积、切割长度和折弯数
+    为各钣金实体之和。
+
+    参数:
+        bodies: 实体记录列表；带 sheet_metal 字段的实体参与汇总
+
+    返回:
+        dict: SHEET_FIELDS 中的字段；没有钣金实体时 sheet_body_count 为 0、其余为 None
+    """
+    found = [b['sheet_metal'] for b in bodies if b.get('sheet_metal')]
+    if not found:
+        return dict({name: None for name in SHEET_FIELDS}, sheet_body_count=0)
+    main = max(found, key=lambda s: s['flat_area_m2'])
+    return {
+        'sheet_body_count': len(found),
+        'thickness_m': main['thickness_m'],
+        'flat_area_m2': sum(s['flat_area_m2'] for s in found),
+        'flat_length_m': main['flat_length_m'],
+        'flat_width_m': main['flat_width_m'],
+        'cut_length_m': sum(s['cut_length_m'] for s in found),
+        'bend_count': sum(s['bend_count'] for s in found),
+    }
+
+
+def sheet_label(size):
+    """板材规格文本，如 '3000×1500'（mm）"""
+    return f"{size[0] * 1e3:g}×{size[1] * 1e3:g}"
+
+
+def grid_count(length, width, sheet_length, sheet_width, gap=NEST_GAP):
+    """
+    矩形坯料在板材可用区域内按网格排样的件数，取两种朝向的较大值。
+
+    参数均可为可广播的数组（m）。
+
+    返回:
+        ndarray: 件数（int64）
+    """
+    def fit(size, room):
+        return np.floor((room + gap) / (size + gap))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upright = fit(length, sheet_length) * fit(width, sheet_width)
+        turned = fit(width, sheet_length) * fit(length, sheet_width)
+    count = np.fmax(upright, turned)
+    return np.nan_to_num(count, nan=0.0).astype(np.int64)
+
+
+def sheet_counts(length, width, sheets=STANDARD_SHEETS, gap=NEST_GAP, margin=SHEET_MARGIN):
+    """
+    每件坯料在各规格板材上的网格排样件数。
+
+    参数:
+        length / width: 坯料的展开尺寸数组（m）
+        sheets: 板材规格 (长, 宽) 列表（m）
+        gap: 零件间距（m）
+        margin: 板边留量（m）
+
+    返回:
+        tuple: ((坯料数, 规格数) 的件数矩阵, 各规格的板面积)
+    """
+    size = np.asarray(sheets, dtype=float).reshape(-1, 2)
+    room = size - 2.0 * margin
+    count = grid_count(length[:, None], width[:, None], room[None, :, 0], room[None, :, 1], gap)
+    return count, size[:, 0] * size[:, 1]
+
+
+def choose_sheets(count, area, sheet_area):
+    """
+    为每件坯料选择利用率最高的板材规格。
+
+    参数:
+        count: sheet_counts() 的件数矩阵
+        area: 坯料展开面积数组（m²）
+        sheet_area: 各规格的板面积
+
+    返回:
+        tuple: (规格下标，放不下任何规格时为 -1；每板件数)
+    """
+    best = np.argmax(count * area[:, None] / sheet_area[None, :], axis=1)
+    per_sheet = count[np.arange(len(best)), best]
+    return np.where(per_sheet > 0, best, -1), per_sheet
+
+
+def _blanks(records):
+    """整批的钣金坯料（每个钣金实体一件）展开为数组"""
+    owner, length, width, area, thickness = [], [], [], [], []
+    for i, record in enumerate(records):
+        if record.get('error') or not record.get('sheet_body_count'):
+            continue
+        for body in record.get('bodies') or ():
+            sheet = body.get('sheet_metal')
+            if sheet:
+                owner.append(i)
+                length.append(sheet['flat_length_m'])
+                width.append(sheet['flat_width_m'])
+                area.append(sheet['flat_area_m2'])
+                thickness.append(sheet['thickness_m'])
+    return (np.array(owner, dtype=np.intp), np.array(length, dtype=float),
+            np.array(width, dtype=float), np.array(area, dtype=float),
+            np.array(thickness, dtype=float))
+
+
+def apply_nesting(records, sheets=STANDARD_SHEETS, gap=NEST_GAP, margin=SHEET_MARGIN):
+    """
+    估算整批钣金件的排样，写入 NEST_FIELDS。
+
+    每件坯料在各规格板材上按网格排样（允许旋转 90°），选利用率最高
+    的规格；网格排样不混排，结果偏保守，可作为下料的上限。
+
+    写入的字段:
+        sheet_size: 主坯料（展开面积最大）选用的板材规格
+        parts_per_sheet: 主坯料每张板能排的件数
+        sheet_usage: 每件零件消耗的板材张数（各坯料 1 / 每板件数之和）
+        nest_yield: 零件展开面积 / 消耗的板材面积
+
+    任何坯料放不下所有规格时，该零件的排样字段为 None。
+
+    参数:
+        records: 零件记录列表（原地修改）
+        sheets: 板材规格 (长, 宽) 列表（m）
+        gap: 零件间距（m）
+        margin: 板边留量（m）
+
+    返回:
+        list: records
+    """
+    for record in records:
+        for name in NEST_FIELDS:
+            record.pop(name, None)
+    owner, length, width, area, _thickness = _blanks(records)
+    if not len(owner):
+        return records
+
+    count, sheet_area = sheet_counts(length, width, sheets, gap, margin)
+    best, per_sheet = choose_sheets(count, area, sheet_area)
+    usage = np.where(best >= 0, 1.0 / np.maximum(per_sheet, 1), np.nan)
+    consumed = usage * sheet_area[best]
+
+    n = len(records)
+    part_usage = np.zeros(n)
+    part_consumed = np.zeros(n)
+    part_area = np.zeros(n)
+    np.add.at(part_usage, owner, usage)
+    np.add.at(part_consumed, owner, consumed)
+    np.add.at(part_area, owner, area)
+    main = {}
+    for k, i in enumerate(owner.tolist()):
+        if i not in main or area[k] > area[main[i]]:
+            main[i] = k
+
+    labels = [sheet_label(s) for s in sheets]
+    for i, k in main.items():
+        record = records[i]
+        if np.isnan(part_usage[i]):
+            record.update({name: None for name in NEST_FIELDS})
+            continue
+        record['sheet_size'] = labels[best[k]]
+        record['parts_per_sheet'] = int(per_sheet[k])
+        record['sheet_usage'] = float(part_usage[i])
+        record['nest_yield'] = float(part_area[i] / part_consumed[i])
+    return records
+
+
+def nesting_summary(records, sheets=STANDARD_SHEETS, gap=NEST_GAP, margin=SHEET_MARGIN):
+    """
+    按 (材料, 板厚) 汇总整批需要的板数。
+
+    零件数量取记录的 quantity（缺省为 1）。每组选一种板材规格：在组内
+    所有坯料都放得下的规格中取消耗板材面积最小的，板数为各坯料数量 /
+    每板件数之和向上取整。没有共同规格时按各坯料自己的最优规格分组。
+
+    参数:
+        records: 零件记录列表
+        sheets / gap / margin: 同 apply_nesting()
+
+    返回:
+        list: 每组一个字典，含 material、thickness_m、sheet_size、parts（坯料件数）、
+            sheets（板数）、flat_area_m2（展开面积合计）和 yield（利用率）；
+            放不下任何规格的坯料单独成组，sheet_size、sheets 和 yield 为 None
+    """
+    owner, length, width, area, thickness = _blanks(records)
+    if not len(owner):
+        return []
+    count, sheet_area = sheet_counts(length, width, sheets, gap, margin)
+    best, _per_sheet = choose_sheets(count, area, sheet_area)
+
+    positions = owner.tolist()
+    quantity = np.array([max(int(records[i].get('quantity') or 1), 1) for i in positions],
+                        dtype=float)
+    materials = [records[i].get('material') for i in positions]
+    steps = np.round(thickness / THICKNESS_TOLERANCE).astype(np.int64).tolist()
+
+    groups = {}
+    for k, key in enumerate(zip(materials, steps, (best >= 0).tolist())):
+        groups.setdefault(key, []).append(k)
+
+    labels = [sheet_label(s) for s in sheets]
+    rows = []
+
+    def add(material, step, index, sheet):
+        parts = quantity[index]
+        flat = float((parts * area[index]).sum())
+        row = {
+            'material': material,
+            'thickness_m': round(step * THICKNESS_TOLERANCE, 6),
+            'sheet_size': None,
+            'parts': int(parts.sum()),
+            'sheets': None,
+            'flat_area_m2': flat,
+            'yield': None,
+        }
+        if sheet is not None:
+            need = int(np.ceil((parts / count[index, sheet]).sum() - 1e-9))
+            row['sheet_size'] = labels[sheet]
+            row['sheets'] = need
+            row['yield'] = flat / (need * float(sheet_area[sheet]))
+        rows.append(row)
+
+    for key in sorted(groups, key=lambda g: (str(g[0]), g[1], not g[2])):
+        material, step, placeable = key
+        index = np.array(groups[key], dtype=np.intp)
+        if not placeable:
+            add(material, step, index, None)
+            continue
+        c = count[index]
+        usable = (c > 0).all(axis=0)
+        if usable.any():
+            with np.errstate(divide='ignore'):
+                need = np.ceil((quantity[index, None] / c).sum(axis=0) - 1e-9)
+            consumed = np.where(usable, need * sheet_area, np.inf)
+            add(material, step, index, int(np.argmin(consumed)))
+        else:
+            for sheet in np.unique(best[index]).tolist():
+                add(material, step, index[best[index] == sheet], sheet)
+    return rows
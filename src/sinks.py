@@ -0,0 +1,357 @@
+"""
+流式输出
+
+把零件记录逐行写出为 CSV 或 JSON Lines，记录可以是任意迭代器，
+整个输出只遍历一次。行先在内存中按块拼好，再整块写入带大缓冲
+的文件，可选 gzip 或 zstd 压缩（zstd 需要 zstandard 包）。
+
+JSON 编码优先使用 orjson 或 msgspec（原生支持元组和 NumPy 类型），
+都未安装时退回标准库 json。
+"""
+
+import csv
+import gzip
+import io
+import json
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# 默认写出的列，与 BatchRunner / QuoteEngine 的记录字段一致
+RECORD_COLUMNS = [
+    'file',
+    'fingerprint',
+    'backend',
+    'accuracy',
+    'accuracy_level',
+    'error',
+    'unit',
+    'body_count',
+    'failed_body_count',
+    ('volume_m3', '.9g'),
+    ('area_m2', '.9g'),
+    ('length_m', '.6g'),
+    ('width_m', '.6g'),
+    ('height_m', '.6g'),
+    'material',
+    ('mass_kg', '.6g'),
+    ('material_cost', '.2f'),
+    ('stock_volume_m3', '.9g'),
+    ('removed_volume_m3', '.9g'),
+    ('buy_to_fly', '.4f'),
+    ('stock_cost', '.2f'),
+    ('machining_time_h', '.4f'),
+    ('machining_cost', '.2f'),
+    'quantity',
+    ('quoted_unit_price', '.2f'),
+    ('quoted_total', '.2f'),
+    'duplicate_of',
+    'near_duplicate_of',
+]
+
+# 每块的行数和文件缓冲大小
+CHUNK_ROWS = 10000
+BUFFER_SIZE = 1 << 20
+
+COMPRESSIONS = ('gzip', 'zstd')
+
+JSON_ENGINES = ('orjson', 'msgspec', 'json')
+
+
+def detect_compression(path):
+    """
+    按扩展名判断压缩方式。
+
+    返回:
+        str: 'gzip'、'zstd' 或 None
+    """
+    lower = path.lower()
+    if lower.endswith('.gz'):
+        return 'gzip'
+    if lower.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+class _Output:
+    """带大缓冲的二进制输出，可选压缩"""
+
+    def __init__(self, path, compression=None, buffer_size=BUFFER_SIZE):
+        if compression not in (None,) + COMPRESSIONS:
+            raise ValueError(f"未知的压缩方式: {compression}（可选: {', '.join(COMPRESSIONS)}）")
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            raise ImportError("未安装 zstandard。运行: pip install zstandard")
+
+        self._raw = open(path, 'wb', buffering=buffer_size)
+        if compression == 'gzip':
+            # 压缩级别 6 是速度和大小的折中
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=6)
+        elif compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+
+    def write(self, data):
+        self._stream.write(data)
+
+    def close(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_output(path, compression='auto', buffer_size=BUFFER_SIZE):
+    """
+    打开二进制输出文件。
+
+    参数:
+        path: 输出路径
+        compression: 'gzip'、'zstd'、None，或 'auto'（按扩展名）
+        buffer_size: 文件缓冲大小（字节）
+
+    返回:
+        支持 write(bytes) / close() 的输出对象
+    """
+    if compression == 'auto':
+        compression = detect_compression(path)
+    return _Output(path, compression, buffer_size)
+
+
+def _formatter(spec):
+    """按格式说明生成单元格格式化函数"""
+    def cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            if value != value:
+                return ''
+            return format(value, spec) if spec else repr(value)
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        if spec and isinstance(value, int) and not isinstance(value, bool):
+            return format(value, spec)
+        return value
+    return cell
+
+
+def parse_columns(columns):
+    """
+    解析列声明。
+
+    参数:
+        columns: 列表，每项为字段名，或 (字段名, 格式说明) 元组，
+            格式说明同 format()，如 '.6g'、'.2f'
+
+    返回:
+        tuple: (字段名列表, 格式化函数列表)
+    """
+    keys = []
+    formatters = []
+    for column in columns:
+        if isinstance(column, str):
+            key, spec = column, None
+        else:
+            key, spec = column
+        keys.append(key)
+        formatters.append(_formatter(spec))
+    return keys, formatters
+
+
+def write_csv(records, path, columns=None, compression='auto', chunk_rows=CHUNK_ROWS,
+              buffer_size=BUFFER_SIZE, encoding='utf-8'):
+    """
+    按声明的列流式写出 CSV。
+
+    浮点数中的 NaN 和 None 写为空；列表、元组和字典写为紧凑的 JSON。
+
+    参数:
+        records: 零件记录的可迭代对象（只遍历一次）
+        path: 输出路径，.gz / .zst 结尾时自动压缩
+        columns: 列声明，见 parse_columns()；None 使用 RECORD_COLUMNS
+        compression: 'gzip'、'zstd'、None 或 'auto'
+        chunk_rows: 每块的行数
+        buffer_size: 文件缓冲大小（字节）
+        encoding: 文本编码
+
+    返回:
+        int: 写出的行数（不含表头）
+    """
+    keys, formatters = parse_columns(columns or RECORD_COLUMNS)
+    pairs = list(zip(keys, formatters))
+
+    chunk = io.StringIO()
+    writer = csv.writer(chunk, lineterminator='\n')
+    writer.writerow(keys)
+
+    count = 0
+    pending = 0
+    with open_output(path, compression, buffer_size) as out:
+        for record in records:
+            get = record.get
+            writer.writerow([fmt(get(key)) for key, fmt in pairs])
+            count += 1
+            pending += 1
+            if pending >= chunk_rows:
+                out.write(chunk.getvalue().encode(encoding))
+                chunk.seek(0)
+                chunk.truncate()
+                pending = 0
+        out.write(chunk.getvalue().encode(encoding))
+    return count
+
+
+def _plain_default(obj):
+    """标准库 json 不认识的类型（NumPy 数组和标量等）"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"无法序列化 {type(obj).__name__}")
+
+
+def choose_json_engine(engine='auto'):
+    """
+    选择 JSON 编码库。
+
+    参数:
+        engine: 'orjson'、'msgspec'、'json' 或 'auto'（按此顺序取第一个已安装的）
+
+    返回:
+        str: 编码库名称
+    """
+    if engine == 'auto':
+        if ORJSON_AVAILABLE:
+            return 'orjson'
+        if MSGSPEC_AVAILABLE:
+            return 'msgspec'
+        return 'json'
+    if engine not in JSON_ENGINES:
+        raise ValueError(f"未知的 JSON 编码库: {engine}（可选: {', '.join(JSON_ENGINES)}）")
+    if engine == 'orjson' and not ORJSON_AVAILABLE:
+        raise ImportError("未安装 orjson。运行: pip install orjson")
+    if engine == 'msgspec' and not MSGSPEC_AVAILABLE:
+        raise ImportError("未安装 msgspec。运行: pip install msgspec")
+    return engine
+
+
+def json_encoder(engine='auto', indent=False):
+    """
+    生成 JSON 编码函数。
+
+    orjson 和 msgspec 把 NaN 编码为 null；标准库 json 保持原样写出 NaN。
+
+    参数:
+        engine: 见 choose_json_engine()
+        indent: 是否缩进两格
+
+    返回:
+        callable: obj -> UTF-8 编码的 bytes
+    """
+    engine = choose_json_engine(engine)
+    if engine == 'orjson':
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return lambda obj: orjson.dumps(obj, default=_plain_default, option=option)
+
+    if engine == 'msgspec':
+        encode = msgspec.json.Encoder(enc_hook=_plain_default).encode
+        if indent:
+            return lambda obj: msgspec.json.format(encode(obj), indent=2)
+        return encode
+
+    dumps = json.JSONEncoder(ensure_ascii=False, default=_plain_default,
+                             indent=2 if indent else None,
+                             separators=None if indent else (',', ':')).encode
+    return lambda obj: dumps(obj).encode('utf-8')
+
+
+def write_jsonl(records, path, engine='auto', compression='auto', chunk_rows=CHUNK_ROWS,
+                buffer_size=BUFFER_SIZE):
+    """
+    流式写出 JSON Lines，每条记录一行。
+
+    参数:
+        records: 零件记录的可迭代对象（只遍历一次）
+        path: 输出路径，.gz / .zst 结尾时自动压缩
+        engine: JSON 编码库，见 choose_json_engine()
+        compression: 'gzip'、'zstd'、None 或 'auto'
+        chunk_rows: 每块的行数
+        buffer_size: 文件缓冲大小（字节）
+
+    返回:
+        int: 写出的行数
+    """
+    encode = json_encoder(engine)
+    count = 0
+    lines = []
+    with open_output(path, compression, buffer_size) as out:
+        for record in records:
+            lines.append(encode(record))
+            count += 1
+            if len(lines) >= chunk_rows:
+                lines.append(b'')
+                out.write(b'\n'.join(lines))
+                lines = []
+        if lines:
+            lines.append(b'')
+            out.write(b'\n'.join(lines))
+    return count
+
+
+def write_json(data, path, indent=True, engine='auto', compression='auto',
+               buffer_size=BUFFER_SIZE):
+    """
+    写出单个 JSON 文档。
+
+    元组、NumPy 数组和标量直接编码，不复制数据；标准库 json 分段编码，
+    不在内存中拼出整个文档。
+
+    参数:
+        data: 字典或列表
+        path: 输出路径
+        indent: 是否缩进两格
+        engine: JSON 编码库，见 choose_json_engine()
+        compression: 'gzip'、'zstd'、None 或 'auto'
+        buffer_size: 文件缓冲大小（字节）
+    """
+    engine = choose_json_engine(engine)
+    with open_output(path, compression, buffer_size) as out:
+        if engine != 'json':
+            out.write(json_encoder(engine, indent)(data))
+            return
+
+        encoder = json.JSONEncoder(ensure_ascii=False, default=_plain_default,
+                                   indent=2 if indent else None,
+                                   separators=None if indent else (',', ':'))
+        pieces = []
+        size = 0
+        for piece in encoder.iterencode(data):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= buffer_size:
+                out.write(''.join(pieces).encode('utf-8'))
+                pieces = []
+                size = 0
+        out.write(''.join(pieces).encode('utf-8'))
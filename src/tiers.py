@@ -0,0 +1,266 @@
+"""
+分级精度测量
+
+报价初筛不需要 0.99 的测量精度。分级模式先用低精度快速测量全部
+零件并给出估价，再只对价格敏感的零件用高精度重新测量：
+
+    质量排在前面的零件（材料费占比大，体积误差直接进入价格）
+    询价数量略低于某个数量阶梯的零件（估价误差可能改变所在阶梯的判断）
+
+重新测量可在后台线程进行，完成后就地更新记录并重新计价。两次的
+结果都保存在记录的 tiers 列表中，每项带有测量精度。同一指纹的文件
+只精测一次，各记录只复制几何和测量字段、各自持有实体列表的副本，
+质量和材料成本按各文件自己的材料属性重算。
+
+快速和精测各用一个独立的后端实例。NX 会话属于整个进程且不是线程
+安全的（后端的 thread_safe 为 False），这时 refine_async() 在调用
+线程中同步精测，返回已完成的 Future。
+"""
+
+import copy
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from .batch import DEFAULT_ACCURACY
+from .columns import to_columns
+from .materials import apply_materials
+from .metrics import apply_derived
+from .pricing import QuoteEngine
+
+# 快速测量的精度
+FAST_ACCURACY = 0.9
+
+# tiers 中保存的字段（另加全部 unit_price_q* 列）
+TIER_FIELDS = [
+    'accuracy',
+    'accuracy_level',
+    'volume_m3',
+    'area_m2',
+    'mass_kg',
+    'material_cost',
+    'stock_cost',
+    'machining_cost',
+    'quoted_unit_price',
+    'quoted_total',
+]
+
+# 重新测量后从新记录复制的几何和测量字段；材料、属性等按文件的字段保留
+_REFINED_FIELDS = ('accuracy', 'accuracy_level', 'measure_time_s', 'feature_time_s',
+                   'body_count', 'failed_body_count', 'body_errors', 'volume_m3', 'area_m2',
+                   'length_m', 'width_m', 'height_m', 'min_point', 'max_point')
+
+# 实体记录中按文件的材料字段
+_BODY_MATERIAL_FIELDS = ('material', 'mass_kg', 'material_cost')
+
+
+def _refined_bodies(record, new):
+    """
+    精测后的实体列表：几何取自新记录的副本，材料沿用本记录原有实体的材料。
+
+    几何相同的文件材料可能不同，不能沿用首个文件的实体材料；实体数
+    变化时材料置空，由 apply_materials 按零件属性重新确定。
+    """
+    bodies = copy.deepcopy(new.get('bodies') or [])
+    old = record.get('bodies') or []
+    for i, body in enumerate(bodies):
+        source = old[i] if len(old) == len(bodies) else {}
+        for name in _BODY_MATERIAL_FIELDS:
+            body[name] = source.get(name)
+    return bodies
+
+
+def tier_snapshot(record):
+    """
+    提取记录当前精度下的测量和价格。
+
+    参数:
+        record: 零件记录
+
+    返回:
+        dict: TIER_FIELDS 和 unit_price_q* 字段
+    """
+    snapshot = {k: record.get(k) for k in TIER_FIELDS if k in record}
+    snapshot.update((k, v) for k, v in record.items() if k.startswith('unit_price_q'))
+    return snapshot
+
+
+def select_sensitive(records, quantity_breaks, mass_quantile=0.8, break_margin=0.15):
+    """
+    选出价格敏感、值得高精度重测的零件。
+
+    参数:
+        records: 已计价的零件记录列表
+        quantity_breaks: 数量阶梯数组（RateCard.quantities）
+        mass_quantile: 质量不低于该分位数的零件视为敏感；None 表示不按质量选
+        break_margin: 询价数量再增加该比例即达到下一阶梯时视为敏感
+
+    返回:
+        numpy.ndarray: 布尔掩码；失败的记录和重复文件始终为 False
+    """
+    n = len(records)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+
+    columns = to_columns(records, ['mass_kg', 'quantity'])
+    valid = np.array([r.get('error') is None and not r.get('duplicate_of') for r in records])
+    mass = columns['mass_kg']
+    sensitive = np.zeros(n, dtype=bool)
+
+    if mass_quantile is not None and valid.any():
+        known = valid & ~np.isnan(mass)
+        if known.any():
+            threshold = np.quantile(mass[known], mass_quantile)
+            sensitive |= known & (mass >= threshold)
+
+    quantity = columns['quantity']
+    has_qty = ~np.isnan(quantity)
+    if has_qty.any():
+        breaks = np.asarray(quantity_breaks, dtype=float)
+        qty = np.where(has_qty, quantity, 0.0)
+        idx = np.searchsorted(breaks, qty, side='right')
+        nxt = breaks[np.minimum(idx, len(breaks) - 1)]
+        near = has_qty & (idx < len(breaks)) & (nxt <= qty * (1.0 + break_margin))
+        sensitive |= near
+
+    return sensitive & valid
+
+
+class TieredRunner:
+    """
+    两级精度的批处理。
+
+    用法:
+        tiered = TieredRunner(BatchRunner(backend='nx'))
+        records = tiered.estimate(paths)        # 快速估价
+        future = tiered.refine_async(records)   # 后台精测敏感零件
+        refined = future.result()
+
+    后台精测期间记录会被就地修改，在 future 完成前不要改动记录。
+    nx 后端不在后台精测，refine_async() 返回时精测已经完成。
+    """
+
+    def __init__(self, runner, fast_accuracy=FAST_ACCURACY, refine_accuracy=None, engine=None,
+                 mass_quantile=0.8, break_margin=0.15):
+        """
+        初始化分级批处理。
+
+        参数:
+            runner: BatchRunner，提供后端、材料库、缓存和余量
+            fast_accuracy: 快速测量精度
+            refine_accuracy: 精测精度；None 使用 runner 的精度（默认 0.99）
+            engine: QuoteEngine；None 按 runner 的材料库和余量创建
+            mass_quantile: 见 select_sensitive()
+            break_margin: 见 select_sensitive()
+        """
+        self.fast = runner.with_accuracy(fast_accuracy)
+        self.precise = runner.with_accuracy(refine_accuracy or runner.accuracy or DEFAULT_ACCURACY)
+        self.engine = engine or QuoteEngine(materials=runner.materials, allowance=runner.allowance)
+        self.mass_quantile = mass_quantile
+        self.break_margin = break_margin
+        self._executor = None
+
+    def estimate(self, paths, quantities=None):
+        """
+        快速测量并估价。
+
+        参数:
+            paths: .prt 文件路径列表
+            quantities: 可选，与 paths 对应的询价数量列表
+
+        返回:
+            list: 已计价的零件记录列表
+        """
+        records = self.fast.run(paths)
+        if quantities is not None:
+            for record, quantity in zip(records, quantities):
+                record['quantity'] = quantity
+        self.engine.price(records)
+        for record in records:
+            record['refined'] = False
+            if record['error'] is None:
+                record['tiers'] = [tier_snapshot(record)]
+        return records
+
+    def refine(self, records):
+        """
+        对价格敏感的零件高精度重测，并更新记录。
+
+        参数:
+            records: estimate() 返回的记录列表（就地修改）
+
+        返回:
+            list: 被重测并更新的记录（含内容相同的重复文件）
+        """
+        mask = select_sensitive(records, self.engine.rate_card.quantities,
+                                self.mass_quantile, self.break_margin)
+        targets = {}
+        for record, sensitive in zip(records, mask):
+            fp = record.get('fingerprint')
+            if sensitive and record.get('accuracy', 0) < self.precise.accuracy:
+                targets.setdefault(fp or record['path'], record['path'])
+        if not targets:
+            return []
+
+        fresh = dict(zip(targets, self.precise.run(list(targets.values()))))
+
+        updated = []
+        for record in records:
+            key = record.get('fingerprint') or record['path']
+            new = fresh.get(key)
+            if new is None or new['error'] is not None or record['error'] is not None:
+                continue
+            record.update((k, new[k]) for k in _REFINED_FIELDS if k in new)
+            record['bodies'] = _refined_bodies(record, new)
+            updated.append(record)
+
+        # 与 BatchRunner.run 相同：按各文件自己的属性重算质量和派生列后再计价
+        apply_materials(updated, self.precise.materials.compile())
+        apply_derived(updated, self.precise.allowance, force=True)
+        self.engine.price(updated)
+        for record in updated:
+            record['refined'] = True
+            record['tiers'].append(tier_snapshot(record))
+        return updated
+
+    def refine_async(self, records):
+        """
+        在后台线程中执行 refine()。
+
+        精测后端不是线程安全的，或与快速测量共用同一个后端实例时，
+        在当前线程同步执行。
+
+        参数:
+            records: estimate() 返回的记录列表
+
+        返回:
+            concurrent.futures.Future: 结果为 refine() 的返回值
+        """
+        backend = self.precise.backend
+        if backend is self.fast.backend or not getattr(backend, 'thread_safe', False):
+            future = Future()
+            try:
+                future.set_result(self.refine(records))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='refine')
+        return self._executor.submit(self.refine, records)
+
+    def run(self, paths, quantities=None):
+        """
+        快速估价后立即同步精测。
+
+        返回:
+            list: 零件记录列表
+        """
+        records = self.estimate(paths, quantities)
+        self.refine(records)
+        return records
+
+    def close(self):
+        """等待后台精测结束并关闭线程"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,103 @@
+"""
+超时看门狗
+
+在后台线程中执行可能卡死的调用，超过时限即放弃等待。
+Python 无法中断正在执行的调用，超时的线程会被丢弃并在后台
+继续运行，下一次调用使用新的线程。
+
+注意：NX 会话是单线程的，某个调用卡死后会话通常也不再响应。
+批处理在一个零件内发生超时后只对其余实体做边界框估算，估算也超时
+就不再调用后端；该零件结束后重建后端。
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class MeasureTimeout(Exception):
+    """调用超过时限"""
+
+
+class Watchdog:
+    """
+    带超时的调用执行器。
+
+    用法:
+        watchdog = Watchdog()
+        value = watchdog.call(func, 5.0, arg1, arg2)
+    """
+
+    def __init__(self):
+        self._executor = None
+
+    def call(self, func, timeout, *args):
+        """
+        执行调用。
+
+        参数:
+            func: 被调用的函数
+            timeout: 时限（秒）；None 或 0 表示在当前线程直接调用
+            *args: 传给 func 的参数
+
+        返回:
+            func 的返回值；超时抛出 MeasureTimeout，其余异常原样抛出
+        """
+        if not timeout:
+            return func(*args)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='watchdog')
+
+        future = self._executor.submit(func, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # 卡住的线程无法回收，换一个新的执行器
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            raise MeasureTimeout(f"超过 {timeout:g} 秒未返回")
+
+    def close(self):
+        """关闭执行器，不等待卡住的线程"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class Deadline:
+    """
+    零件级时间预算。
+
+    用法:
+        deadline = Deadline(60.0)
+        timeout = deadline.limit(5.0)   # 取单次时限和剩余预算中较小的一个
+    """
+
+    def __init__(self, budget):
+        """
+        参数:
+            budget: 总时长（秒）；None 表示不限
+        """
+        self.budget = budget
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def expired(self):
+        return self.budget is not None and self.elapsed() >= self.budget
+
+    def limit(self, timeout):
+        """
+        计算本次调用的时限。
+
+        参数:
+            timeout: 单次调用的时限；None 表示不限
+
+        返回:
+            float: 时限；都不限时返回 None
+        """
+        if self.budget is None:
+            return timeout
+        remaining = max(self.budget - self.elapsed(), 0.001)
+        return remaining if timeout is None else min(timeout, remaining)
@@ -0,0 +1,174 @@
+"""
+子进程工作者
+
+NX 会话属于整个进程：同一进程中的多个线程共用一个会话，重建后端对象
+也释放不了会话泄漏的内存。BatchRunner(processes=True) 时每个工作线程
+各带一个子进程，子进程建立自己的后端（NX 后端即自己的 NX 会话）执行
+BatchRunner.measure_part()，工作线程只负责调度和收发：
+
+    主进程   WorkStealingScheduler 的工作线程 -> ProcessWorker
+                 管道发送 (路径, 指纹)，收回 (记录, RSS, 残留零件数, 是否卡住)
+    子进程   _child_main()：BatchRunner.measure_part()
+
+子进程每测量完一个零件回报自己的 RSS。出现以下情况时结束子进程，
+下一个零件由新启动的子进程测量，泄漏的内存随进程一起释放：
+
+    RecyclePolicy 判断需要回收（处理满 N 个零件或 RSS 超过阈值，见 resources.py）
+    子进程中有调用超时（会话可能已卡住）
+    子进程超过时限没有回应或意外退出，该零件记为失败
+
+子进程以 spawn 方式启动（Windows 上唯一的方式），用 sys.executable
+运行，该解释器必须能独立 import NXOpen（NX 自带的 Python）。后端必须
+是后端名称或可 pickle 的工厂（类、模块级函数、functools.partial）。
+"""
+
+import multiprocessing
+
+from .resources import rss_bytes
+
+# 等待子进程启动完成的时间（秒）；NX 会话初始化较慢
+START_TIMEOUT = 300.0
+
+# 有零件时间预算时，子进程超过预算加上该余量仍无回应即视为卡死（秒）
+PROCESS_GRACE_S = 60.0
+
+# 结束子进程时等待其自行退出的时间（秒）
+STOP_TIMEOUT = 10.0
+
+
+def _child_main(conn, options):
+    """
+    子进程入口：建立自己的 BatchRunner，逐个测量收到的零件。
+
+    参数:
+        conn: 与主进程相连的管道
+        options: 传给 BatchRunner 的参数（后端、精度、时限、特征开关）
+    """
+    from .batch import BatchRunner
+
+    try:
+        runner = BatchRunner(**options)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', rss_bytes()))
+
+    count = getattr(runner.backend, 'open_part_count', None)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        record = runner.measure_part(*job)
+        conn.send(('done', record, rss_bytes(), count() if count is not None else None,
+                   runner._hung))
+
+    close = getattr(runner.backend, 'close', None)
+    if close is not None:
+        close()
+
+
+class ProcessWorker:
+    """
+    一个测量子进程；第一次测量时启动，stop() 后下一次测量重新启动。
+
+    用法:
+        worker = ProcessWorker({'backend': 'nx', 'accuracy': 0.99})
+        record, rss, opened, restart = worker.measure(path, fingerprint)
+        worker.close()
+    """
+
+    def __init__(self, options, timeout=None, name='batch-process'):
+        """
+        参数:
+            options: 传给子进程 BatchRunner 的参数
+            timeout: 单个零件等待回应的时限（秒）；None 表示不限
+            name: 子进程名称
+        """
+        self.options = options
+        self.timeout = timeout
+        self.name = name
+        self.starts = 0
+        self.process = None
+        self._conn = None
+        self._context = multiprocessing.get_context('spawn')
+
+    def start(self):
+        """启动子进程并等待其就绪"""
+        parent, child = self._context.Pipe()
+        process = self._context.Process(target=_child_main, args=(child, self.options),
+                                        name=self.name, daemon=True)
+        process.start()
+        child.close()
+        self.process = process
+        self._conn = parent
+        self.starts += 1
+
+        reply = self._receive(START_TIMEOUT)
+        if reply is None or reply[0] != 'ready':
+            self.stop(kill=True)
+            reason = reply[1] if reply is not None else "无响应"
+            raise RuntimeError(f"测量子进程启动失败: {reason}")
+
+    def _receive(self, timeout):
+        """读取一条回应；超时或子进程已退出时返回 None"""
+        try:
+            if timeout is not None and not self._conn.poll(timeout):
+                return None
+            return self._conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def measure(self, path, fingerprint):
+        """
+        在子进程中测量一个零件。
+
+        参数:
+            path: .prt 文件路径
+            fingerprint: 几何指纹
+
+        返回:
+            tuple: (零件记录, 子进程 RSS 字节数, 会话中残留的零件数, 原因)；
+                原因为 'hang'（子进程中有调用超时）或 'crash'（无回应或意外
+                退出，此时记录为 None、子进程已结束），否则为 None
+        """
+        if self.process is None:
+            self.start()
+        try:
+            self._conn.send((path, fingerprint))
+            reply = self._receive(self.timeout)
+        except (OSError, ValueError):
+            reply = None
+        if reply is None:
+            self.stop(kill=True)
+            return None, None, None, 'crash'
+        _tag, record, rss, opened, hung = reply
+        return record, rss, opened, 'hang' if hung else None
+
+    def stop(self, kill=False):
+        """
+        结束子进程。
+
+        参数:
+            kill: 为 True 时不等待子进程自行退出（子进程已卡住或崩溃）
+        """
+        if self.process is None:
+            return
+        if not kill:
+            try:
+                self._conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self._conn.close()
+        self.process = None
+        self._conn = None
+
+    def close(self):
+        """结束子进程"""
+        self.stop()